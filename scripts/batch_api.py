@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+提供商批处理接口（OpenAI Batch API / DashScope 兼容模式批处理）
+把所有请求写成 JSONL 上传、创建批处理任务、轮询直到完成后下载结果；
+价格约为实时接口的一半，且不占用实时接口的限流配额，适合不急于拿到结果的整批标注
+
+请求文件每行: {"custom_id": "视频名:帧号-帧号", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+结果文件每行: {"custom_id": ..., "response": {"status_code": 200, "body": {chat/completions 响应}}, "error": ...}
+"""
+
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Union
+
+if TYPE_CHECKING:  # 只用于类型标注，不在导入时加载 requests
+    from transport import ProviderTransport
+
+# 终止状态（expired/cancelled 的任务也可能带有部分结果文件）
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def make_custom_id(video_path: str, frames: List[int]) -> str:
+    """请求标识：视频名 + 该请求包含的原始帧号"""
+    return f"{Path(video_path).stem}:{'-'.join(str(n) for n in frames)}"
+
+
+def parse_custom_id(custom_id: str) -> List[int]:
+    """从请求标识解析原始帧号"""
+    return [int(n) for n in custom_id.rsplit(":", 1)[1].split("-")]
+
+
+class BatchInputWriter:
+    """写出批处理请求 JSONL，超过单文件请求数或大小上限时切分为多个文件（每个文件一个任务）"""
+
+    def __init__(self, prefix: str, endpoint: str, max_requests: int = 50000, max_bytes: int = 190 * 1024 * 1024):
+        """
+        Args:
+            prefix: 输出路径前缀，文件名为 <prefix>.batch_input000.jsonl
+            endpoint: 每行请求的 url（如 /v1/chat/completions）
+            max_requests: 单个文件的最大请求数
+            max_bytes: 单个文件的最大字节数
+        """
+        self.prefix = prefix
+        self.endpoint = endpoint
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.paths: List[str] = []
+        self.total_requests = 0
+        self._file = None
+        self._requests = 0
+        self._bytes = 0
+
+    def add(self, custom_id: str, body: Union[Dict, str]):
+        """追加一个请求，body 可以是已序列化的 JSON 文本"""
+        if not isinstance(body, str):
+            body = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+        line = (f'{{"custom_id":{json.dumps(custom_id, ensure_ascii=False)},"method":"POST",'
+                f'"url":{json.dumps(self.endpoint)},"body":{body}}}\n').encode("utf-8")
+        if self._file is not None and (self._requests >= self.max_requests
+                                       or self._bytes + len(line) > self.max_bytes):
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            path = f"{self.prefix}.batch_input{len(self.paths):03d}.jsonl"
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "wb")
+            self.paths.append(path)
+            self._requests = 0
+            self._bytes = 0
+        self._file.write(line)
+        self._requests += 1
+        self._bytes += len(line)
+        self.total_requests += 1
+
+    def close(self) -> List[str]:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.paths
+
+
+class BatchClient:
+    """OpenAI 兼容的 /files 与 /batches 接口"""
+
+    def __init__(self, base_url: str, api_key: str, transport: "ProviderTransport"):
+        """
+        Args:
+            base_url: 接口根地址（如 https://api.openai.com/v1）
+            api_key: API密钥
+            transport: 复用标注器的传输层（连接池与重试）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.transport = transport
+
+    def upload(self, path: str) -> str:
+        """上传请求文件，返回文件id"""
+        with open(path, "rb") as f:
+            data = f.read()  # 读入内存以便重试时重新发送
+        response = self.transport.request(
+            "POST", f"{self.base_url}/files", self.headers,
+            data={"purpose": "batch"},
+            files={"file": (os.path.basename(path), data, "application/jsonl")}
+        )
+        return response.json()["id"]
+
+    def create(self, input_file_id: str, endpoint: str, completion_window: str = "24h",
+               metadata: Optional[Dict] = None) -> Dict:
+        """创建批处理任务"""
+        payload = {
+            "input_file_id": input_file_id,
+            "endpoint": endpoint,
+            "completion_window": completion_window
+        }
+        if metadata:
+            payload["metadata"] = metadata
+        return self.transport.post_json(f"{self.base_url}/batches", self.headers, payload)
+
+    def get(self, batch_id: str) -> Dict:
+        return self.transport.request("GET", f"{self.base_url}/batches/{batch_id}", self.headers).json()
+
+    def download(self, file_id: str, path: str):
+        """下载结果文件到本地"""
+        response = self.transport.request("GET", f"{self.base_url}/files/{file_id}/content",
+                                          self.headers, stream=True)
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+
+
+def load_state(path: str, meta: Dict) -> Optional[Dict]:
+    """读取已提交任务的状态文件（与本次运行不一致时忽略）"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("meta") != meta:
+        print(f"⚠️  批处理状态文件 {path} 与当前运行不匹配，重新提交")
+        return None
+    return state
+
+
+def save_state(path: str, state: Dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def wait_for_batches(
+    client: BatchClient,
+    batch_ids: List[str],
+    poll_interval: float = 60.0,
+    timeout: Optional[float] = None
+) -> List[Dict]:
+    """轮询直到所有任务进入终止状态，返回最终的任务信息"""
+    start_time = time.time()
+    last_report = None
+    while True:
+        batches = [client.get(batch_id) for batch_id in batch_ids]
+        statuses = Counter(batch["status"] for batch in batches)
+        completed = sum((batch.get("request_counts") or {}).get("completed", 0) for batch in batches)
+        total = sum((batch.get("request_counts") or {}).get("total", 0) for batch in batches)
+        report = (tuple(sorted(statuses.items())), completed)
+        if report != last_report:
+            last_report = report
+            status_text = "，".join(f"{status} {count}" for status, count in sorted(statuses.items()))
+            print(f"批处理任务: {status_text}（请求 {completed}/{total}，已等待 {(time.time() - start_time) / 60:.1f} 分钟）")
+        if all(batch["status"] in TERMINAL_STATUSES for batch in batches):
+            return batches
+        if timeout is not None and time.time() - start_time > timeout:
+            raise TimeoutError(f"批处理任务在 {timeout:g} 秒内未完成，可稍后重新运行同一命令继续等待")
+        time.sleep(poll_interval)
+
+
+def iter_result_lines(client: BatchClient, batches: List[Dict], download_prefix: str) -> Iterator[Dict]:
+    """下载并逐行读取所有任务的结果文件与错误文件"""
+    for i, batch in enumerate(batches):
+        for key in ("output_file_id", "error_file_id"):
+            file_id = batch.get(key)
+            if not file_id:
+                continue
+            path = f"{download_prefix}.batch_{key.split('_')[0]}{i:03d}.jsonl"
+            client.download(file_id, path)
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            os.remove(path)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+多视频批量自动标注 - 进程池并行处理，所有进程共享一个全局 API 并发/限流配额
+替代 batch_process_10videos.sh 的串行处理
+
+用法:
+  python scripts/batch_auto_labeling.py "data/D1_video_clips/*.mp4" --workers 4 -- --provider qwen --sample-rate 5
+  python scripts/batch_auto_labeling.py --manifest videos.txt -- --provider qwen
+
+"--" 之后的参数原样传给 video_auto_labeling.py（--output 由批处理自动生成）
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from multiprocessing.managers import SyncManager
+from pathlib import Path
+from typing import Dict, List
+
+from checkpoint import checkpoint_path_for
+from label_export import shard_path
+from rate_limit import ProviderRateLimiter
+from usage_stats import estimate_cost, latency_summary, summary_path_for, write_summary
+from video_auto_labeling import API_PROVIDERS, build_parser, label_video, sampling_interval
+
+
+class BudgetManager(SyncManager):
+    """托管全局限流器与请求信号量，供所有工作进程通过代理共享"""
+
+
+BudgetManager.register("ProviderRateLimiter", ProviderRateLimiter)
+
+# 工作进程内的共享配额代理（由 _init_worker 设置）
+_worker_rate_limiter = None
+_worker_request_slots = None
+
+
+def _init_worker(rate_limiter, request_slots):
+    global _worker_rate_limiter, _worker_request_slots
+    _worker_rate_limiter = rate_limiter
+    _worker_request_slots = request_slots
+
+
+def _label_one(video_path: str, output_path: str, video_args: List[str], log_path: str) -> Dict:
+    """在工作进程中标注单个视频，输出写入独立日志"""
+    args = build_parser().parse_args(video_args + [video_path, "--output", output_path])
+    summary = {"video": video_path, "output": output_path, "log": log_path}
+
+    with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log):
+        try:
+            summary.update(label_video(args, _worker_rate_limiter, _worker_request_slots))
+            summary["status"] = "done"
+        except Exception as e:
+            traceback.print_exc(file=log)
+            summary["status"] = "failed"
+            summary["error"] = str(e)
+    return summary
+
+
+def is_finished(output_path: str, final_output: str) -> bool:
+    """
+    视频是否已完整标注（可以跳过）
+
+    有失败帧时 label_video 仍会写出输出文件，但保留检查点供重新运行；这类视频不能跳过，
+    重新运行时从检查点续跑，只请求失败的帧。输出存在且检查点已删除，或运行摘要中没有失败帧时才算完成。
+    """
+    if not os.path.exists(final_output):
+        return False
+    if not os.path.exists(checkpoint_path_for(output_path)):
+        return True
+    try:
+        with open(summary_path_for(output_path), "r", encoding="utf-8") as f:
+            return json.load(f).get("failed_frames") == 0
+    except (OSError, ValueError):
+        return False
+
+
+def collect_videos(patterns: List[str], manifest: str = None) -> List[str]:
+    """展开 glob 模式与清单文件（每行一个路径，# 开头为注释），去重并保持顺序"""
+    videos = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        videos.extend(matches if matches else [pattern])
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    videos.append(line)
+    return list(dict.fromkeys(videos))
+
+
+def build_batch_summary(
+    done: List[Dict],
+    failed: List[Dict],
+    skipped: List[str],
+    elapsed: float,
+    provider: str
+) -> Dict:
+    """汇总各视频的运行摘要（延迟分位数按所有请求重新计算）"""
+    pricing = API_PROVIDERS[provider].get("pricing") or {}
+    latencies = [latency for r in done for latency in r.get("latencies", [])]
+    prompt_tokens = sum(r["usage"]["prompt_tokens"] for r in done)
+    completion_tokens = sum(r["usage"]["completion_tokens"] for r in done)
+    cached_tokens = sum(r["usage"].get("cached_tokens", 0) for r in done)
+    cache_write_tokens = sum(r["usage"].get("cache_write_tokens", 0) for r in done)
+    total_frames = sum(r["frames"] for r in done)
+
+    usage = {
+        "requests": sum(r["usage"]["requests"] for r in done),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_write_tokens": cache_write_tokens,
+        "cache_hit_ratio": cached_tokens / prompt_tokens if prompt_tokens else None,
+        "cost": estimate_cost(prompt_tokens, completion_tokens, pricing, cached_tokens, cache_write_tokens),
+        "currency": pricing.get("currency"),
+    }
+    usage.update(latency_summary(latencies))
+
+    return {
+        "provider": provider,
+        "videos_done": len(done),
+        "videos_failed": len(failed),
+        "videos_skipped": len(skipped),
+        "frames": total_frames,
+        "failed_frames": sum(r["failed_frames"] for r in done),
+        "elapsed": elapsed,
+        "frames_per_second": total_frames / elapsed if elapsed > 0 else None,
+        "usage": usage,
+        "videos": [
+            {k: v for k, v in r.items() if k != "latencies"} for r in done + failed
+        ],
+        "skipped": skipped
+    }
+
+
+def split_argv(argv: List[str]):
+    """按 "--" 分开批处理参数与透传给 video_auto_labeling.py 的参数"""
+    if "--" in argv:
+        i = argv.index("--")
+        return argv[:i], argv[i + 1:]
+    return argv, []
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="多视频批量自动标注（进程池 + 全局API限流）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("inputs", nargs="*", help="视频文件或 glob 模式（需加引号）")
+    parser.add_argument("--manifest", help="视频清单文件，每行一个路径")
+    parser.add_argument("--output-dir", default="labels/batch_output/json",
+                        help="输出目录")
+    parser.add_argument("--suffix",
+                        help="输出文件名后缀，可使用 {sample_rate}/{every_seconds}"
+                             "（默认 _sr{sample_rate}，按时间采样时为 _every{every_seconds}s）")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="并行处理的视频数（进程数）")
+    parser.add_argument("--api-concurrency", type=int,
+                        help="所有进程合计的同时在途API请求数（默认取提供商配置）")
+    parser.add_argument("--limit", type=int,
+                        help="最多处理的视频数")
+
+    own_argv, video_args = split_argv(sys.argv[1:])
+    args = parser.parse_args(own_argv)
+    for option in ("--output", "--summary"):
+        if option in video_args:
+            parser.error(f"{option} 由批处理按视频自动生成，请使用 --output-dir")
+
+    # 用单视频参数解析器校验透传参数，并取出提供商/采样率
+    video_defaults = build_parser().parse_args(video_args + ["placeholder.mp4"])
+    provider_config = API_PROVIDERS[video_defaults.provider]
+    api_concurrency = args.api_concurrency or provider_config.get("max_concurrency", 1)
+
+    videos = collect_videos(args.inputs, args.manifest)
+    if args.limit:
+        videos = videos[:args.limit]
+    if not videos:
+        parser.error("没有找到视频文件")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    log_dir = os.path.join(args.output_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    every_seconds = sampling_interval(video_defaults)
+    suffix = args.suffix or ("_every{every_seconds}s" if every_seconds else "_sr{sample_rate}")
+    suffix = suffix.format(sample_rate=video_defaults.sample_rate, every_seconds=f"{every_seconds or 0:g}")
+
+    print("=" * 70)
+    print("🚀 批量自动标注")
+    print("=" * 70)
+    print(f"  视频数量: {len(videos)}")
+    print(f"  并行进程: {args.workers}")
+    print(f"  API提供商: {video_defaults.provider}（全局并发 {api_concurrency}）")
+    print(f"  输出目录: {args.output_dir}")
+    print()
+
+    jobs = []
+    skipped = []
+    for video in videos:
+        stem = Path(video).stem
+        output = os.path.join(args.output_dir, f"{stem}{suffix}.json")
+        final_output = f"{output}.gz" if video_defaults.gzip else output
+        if video_defaults.shard_size:
+            final_output = shard_path(final_output, 0)
+        if is_finished(output, final_output):
+            print(f"⏭️  跳过（已完成）: {final_output}")
+            skipped.append(video)
+            continue
+        if os.path.exists(final_output):
+            print(f"🔁 续跑（上次有失败帧，从检查点重试）: {final_output}")
+        jobs.append((video, output, os.path.join(log_dir, f"{stem}{suffix}.log")))
+
+    start_time = time.time()
+    results = []
+    with BudgetManager() as manager:
+        # --no-rate-limit 传给单视频脚本时，共享限流器同样不限制
+        rate_limit = None if video_defaults.no_rate_limit else provider_config.get("rate_limit")
+        rate_limiter = manager.ProviderRateLimiter(rate_limit)
+        request_slots = manager.BoundedSemaphore(api_concurrency)
+
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(rate_limiter, request_slots)
+        ) as executor:
+            futures = [executor.submit(_label_one, video, output, video_args, log)
+                       for video, output, log in jobs]
+            for i, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                name = Path(result["video"]).stem
+                if result["status"] == "done":
+                    print(f"[{i}/{len(jobs)}] ✅ {name}: {result['frames']} 帧，"
+                          f"{result['elapsed']:.1f} 秒"
+                          + (f"，{result['failed_frames']} 帧失败" if result["failed_frames"] else ""))
+                else:
+                    print(f"[{i}/{len(jobs)}] ❌ {name}: {result['error']}（日志: {result['log']}）")
+
+    elapsed = time.time() - start_time
+    done = [r for r in results if r["status"] == "done"]
+    failed = [r for r in results if r["status"] == "failed"]
+    total_frames = sum(r["frames"] for r in done)
+    summary = build_batch_summary(done, failed, skipped, elapsed, video_defaults.provider)
+    summary_path = os.path.join(args.output_dir, "batch_summary.json")
+    write_summary(summary_path, summary)
+    usage = summary["usage"]
+
+    print()
+    print("=" * 70)
+    print("📊 处理统计")
+    print("=" * 70)
+    print(f"  成功: {len(done)}，跳过: {len(skipped)}，失败: {len(failed)}")
+    print(f"  标注帧数: {total_frames}（失败帧 {sum(r['failed_frames'] for r in done)}）")
+    print(f"  总耗时: {elapsed / 60:.1f} 分钟")
+    if elapsed > 0:
+        print(f"  吞吐量: {total_frames / elapsed:.2f} 帧/秒，{len(done) / elapsed * 3600:.1f} 视频/小时")
+    if usage["requests"]:
+        print(f"  API请求: {usage['requests']} 个，输入 {usage['prompt_tokens']} / 输出 {usage['completion_tokens']} token")
+    if usage["cached_tokens"]:
+        print(f"  提示缓存: 命中 {usage['cached_tokens']} token（{usage['cache_hit_ratio']:.0%}）")
+    if usage["latency_p50_ms"] is not None:
+        print(f"  延迟: p50 {usage['latency_p50_ms']:.0f} ms，p95 {usage['latency_p95_ms']:.0f} ms")
+    if usage["cost"] is not None:
+        print(f"  费用: {usage['cost']:.4f} {usage['currency']}")
+    print(f"  摘要: {summary_path}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+基准结果的基线对比 - benchmark_decode.py、benchmark_labeling.py、benchmark_startup.py 共用
+结果 JSON 的 "results" 为 {测试项: {指标: 数值, ...}}；与之前的结果（--baseline）逐项对比，
+任一指标变差超过容差（--tolerance）时列出回归项，退出码为1
+
+指标用 (字段名, 显示名, 越大越好, 数值格式) 描述，例如：
+    ("frames_per_second", "帧/秒", True, ".1f")
+    ("ms", "耗时(ms)", False, ".0f")
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+Metric = Tuple[str, str, bool, str]
+
+
+def add_baseline_args(parser: argparse.ArgumentParser, metrics: Sequence[Metric], tolerance: float):
+    """添加 --baseline 与 --tolerance 参数"""
+    worse = "或".join(f"{label}{'下降' if higher else '增加'}" for _, label, higher, _ in metrics)
+    parser.add_argument("--baseline", help="之前的结果 JSON，用于回归对比")
+    parser.add_argument("--tolerance", type=float, default=tolerance,
+                        help=f"回归容差（{worse}超过该比例时退出码为1）")
+
+
+def load_baseline(path: Optional[str]) -> Optional[Dict[str, Dict]]:
+    """读取基线结果的 results（未指定 --baseline 时返回 None）"""
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    metrics: Sequence[Metric],
+    tolerance: float
+) -> List[str]:
+    """返回回归项描述（基线中没有的测试项、缺失或为0的指标不比较）"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        for key, label, higher, fmt in metrics:
+            if not old.get(key) or not result.get(key):
+                continue
+            if higher:
+                regressed = result[key] < old[key] * (1 - tolerance)
+            else:
+                regressed = result[key] > old[key] * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{name}: {label} {old[key]:{fmt}} -> {result[key]:{fmt}}")
+    return regressions
+
+
+def check_baseline(
+    results: Dict[str, Dict],
+    baseline: Optional[Dict[str, Dict]],
+    metrics: Sequence[Metric],
+    tolerance: float,
+    title: str = "性能回归"
+):
+    """打印对比结论；有回归时以退出码1结束（未指定基线时什么都不做）"""
+    if baseline is None:
+        return
+    regressions = compare_with_baseline(results, baseline, metrics, tolerance)
+    if regressions:
+        print(f"\n❌ {title}（容差 {tolerance:.0%}）:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\n✅ 与基线相比无回归（容差 {tolerance:.0%}）")
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+解码与检测微基准 - 帧提取、图片编码和 YOLO 推理路径的耗时
+用 cv2.VideoWriter 在本地生成不同分辨率/时长的合成视频，完全离线运行；
+结果写成 JSON，可用 --baseline 与之前的提交对比
+
+测试项：
+  extract  VideoFrameExtractor 按不同采样率提取并编码（稀疏/全量解码）
+  encode   单帧 JPEG 编码（原分辨率 / 各提供商上传策略）与 base64 的耗时和字节数
+  yolo     YOLOVideoLabeler 逐帧推理 vs 批量推理的吞吐量（加 --tile 时另测切片推理）
+
+本地已有模型权重（--model 指向的文件存在且安装了 ultralytics）时使用真实模型，
+否则使用桩模型：只做 640 letterbox 预处理并返回固定框，此时 yolo 项衡量的是
+解码、预取、批处理与结果解析的开销，不含推理本身。
+
+用法:
+  python scripts/benchmark_decode.py --output bench_decode.json
+  python scripts/benchmark_decode.py --resolutions 1920x1080 --seconds 30 --only extract yolo
+  python scripts/benchmark_decode.py --baseline bench_decode.json --tolerance 0.15
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmark_baseline import add_baseline_args, check_baseline, load_baseline
+from benchmark_labeling import make_synthetic_video
+from image_policy import encode_with_policy
+from video_auto_labeling import API_PROVIDERS, VideoFrameExtractor
+from video_io import encode_jpeg, iter_sampled_frames
+from tiling import TileGrid
+from yolo_auto_labeling import YOLOVideoLabeler, load_yolo
+
+# 桩模型输出的类别（COCO 类别id -> 英文名），与真实模型走同一条结果解析路径
+STUB_CLASS_NAMES = {
+    0: "person", 1: "bicycle", 2: "car", 3: "motorcycle",
+    5: "bus", 7: "truck", 9: "traffic light", 11: "stop sign"
+}
+
+# 与 --baseline 对比的指标（见 benchmark_baseline.py）
+METRICS = [("frames_per_second", "帧/秒", True, ".1f")]
+
+
+class _StubTensor:
+    """模拟 torch 张量的 .cpu().numpy() 接口"""
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _StubBoxes:
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy = _StubTensor(xyxy)
+        self.conf = _StubTensor(conf)
+        self.cls = _StubTensor(cls)
+
+    def __len__(self):
+        return len(self.cls.array)
+
+
+class _StubResult:
+    def __init__(self, boxes: _StubBoxes):
+        self.boxes = boxes
+
+
+class StubYOLO:
+    """
+    无权重时的桩模型：接口同 ultralytics YOLO 的 model(frames, conf=, classes=, verbose=)
+    每帧做 letterbox 缩放到 imgsz，返回固定的几个框
+    """
+
+    def __init__(self, imgsz: int = 640, boxes_per_frame: int = 6):
+        self.names = STUB_CLASS_NAMES
+        self.imgsz = imgsz
+        rng = np.random.default_rng(0)
+        xy = rng.uniform(0, 0.8, (boxes_per_frame, 2))
+        wh = rng.uniform(0.05, 0.2, (boxes_per_frame, 2))
+        self.boxes = np.hstack([xy, xy + wh]).astype(np.float32)
+        self.conf = rng.uniform(0.3, 0.95, boxes_per_frame).astype(np.float32)
+        self.cls = rng.choice(list(STUB_CLASS_NAMES), boxes_per_frame).astype(np.float32)
+
+    def _letterbox(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scale = self.imgsz / max(height, width)
+        resized = cv2.resize(frame, (round(width * scale), round(height * scale)))
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        canvas[:resized.shape[0], :resized.shape[1]] = resized
+        return canvas
+
+    def __call__(self, frames: List[np.ndarray], conf: float = 0.25, classes=None, verbose: bool = False):
+        # 与真实模型一样整批 letterbox + 归一化（桩模型唯一的计算量）
+        np.stack([self._letterbox(frame) for frame in frames]).astype(np.float32) / 255.0
+        keep = self.conf >= conf
+        if classes is not None:
+            keep &= np.isin(self.cls, classes)
+        results = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            xyxy = self.boxes[keep] * np.array([width, height, width, height], dtype=np.float32)
+            results.append(_StubResult(_StubBoxes(xyxy, self.conf[keep], self.cls[keep])))
+        return results
+
+
+def best_of(fn: Callable[[], int], repeat: int) -> Dict:
+    """运行 repeat 次取最短耗时；fn 返回处理的帧数"""
+    best = None
+    frames = 0
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):  # 屏蔽被测函数内部的进度输出
+            start_time = time.perf_counter()
+            frames = fn()
+            elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "frames": frames,
+        "seconds": best,
+        "frames_per_second": frames / best if best else None
+    }
+
+
+def bench_extract(video: str, sample_rates: List[int], policy: Optional[Dict], repeat: int) -> Dict[str, Dict]:
+    """VideoFrameExtractor 的提取+编码耗时，以及同采样率下仅解码的耗时"""
+    results = {}
+    for sample_rate in sample_rates:
+        for sparse in (True, False):
+            mode = "sparse" if sparse else "dense"
+
+            def decode_only():
+                cap = cv2.VideoCapture(video)
+                try:
+                    return sum(1 for _ in iter_sampled_frames(cap, sample_rate, sparse=sparse))
+                finally:
+                    cap.release()
+
+            def extract():
+                extractor = VideoFrameExtractor(video, sample_rate, sparse_decode=sparse, image_policy=policy)
+                return sum(1 for _ in extractor.iter_frames())
+
+            results[f"decode/sr{sample_rate}/{mode}"] = best_of(decode_only, repeat)
+            results[f"extract/sr{sample_rate}/{mode}"] = best_of(extract, repeat)
+    return results
+
+
+def sample_frames(video: str, count: int) -> List[np.ndarray]:
+    """均匀取 count 帧用于编码测试"""
+    cap = cv2.VideoCapture(video)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, total // count)
+    frames = [frame for _, frame in iter_sampled_frames(cap, step, sparse=True)][:count]
+    cap.release()
+    return frames
+
+
+def bench_encode(frames: List[np.ndarray], providers: List[str], repeat: int) -> Dict[str, Dict]:
+    """单帧编码耗时与大小：原分辨率 JPEG（质量95）、各提供商上传策略，以及 base64"""
+    encoders = {"jpeg95": lambda frame: encode_jpeg(frame)}
+    for provider in providers:
+        policy = API_PROVIDERS[provider].get("image")
+        encoders[provider] = lambda frame, policy=policy: encode_with_policy(frame, policy)[0]
+
+    results = {}
+    for name, encode in encoders.items():
+        encoded = [encode(frame) for frame in frames]
+        result = best_of(lambda: sum(1 for frame in frames if encode(frame)), repeat)
+        result["ms_per_frame"] = result["seconds"] / len(frames) * 1000
+        result["bytes_per_frame"] = sum(len(data) for data in encoded) / len(encoded)
+
+        b64 = best_of(lambda: sum(1 for data in encoded if base64.b64encode(data)), repeat)
+        result["base64_ms_per_frame"] = b64["seconds"] / len(frames) * 1000
+        results[f"encode/{name}"] = result
+    return results
+
+
+def bench_yolo(
+    labeler: YOLOVideoLabeler,
+    video: str,
+    sample_rate: int,
+    batch_sizes: List[int],
+    repeat: int,
+    tiling: Optional[TileGrid] = None
+) -> Dict[str, Dict]:
+    """逐帧（batch_size=1）与批量推理的端到端吞吐量（含解码、预取与结果解析），指定 tiling 时另测切片推理"""
+    results = {}
+    for batch_size in batch_sizes:
+        for tiles in ([None, tiling] if tiling is not None else [None]):
+            def detect():
+                return sum(1 for _ in labeler.iter_detect_video(
+                    video, sample_rate, batch_size=batch_size, tiling=tiles
+                ))
+            name = f"yolo/sr{sample_rate}/batch{batch_size}" + ("/tiled" if tiles is not None else "")
+            results[name] = best_of(detect, repeat)
+    return results
+
+
+def load_model(model_path: str):
+    """本地有权重且安装了 ultralytics 时加载真实模型，否则返回桩模型；返回 (模型, 描述)"""
+    if os.path.exists(model_path):
+        try:
+            import ultralytics  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            with redirect_stdout(io.StringIO()):
+                return load_yolo(model_path), os.path.basename(model_path)
+    return StubYOLO(), "stub"
+
+
+def print_results(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None):
+    print(f"{'测试项':<44}{'帧数':>6}{'耗时(s)':>9}{'帧/秒':>9}{'基线':>9}  其他")
+    for name, r in results.items():
+        old = (baseline or {}).get(name)
+        old_fps = f"{old['frames_per_second']:.1f}" if old and old.get("frames_per_second") else "-"
+        extra = ""
+        if "ms_per_frame" in r:
+            extra = (f"{r['ms_per_frame']:.2f} ms/帧，{r['bytes_per_frame'] / 1024:.0f} KB，"
+                     f"base64 {r['base64_ms_per_frame']:.2f} ms/帧")
+        print(f"{name:<44}{r['frames']:>6}{r['seconds']:>9.3f}{r['frames_per_second']:>9.1f}{old_fps:>9}  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="解码与检测微基准（合成视频，离线运行）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720", "1920x1080"],
+                        help="合成视频分辨率")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10.0],
+                        help="合成视频时长（秒）")
+    parser.add_argument("--fps", type=float, default=30.0, help="合成视频帧率")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[1, 5, 30],
+                        help="extract 测试的采样率")
+    parser.add_argument("--providers", nargs="+", default=["openai", "qwen"],
+                        choices=list(API_PROVIDERS), help="encode 测试的上传策略")
+    parser.add_argument("--encode-frames", type=int, default=20, help="encode 测试的帧数")
+    parser.add_argument("--model", default="yolo11n.pt",
+                        help="YOLO 权重文件（不存在时使用桩模型，不会触发下载）")
+    parser.add_argument("--yolo-sample-rate", type=int, default=5, help="yolo 测试的采样率")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="yolo 测试的批大小")
+    parser.add_argument("--tile", action="store_true",
+                        help="yolo 测试另测切片推理（默认切片参数）")
+    parser.add_argument("--only", nargs="+", choices=["extract", "encode", "yolo"],
+                        help="只运行指定测试项")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最短耗时）")
+    parser.add_argument("--work-dir", help="合成视频目录（已存在的视频会复用，默认临时目录）")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    add_baseline_args(parser, METRICS, tolerance=0.15)
+    args = parser.parse_args()
+
+    suites = set(args.only or ["extract", "encode", "yolo"])
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="decode_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    model_desc = None
+    labeler = None
+    if "yolo" in suites:
+        model, model_desc = load_model(args.model)
+        with redirect_stdout(io.StringIO()):
+            labeler = YOLOVideoLabeler(model_name=model_desc, model=model)
+        print(f"YOLO 模型: {model_desc}" + ("（桩模型，不含推理耗时）" if model_desc == "stub" else ""))
+
+    results = {}
+    clips = []
+    for resolution in args.resolutions:
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        for seconds in args.seconds:
+            clip = f"{width}x{height}_{seconds:g}s"
+            video = os.path.join(work_dir, f"synthetic_{clip}.mp4")
+            if not os.path.exists(video):
+                print(f"生成合成视频: {video}")
+                make_synthetic_video(video, seconds, args.fps, width, height)
+            clips.append({"name": clip, "path": video, "width": width, "height": height,
+                          "seconds": seconds, "fps": args.fps})
+
+            print(f"测试 {clip} ...")
+            clip_results = {}
+            if "extract" in suites:
+                clip_results.update(bench_extract(video, args.sample_rates,
+                                                  API_PROVIDERS["qwen"].get("image"), args.repeat))
+            if "encode" in suites:
+                frames = sample_frames(video, args.encode_frames)
+                clip_results.update(bench_encode(frames, args.providers, args.repeat))
+            if "yolo" in suites:
+                clip_results.update(bench_yolo(labeler, video, args.yolo_sample_rate,
+                                               args.batch_sizes, args.repeat,
+                                               TileGrid() if args.tile else None))
+            results.update({f"{clip}/{name}": r for name, r in clip_results.items()})
+
+    baseline = load_baseline(args.baseline)
+
+    print()
+    print_results(results, baseline)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count()
+        },
+        "model": model_desc,
+        "repeat": args.repeat,
+        "clips": clips,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果: {args.output}")
+
+    check_baseline(results, baseline, METRICS, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
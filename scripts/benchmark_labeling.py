@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+端到端标注吞吐基准 - 本地生成合成视频，对接 mock_vlm_server.py 运行 video_auto_labeling.py
+每个场景在独立子进程中运行，记录帧/秒、服务端观察到的请求重叠度和峰值内存（RSS），
+可与之前保存的报告对比做回归检查，不消耗 API 额度
+
+用法:
+  python scripts/benchmark_labeling.py --concurrency 1 4 8 --frames-per-request 1 2
+  python scripts/benchmark_labeling.py --output bench.json --baseline bench_old.json --tolerance 0.15
+  python scripts/benchmark_labeling.py --latency-ms 1500 --latency-sigma 0.5 --rate-limit-rate 0.05 -- --export-tracks
+
+"--" 之后的参数原样传给 video_auto_labeling.py
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from itertools import product
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from batch_auto_labeling import split_argv
+from benchmark_baseline import add_baseline_args, check_baseline, load_baseline
+from mock_vlm_server import start_server
+from labeler import API_PROVIDERS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 与 --baseline 对比的指标（见 benchmark_baseline.py）
+METRICS = [
+    ("frames_per_second", "帧/秒", True, ".2f"),
+    ("max_rss_mb", "峰值内存(MB)", False, ".0f")
+]
+
+
+def make_synthetic_video(
+    path: str,
+    seconds: float = 20.0,
+    fps: float = 30.0,
+    width: int = 1280,
+    height: int = 720,
+    seed: int = 0
+):
+    """
+    生成带运动目标和噪声纹理的合成视频（编码后大小与真实画面接近，JPEG 编码开销有代表性）
+
+    Args:
+        path: 输出 .mp4 路径
+        seconds: 时长（秒）
+        fps: 帧率
+        width, height: 分辨率
+        seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"无法创建视频: {path}")
+
+    background = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC)
+    boxes = [
+        (rng.uniform(0, width), rng.uniform(height * 0.3, height * 0.8),
+         rng.uniform(-6, 6), rng.integers(40, 200), tuple(int(c) for c in rng.integers(0, 255, 3)))
+        for _ in range(6)
+    ]
+
+    try:
+        for i in range(int(seconds * fps)):
+            frame = np.roll(background, i * 4, axis=1)  # 模拟自车前进时的背景平移
+            for x0, y, vx, size, color in boxes:
+                x = int((x0 + vx * i) % width)
+                cv2.rectangle(frame, (x, int(y)), (x + size, int(y) + size // 2), color, -1)
+            noise = rng.integers(-8, 8, frame.shape, dtype=np.int16)
+            writer.write(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    finally:
+        writer.release()
+
+
+def server_call(server, path: str, method: str = "GET") -> Dict:
+    host, port = server.server_address[:2]
+    request = urllib.request.Request(f"http://{host}:{port}{path}", method=method,
+                                     data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def max_rss_mb(rusage) -> float:
+    """ru_maxrss 换算为 MB（Linux 为 KB，macOS 为字节）"""
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss / (1024 * 1024)
+    return rusage.ru_maxrss / 1024
+
+
+def run_scenario(
+    server,
+    video: str,
+    provider: str,
+    work_dir: str,
+    name: str,
+    scenario_args: List[str]
+) -> Dict:
+    """在子进程中运行一次 video_auto_labeling.py，返回该次运行的指标"""
+    output = os.path.join(work_dir, f"{name}.json")
+    summary_path = os.path.join(work_dir, f"{name}.summary.json")
+    log_path = os.path.join(work_dir, f"{name}.log")
+    command = [
+        sys.executable, os.path.join(SCRIPT_DIR, "video_auto_labeling.py"), video,
+        "--provider", provider,
+        "--endpoint", server.url,
+        "--no-rate-limit", "--no-cache", "--no-checkpoint",
+        "--output", output,
+        "--summary", summary_path
+    ] + scenario_args
+
+    env = dict(os.environ)
+    env.setdefault(API_PROVIDERS[provider]["api_key_env"], "mock")
+
+    server_call(server, "/reset", "POST")
+    start_time = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start_time
+    server_stats = server_call(server, "/stats")
+
+    if process.returncode != 0:
+        raise RuntimeError(f"场景 {name} 运行失败（退出码 {process.returncode}），日志: {log_path}")
+    with open(summary_path, "r", encoding="utf-8") as f:
+        summary = json.load(f)
+
+    return {
+        "frames": summary["frames"],
+        "failed_frames": summary["failed_frames"],
+        "elapsed": summary["elapsed"],
+        "wall": wall,
+        "frames_per_second": summary["frames_per_second"],
+        "requests": server_stats["requests"],
+        "status_counts": server_stats["status_counts"],
+        "peak_inflight": server_stats["peak_inflight"],
+        "mean_inflight": server_stats["mean_inflight"],
+        "latency_p50_ms": summary["usage"]["latency_p50_ms"],
+        "latency_p95_ms": summary["usage"]["latency_p95_ms"],
+        "completion_tokens": summary["usage"]["completion_tokens"],
+        "max_rss_mb": max_rss_mb(rusage)
+    }
+
+
+def median_run(runs: List[Dict]) -> Dict:
+    """多次重复取吞吐量中位数的那一次，并附上全部帧/秒"""
+    ordered = sorted(runs, key=lambda r: r["frames_per_second"])
+    result = dict(ordered[len(ordered) // 2])
+    result["runs_frames_per_second"] = [r["frames_per_second"] for r in runs]
+    result["max_rss_mb"] = max(r["max_rss_mb"] for r in runs)
+    return result
+
+
+def print_table(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None):
+    print(f"{'场景':<16}{'帧数':>6}{'帧/秒':>9}{'基线':>9}{'请求':>6}{'峰值在途':>9}{'平均重叠':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'429/5xx':>9}{'内存 MB':>9}")
+    for name, r in results.items():
+        old = (baseline or {}).get(name)
+        old_fps = f"{old['frames_per_second']:.2f}" if old else "-"
+        errors = sum(v for k, v in r["status_counts"].items() if k != "200")
+        print(f"{name:<16}{r['frames']:>6}{r['frames_per_second']:>9.2f}{old_fps:>9}{r['requests']:>6}"
+              f"{r['peak_inflight']:>9}{r['mean_inflight']:>9.2f}{r['latency_p50_ms'] or 0:>9.0f}"
+              f"{r['latency_p95_ms'] or 0:>9.0f}{errors:>9}{r['max_rss_mb']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="端到端标注吞吐基准（本地模拟服务 + 合成视频）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--video", help="使用已有视频（默认生成合成视频）")
+    parser.add_argument("--seconds", type=float, default=20.0, help="合成视频时长（秒）")
+    parser.add_argument("--fps", type=float, default=30.0, help="合成视频帧率")
+    parser.add_argument("--resolution", default="1280x720", help="合成视频分辨率")
+    parser.add_argument("--provider", default="qwen", choices=["openai", "qwen"],
+                        help="请求格式与图片预处理策略取自该提供商配置")
+    parser.add_argument("--sample-rate", type=int, default=5, help="采样率（每N帧取1帧）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8],
+                        help="要测试的并发请求数")
+    parser.add_argument("--frames-per-request", type=int, nargs="+", default=[1],
+                        help="要测试的每请求帧数")
+    parser.add_argument("--repeat", type=int, default=1, help="每个场景重复次数（取帧/秒中位数）")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="模拟服务延迟中位数（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="模拟服务延迟对数正态 sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务 500 比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模拟服务 429 比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（视频内容与模拟服务）")
+    parser.add_argument("--work-dir", help="输出与日志目录（默认临时目录）")
+    parser.add_argument("--output", help="基准报告 JSON 路径")
+    add_baseline_args(parser, METRICS, tolerance=0.15)
+
+    own_argv, video_args = split_argv(sys.argv[1:])
+    args = parser.parse_args(own_argv)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="labeling_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    video = args.video
+    if not video:
+        width, height = (int(v) for v in args.resolution.lower().split("x"))
+        video = os.path.join(work_dir, f"synthetic_{width}x{height}_{args.seconds:g}s.mp4")
+        print(f"生成合成视频: {video}")
+        make_synthetic_video(video, args.seconds, args.fps, width, height, args.seed)
+
+    server_config = {
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "retry_after": 0.2,
+        "seed": args.seed
+    }
+    server = start_server(address=("127.0.0.1", 0), **server_config)
+    print(f"模拟服务: {server.url}")
+    print(f"工作目录: {work_dir}\n")
+
+    results = {}
+    try:
+        for concurrency, frames_per_request in product(args.concurrency, args.frames_per_request):
+            name = f"c{concurrency}_f{frames_per_request}"
+            scenario_args = [
+                "--sample-rate", str(args.sample_rate),
+                "--concurrency", str(concurrency),
+                "--frames-per-request", str(frames_per_request)
+            ] + video_args
+            runs = [run_scenario(server, video, args.provider, work_dir, f"{name}_{i}", scenario_args)
+                    for i in range(args.repeat)]
+            results[name] = median_run(runs)
+            print(f"  {name}: {results[name]['frames_per_second']:.2f} 帧/秒")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    baseline = load_baseline(args.baseline)
+
+    print()
+    print_table(results, baseline)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count()
+        },
+        "video": video,
+        "provider": args.provider,
+        "sample_rate": args.sample_rate,
+        "extra_args": video_args,
+        "server": server_config,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基准报告: {args.output}")
+
+    check_baseline(results, baseline, METRICS, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准 - 各入口脚本的 --help、模块导入和标注器创建耗时
+单张图片标注、批处理子进程（spawn 启动方式）都要付一次启动开销，重模块（cv2、scipy、
+requests、提供商 SDK）应在第一次用到时才导入；结果写成 JSON，可用 --baseline 对比
+
+测试项（每项在新的解释器进程中运行，取 --repeat 次中的最短耗时）：
+  <脚本>/help     python scripts/<脚本>.py --help 的总耗时（含解释器启动）
+  <脚本>/import   -X importtime 统计的模块导入耗时，并列出已加载的重模块
+  labeler/<提供商> 导入 labeler 并创建 MultiModalLabeler（批处理子进程的启动路径）
+
+用法:
+  python scripts/benchmark_startup.py --output bench_startup.json
+  python scripts/benchmark_startup.py --baseline bench_startup.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmark_baseline import add_baseline_args, check_baseline, load_baseline
+from labeler import API_PROVIDERS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 与 --baseline 对比的指标（见 benchmark_baseline.py）
+METRICS = [("ms", "耗时(ms)", False, ".0f")]
+
+ENTRY_SCRIPTS = [
+    "image_auto_labeling",
+    "video_auto_labeling",
+    "yolo_auto_labeling",
+    "cascade_auto_labeling",
+    "batch_auto_labeling",
+    "mock_vlm_server"
+]
+
+HEAVY_MODULES = ["cv2", "numpy", "scipy", "requests", "anthropic", "ultralytics", "torch"]
+
+# 在子进程中执行：导入后打印已加载的重模块
+_LOADED_CODE = "import sys, json; {setup}; print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+
+
+def _run(args: List[str], env: Optional[Dict] = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable] + args, cwd=SCRIPT_DIR, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
+    )
+
+
+def best_wall_ms(args: List[str], repeat: int, env: Optional[Dict] = None) -> float:
+    """新进程运行 repeat 次取最短墙钟耗时（毫秒）"""
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        _run(args, env)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def import_ms(module: str, repeat: int) -> float:
+    """-X importtime 报告的模块累计导入耗时（毫秒，取最短）"""
+    best = None
+    for _ in range(repeat):
+        stderr = _run(["-X", "importtime", "-c", f"import {module}"]).stderr
+        for line in reversed(stderr.splitlines()):
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == module:
+                elapsed = int(fields[1]) / 1000
+                best = elapsed if best is None else min(best, elapsed)
+                break
+    return best
+
+
+def loaded_modules(setup: str, env: Optional[Dict] = None) -> List[str]:
+    return json.loads(_run(["-c", _LOADED_CODE.format(setup=setup, heavy=HEAVY_MODULES)], env).stdout)
+
+
+def bench_scripts(scripts: List[str], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for script in scripts:
+        results[f"{script}/help"] = {"ms": best_wall_ms([f"{script}.py", "--help"], repeat)}
+        results[f"{script}/import"] = {
+            "ms": import_ms(script, repeat),
+            "heavy_modules": loaded_modules(f"import {script}")
+        }
+    return results
+
+
+def bench_labelers(providers: List[str], repeat: int) -> Dict[str, Dict]:
+    """创建标注器（不发请求），API 密钥用占位值"""
+    results = {}
+    for provider in providers:
+        env = dict(os.environ)
+        env.setdefault(API_PROVIDERS[provider]["api_key_env"], "benchmark")
+        setup = f"import labeler; labeler.MultiModalLabeler({provider!r})"
+        try:
+            heavy = loaded_modules(setup, env)
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️  跳过 labeler/{provider}: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        results[f"labeler/{provider}"] = {
+            "ms": best_wall_ms(["-c", setup], repeat, env),
+            "heavy_modules": heavy
+        }
+    return results
+
+
+def print_results(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None):
+    print(f"{'测试项':<36}{'耗时(ms)':>10}{'基线':>10}  已加载的重模块")
+    for name, r in results.items():
+        old = (baseline or {}).get(name)
+        old_ms = f"{old['ms']:.0f}" if old and old.get("ms") else "-"
+        heavy = ", ".join(r["heavy_modules"]) if "heavy_modules" in r else ""
+        print(f"{name:<36}{r['ms']:>10.0f}{old_ms:>10}  {heavy}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="启动耗时基准（入口脚本 --help / 模块导入 / 标注器创建）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--scripts", nargs="+", default=ENTRY_SCRIPTS, choices=ENTRY_SCRIPTS,
+                        help="测试的入口脚本")
+    parser.add_argument("--providers", nargs="+", default=["openai", "qwen", "gemini"],
+                        choices=list(API_PROVIDERS), help="测试标注器创建的提供商")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数（取最短耗时）")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    add_baseline_args(parser, METRICS, tolerance=0.25)
+    args = parser.parse_args()
+
+    results = bench_scripts(args.scripts, args.repeat)
+    results.update(bench_labelers(args.providers, args.repeat))
+    results["python/baseline"] = {"ms": best_wall_ms(["-c", "pass"], args.repeat)}
+
+    baseline = load_baseline(args.baseline)
+
+    print_results(results, baseline)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "repeat": args.repeat,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果: {args.output}")
+
+    check_baseline(results, baseline, METRICS, args.tolerance, title="启动耗时回归")
+
+
+if __name__ == "__main__":
+    main()
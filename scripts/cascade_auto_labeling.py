@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+YOLO + 多模态大模型 级联自动标注
+YOLO（本地、免费）先标注所有采样帧，只有"不确定"的帧才升级给多模态模型（付费），
+两者结果合并为一个 Label Studio 导入文件
+"""
+
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from yolo_auto_labeling import YOLOVideoLabeler
+from labeler import API_PROVIDERS, OBJECT_CATEGORIES, MultiModalLabeler
+from video_auto_labeling import frame_to_label_studio_results
+from response_cache import DEFAULT_CACHE_PATH, ResponseCache
+from image_policy import encode_with_policy
+from label_export import TaskWriter
+from roi import parse_roi
+from usage_stats import summary_path_for, write_summary
+
+# YOLO 中文类别 -> 多模态模型标注类别（OBJECT_CATEGORIES）
+YOLO_TO_VLM_CATEGORY = {
+    "行人": "行人",
+    "汽车": "汽车",
+    "公交车": "汽车",
+    "卡车": "汽车",
+    "摩托车": "摩托车",
+    "自行车": "自行车",
+    "交通信号灯": "交通信号灯",
+    "停止标志": "交通标志",
+}
+
+
+def bbox_iou(a: List[float], b: List[float]) -> float:
+    """两个 [x_min, y_min, x_max, y_max] 框的 IoU"""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def iter_escalation(
+    detections: Iterable[Dict],
+    min_confidence: float = 0.5,
+    vlm_interval: int = 10,
+    neighbor_diff: int = 2
+) -> Iterator[Tuple[Dict, List[str]]]:
+    """
+    逐帧判断是否升级给多模态模型（生成器，条件见 select_escalation_frames）
+
+    相邻帧不一致需要看后一帧，因此每帧在收到下一帧的检测结果后才产出（最后一帧在输入结束时产出），
+    调用方只需暂存最近一两帧的画面。
+
+    Yields:
+        (检测结果, [升级原因, ...])，不升级时原因列表为空
+    """
+    def reasons_for(index, frame_data, signature, neighbors):
+        reasons = []
+        max_conf = max((obj["confidence"] for obj in frame_data["objects"]), default=0.0)
+        if max_conf < min_confidence:
+            reasons.append("low_confidence")
+        if vlm_interval and index % vlm_interval == 0:
+            reasons.append("coverage")
+        if neighbors and all(
+            sum(((signature - n) + (n - signature)).values()) >= neighbor_diff
+            for n in neighbors
+        ):
+            reasons.append("disagreement")
+        return reasons
+
+    previous = None  # 上一帧的类别计数
+    pending = None   # (下标, 检测结果, 类别计数)：等待下一帧的帧
+    for index, frame_data in enumerate(detections):
+        signature = Counter(obj["category"] for obj in frame_data["objects"])
+        if pending is not None:
+            i, pending_data, pending_signature = pending
+            neighbors = [n for n in (previous, signature) if n is not None]
+            yield pending_data, reasons_for(i, pending_data, pending_signature, neighbors)
+            previous = pending_signature
+        pending = (index, frame_data, signature)
+
+    if pending is not None:
+        i, pending_data, pending_signature = pending
+        neighbors = [previous] if previous is not None else []
+        yield pending_data, reasons_for(i, pending_data, pending_signature, neighbors)
+
+
+def select_escalation_frames(
+    detections: List[Dict],
+    min_confidence: float = 0.5,
+    vlm_interval: int = 10,
+    neighbor_diff: int = 2
+) -> Dict[int, List[str]]:
+    """
+    选出需要升级给多模态模型的帧
+
+    升级条件（满足任一）：
+        low_confidence - 该帧最高置信度低于 min_confidence（包括没有检测到目标）
+        coverage       - 每 vlm_interval 个采样帧升级一次，覆盖 YOLO 无法识别的类别
+                         （施工区域、停止标志以外的交通标志）
+        disagreement   - 与前后相邻采样帧的类别计数差异都不小于 neighbor_diff
+
+    Returns:
+        {原始帧号: [升级原因, ...]}
+    """
+    return {
+        frame_data["frame"]: reasons
+        for frame_data, reasons in iter_escalation(detections, min_confidence, vlm_interval, neighbor_diff)
+        if reasons
+    }
+
+
+def merge_annotations(
+    yolo_objects: List[Dict],
+    vlm_objects: List[Dict],
+    iou_threshold: float = 0.5
+) -> List[Dict]:
+    """
+    合并同一帧的 YOLO 与多模态模型结果
+
+    以多模态模型结果为主；YOLO 框若与同类别的模型框 IoU 不低于阈值则视为重复丢弃，
+    其余 YOLO 框保留（模型漏检的目标）。
+    """
+    merged = [dict(obj, source="vlm") for obj in vlm_objects]
+    for obj in yolo_objects:
+        duplicate = any(
+            v["category"] == obj["category"] and bbox_iou(v["bbox"], obj["bbox"]) >= iou_threshold
+            for v in vlm_objects
+        )
+        if not duplicate:
+            merged.append(obj)
+    return merged
+
+
+def yolo_to_vlm_objects(objects: List[Dict]) -> List[Dict]:
+    """把 YOLO 检测结果转换为多模态模型的类别体系"""
+    converted = []
+    for obj in objects:
+        category = YOLO_TO_VLM_CATEGORY.get(obj["category"])
+        if category is None:
+            continue
+        converted.append({
+            "category": category,
+            "bbox": obj["bbox"],
+            "confidence": obj["confidence"],
+            "source": "yolo"
+        })
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="YOLO + 多模态大模型 级联自动标注",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例用法:
+  # YOLO 标注所有采样帧，不确定的帧交给 Qwen
+  python cascade_auto_labeling.py video.mp4 --provider qwen
+
+  # 更严格的升级条件（更省钱）
+  python cascade_auto_labeling.py video.mp4 --escalate-below 0.35 --vlm-interval 20
+        """
+    )
+    parser.add_argument("video_path", help="视频文件路径")
+    parser.add_argument("--provider", default="qwen", choices=list(API_PROVIDERS),
+                        help="API提供商")
+    parser.add_argument("--model", default="yolo11n.pt",
+                        choices=["yolo11n.pt", "yolo11s.pt", "yolo11m.pt", "yolo11l.pt", "yolo11x.pt"],
+                        help="YOLO模型大小")
+    parser.add_argument("--confidence", type=float, default=0.25,
+                        help="YOLO置信度阈值")
+    parser.add_argument("--sample-rate", type=int, default=30,
+                        help="采样率（每N帧标注一次）")
+    timing = parser.add_mutually_exclusive_group()
+    timing.add_argument("--target-fps", type=float,
+                        help="按时间采样：每秒标注的帧数（与视频帧率无关，优先于 --sample-rate）")
+    timing.add_argument("--every-seconds", type=float,
+                        help="按时间采样：每隔N秒标注一帧")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="YOLO每次模型调用处理的帧数")
+    parser.add_argument("--tile", action="store_true",
+                        help="YOLO 对画面上部做切片推理，提高远处信号灯/标志的召回")
+    parser.add_argument("--escalate-below", type=float, default=0.5,
+                        help="帧内最高置信度低于该值时升级给多模态模型")
+    parser.add_argument("--vlm-interval", type=int, default=10,
+                        help="每N个采样帧固定升级一次，覆盖YOLO无法识别的类别（0=关闭）")
+    parser.add_argument("--neighbor-diff", type=int, default=2,
+                        help="与前后相邻帧的类别计数差异都不小于该值时升级")
+    parser.add_argument("--merge-iou", type=float, default=0.5,
+                        help="合并时判定YOLO框与模型框重复的IoU阈值")
+    parser.add_argument("--concurrency", type=int,
+                        help="同时在途的API请求数（默认取提供商配置）")
+    parser.add_argument("--frames-per-request", type=int, default=1,
+                        help="每个请求打包的连续帧数")
+    parser.add_argument("--response-format", default="verbose", choices=["verbose", "compact"],
+                        help="多模态模型输出格式（compact 输出token更少）")
+    parser.add_argument("--roi",
+                        help="自车区域裁剪（YOLO 与多模态模型共用）：预设名、JSON 文件或 x_min,y_min,x_max,y_max")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用响应缓存")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH,
+                        help="响应缓存文件路径（SQLite）")
+    parser.add_argument("--export-tracks", action="store_true",
+                        help="把逐帧框关联成轨迹，按关键帧插值格式导出")
+    parser.add_argument("--output", default="cascade_labels.json",
+                        help="输出JSON文件路径（以 .gz 结尾时 gzip 压缩）")
+    parser.add_argument("--indent", type=int,
+                        help="输出JSON的缩进（默认紧凑输出）")
+    parser.add_argument("--shard-size", type=int,
+                        help="每个输出分片最多的区域数")
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("YOLO + 多模态大模型 级联自动标注")
+    print("=" * 60)
+    print(f"视频文件: {args.video_path}")
+    print(f"YOLO模型: {args.model}")
+    print(f"API提供商: {args.provider}")
+    every_seconds = args.every_seconds or (1.0 / args.target_fps if args.target_fps else None)
+    if every_seconds:
+        print(f"采样: 每 {every_seconds:g} 秒")
+    else:
+        print(f"采样率: 每 {args.sample_rate} 帧")
+    roi = parse_roi(args.roi)
+    if roi is not None:
+        print(f"ROI: {roi.name}，保留画面 {roi.kept_fraction:.0%}")
+    print("=" * 60)
+
+    tiling = None
+    if args.tile:
+        from tiling import TileGrid
+        tiling = TileGrid()
+
+    cache = None if args.no_cache else ResponseCache(args.cache_path)
+    labeler = MultiModalLabeler(
+        provider=args.provider,
+        max_concurrency=args.concurrency,
+        cache=cache,
+        response_format=args.response_format,
+        roi=roi
+    )
+
+    # 1-2. YOLO 标注所有采样帧，同时选出需要升级的帧
+    # 升级帧在检测时就按图片策略编码保留下来，第 3 步不再重新解码视频；
+    # 是否升级要等下一帧的检测结果，期间只暂存最近的画面
+    print("\n[1/4] YOLO 检测所有采样帧...")
+    yolo = YOLOVideoLabeler(model_name=args.model, confidence=args.confidence, roi=roi)
+    recent_frames = {}
+    detections = []
+    escalated = {}
+    escalated_images = []
+    for frame_data, reasons in iter_escalation(
+        yolo.iter_detect_video(
+            args.video_path,
+            sample_rate=args.sample_rate,
+            batch_size=args.batch_size,
+            every_seconds=every_seconds,
+            tiling=tiling,
+            on_frame=recent_frames.__setitem__
+        ),
+        min_confidence=args.escalate_below,
+        vlm_interval=args.vlm_interval,
+        neighbor_diff=args.neighbor_diff
+    ):
+        frame = recent_frames.pop(frame_data["frame"])
+        detections.append(frame_data)
+        if reasons:
+            escalated[frame_data["frame"]] = reasons
+            image_bytes, sent_size = encode_with_policy(frame, labeler.image_policy)
+            labeler.image_stats.record(
+                (yolo.video_info["width"], yolo.video_info["height"]), sent_size, len(image_bytes)
+            )
+            escalated_images.append(image_bytes)
+    video_info = yolo.video_info
+
+    print("\n[2/4] 选择需要升级给多模态模型的帧...")
+    reason_counts = Counter(reason for reasons in escalated.values() for reason in reasons)
+    print(f"升级 {len(escalated)}/{len(detections)} 帧 "
+          f"(低置信度 {reason_counts['low_confidence']}，定期覆盖 {reason_counts['coverage']}，"
+          f"相邻帧不一致 {reason_counts['disagreement']})")
+
+    # 3. 多模态模型标注升级帧
+    print("\n[3/4] 调用多模态模型标注升级帧...")
+    vlm_frames = list(escalated)
+    vlm_annotations = {}
+    for i, annotation in enumerate(labeler.iter_label_images(escalated_images, args.frames_per_request)):
+        vlm_annotations[vlm_frames[i]] = annotation
+        if annotation.get("error"):
+            print(f"❌ 标注帧 {i+1}/{len(escalated)}: 原始帧号 {vlm_frames[i]}，请求失败: {annotation['error']}")
+        else:
+            print(f"标注帧 {i+1}/{len(escalated)}: 原始帧号 {vlm_frames[i]}，"
+                  f"检测到 {len(annotation.get('objects', []))} 个目标")
+
+    labeler.image_stats.print_summary()
+    labeler.usage_stats.print_summary()
+    if cache is not None:
+        cache.close()
+
+    # 4. 合并并导出
+    print("\n[4/4] 合并结果并转换为Label Studio格式...")
+    frame_numbers = []
+    frame_times = []
+    frame_annotations = []
+    failed_frames = []
+    for frame_data in detections:
+        frame_number = frame_data["frame"]
+        objects = yolo_to_vlm_objects(frame_data["objects"])
+        annotation = vlm_annotations.get(frame_number)
+        if annotation is not None:
+            if annotation.get("error"):
+                failed_frames.append(frame_number)
+            else:
+                vlm_objects = [obj for obj in annotation.get("objects", [])
+                               if obj.get("category") in OBJECT_CATEGORIES]
+                objects = merge_annotations(objects, vlm_objects, args.merge_iou)
+        frame_numbers.append(frame_number)
+        frame_times.append(frame_data["time"])
+        frame_annotations.append({"objects": objects})
+
+    if failed_frames:
+        print(f"⚠️  {len(failed_frames)} 个升级帧请求失败，已保留YOLO结果（原始帧号: {failed_frames}）")
+
+    with TaskWriter(args.output, args.video_path, indent=args.indent,
+                    shard_size=args.shard_size) as writer:
+        if args.export_tracks:
+            from tracking import build_track_task
+            task = build_track_task(
+                args.video_path,
+                frame_numbers,
+                frame_annotations,
+                video_info["fps"],
+                video_info["total_frames"],
+                frame_times=frame_times
+            )
+            writer.write_tracks(task["predictions"][0]["result"])
+        else:
+            for frame_number, frame_time, frame_data in zip(frame_numbers, frame_times, frame_annotations):
+                writer.write_frame(frame_to_label_studio_results(frame_number, frame_data, frame_time))
+
+    summary_path = summary_path_for(args.output)
+    write_summary(summary_path, {
+        "video": args.video_path,
+        "outputs": writer.paths,
+        "provider": args.provider,
+        "frames": len(detections),
+        "escalated_frames": len(escalated),
+        "failed_frames": len(failed_frames),
+        "usage": labeler.usage_stats.summary(),
+        "images": labeler.image_stats.summary(),
+        "roi": roi.to_dict() if roi is not None else None
+    })
+
+    print(f"\n✓ 完成！标注结果已保存到: {', '.join(writer.paths)}")
+    print(f"多模态模型调用帧数: {len(escalated)}/{len(detections)} "
+          f"({len(escalated) / max(1, len(detections)):.1%})")
+    print(f"运行摘要: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
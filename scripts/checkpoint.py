@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+逐帧标注检查点 - JSONL 文件，每标注完一帧立即追加一行并落盘
+运行中断后重新运行同一命令，已标注的帧直接从检查点读取，不会重复付费请求
+
+文件格式：
+    第一行   {"meta": {"video": ..., "provider": ..., "model": ..., "sample_rate": ..., ...}}
+    其余各行 {"frame": 原始帧号, "time": 时间戳秒, "annotation": 标注结果}
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+
+def checkpoint_path_for(output_path: str) -> str:
+    """输出文件对应的默认检查点路径"""
+    return f"{output_path}.checkpoint.jsonl"
+
+
+class FrameCheckpoint:
+    """
+    追加写入的逐帧检查点（请求失败的帧不写入，续跑时会重新请求）
+
+    records/times 只包含打开时已有的帧；新追加的帧直接落盘，不在内存中累积。
+    """
+
+    def __init__(self, path: str, meta: Dict):
+        """
+        Args:
+            path: 检查点文件路径
+            meta: 标识本次运行的信息（视频、提供商、模型、采样方式、ROI 等），与已有检查点不一致时不复用
+        """
+        self.path = path
+        self.meta = meta
+        self.times: Dict[int, float] = {}
+        self.records = self._load()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        is_new = not os.path.exists(path)
+        self.file = open(path, "a", encoding="utf-8")
+        if is_new:
+            self._write({"meta": meta})
+
+    def _load(self) -> Dict[int, Dict]:
+        """读取已有检查点；末尾被中断写了一半的行会被丢弃"""
+        if not os.path.exists(self.path):
+            return {}
+
+        records = {}
+        meta = None
+        truncated = False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    truncated = True
+                    continue
+                if "meta" in entry:
+                    meta = entry["meta"]
+                else:
+                    records[entry["frame"]] = entry["annotation"]
+                    if entry.get("time") is not None:
+                        self.times[entry["frame"]] = entry["time"]
+
+        if meta != self.meta:
+            stale_path = f"{self.path}.stale"
+            os.replace(self.path, stale_path)
+            print(f"⚠️  检查点与当前运行不匹配（视频/提供商/模型/采样/ROI/输出格式不同），已移至 {stale_path}")
+            self.times = {}
+            return {}
+
+        if truncated:
+            self._rewrite(records)
+        return records
+
+    def _rewrite(self, records: Dict[int, Dict]):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"meta": self.meta}, ensure_ascii=False) + "\n")
+            for frame in sorted(records):
+                entry = {"frame": frame, "time": self.times.get(frame), "annotation": records[frame]}
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _write(self, entry: Dict):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def append(self, frame: int, annotation: Dict, time: Optional[float] = None):
+        """记录一帧的标注结果（带 error 的结果不记录）"""
+        if annotation.get("error"):
+            return
+        self._write({"frame": frame, "time": time, "annotation": annotation})
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def remove(self):
+        """最终输出写出后删除检查点"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
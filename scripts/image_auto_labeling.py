@@ -4,23 +4,24 @@
 更快速的演示方案，适合快速测试
 """
 
-import cv2
 import base64
 import json
 import os
 from pathlib import Path
 import argparse
 
-# 从视频标注脚本导入配置
-from video_auto_labeling import (
+# 标注器与提供商配置（不依赖视频处理模块）
+from labeler import (
     API_PROVIDERS,
     OBJECT_CATEGORIES,
     MultiModalLabeler
 )
+from roi import parse_roi
 
 
 def visualize_labels(image_path: str, annotations: dict, output_path: str):
     """可视化标注结果"""
+    import cv2  # 只在可视化时需要，--help 和纯标注不必等待 OpenCV 加载
     img = cv2.imread(image_path)
     height, width = img.shape[:2]
     
@@ -102,10 +103,11 @@ def convert_to_label_studio_format(image_path: str, annotations: dict) -> dict:
 def main():
     parser = argparse.ArgumentParser(description="图片自动标注工具")
     parser.add_argument("image_path", help="图片文件路径")
-    parser.add_argument("--provider", default="qwen", choices=["openai", "anthropic", "qwen"],
+    parser.add_argument("--provider", default="qwen", choices=list(API_PROVIDERS),
                         help="API提供商")
     parser.add_argument("--output", help="输出JSON文件路径（默认：图片名_labels.json）")
     parser.add_argument("--visualize", action="store_true", help="生成可视化结果图")
+    parser.add_argument("--roi", help="自车区域裁剪：预设名（helmet/handlebar）、JSON 文件或 x_min,y_min,x_max,y_max")
     
     args = parser.parse_args()
     
@@ -123,10 +125,13 @@ def main():
     
     # 1. 使用多模态模型标注
     print("[1/3] 调用多模态模型分析图片...")
-    labeler = MultiModalLabeler(provider=args.provider)
+    labeler = MultiModalLabeler(provider=args.provider, roi=parse_roi(args.roi))
     
     try:
         annotations = labeler.label_image(args.image_path)
+        if annotations.get("error"):
+            print(f"❌ 标注失败: {annotations['error']}")
+            return
         object_count = len(annotations.get("objects", []))
         print(f"✓ 检测到 {object_count} 个目标")
         
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+上传图片预处理策略 - 按提供商缩放/重新编码
+边界框是 0-1 归一化坐标，不需要全分辨率；缩小图片可以同时减少上传字节数和视觉token
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+# 未配置策略时的编码方式（与改动前一致：原分辨率 JPEG 默认质量）
+BASELINE_JPEG_QUALITY = 95
+
+
+def resize_long_side(frame: "cv2.Mat", max_long_side: Optional[int]) -> "cv2.Mat":
+    """按长边等比缩小（不放大）"""
+    import cv2
+    height, width = frame.shape[:2]
+    long_side = max(height, width)
+    if not max_long_side or long_side <= max_long_side:
+        return frame
+    scale = max_long_side / long_side
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_with_policy(frame: "cv2.Mat", policy: Optional[Dict]) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    按策略缩放并编码
+
+    Args:
+        frame: BGR 帧图像
+        policy: {"max_long_side": 1280, "format": "jpeg"|"webp", "quality": 85}
+
+    Returns:
+        (编码后的字节, (宽, 高))
+    """
+    # cv2 在第一次编码时才导入，标注器本身（labeler.py）不依赖 OpenCV
+    import cv2
+    from video_io import encode_jpeg
+
+    policy = policy or {}
+    frame = resize_long_side(frame, policy.get("max_long_side"))
+    quality = policy.get("quality", BASELINE_JPEG_QUALITY)
+    height, width = frame.shape[:2]
+
+    if policy.get("format", "jpeg") == "webp":
+        ok, buffer = cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        if not ok:
+            raise ValueError("WebP编码失败")
+        return buffer.tobytes(), (width, height)
+    return encode_jpeg(frame, quality), (width, height)
+
+
+def image_media_type(data: bytes) -> str:
+    """根据文件头判断图片 MIME 类型"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    return "image/jpeg"
+
+
+def image_extension(policy: Optional[Dict]) -> str:
+    """策略对应的文件扩展名"""
+    return ".webp" if (policy or {}).get("format") == "webp" else ".jpg"
+
+
+def estimate_vision_tokens(width: int, height: int, policy: Optional[Dict]) -> int:
+    """
+    估算一张图片消耗的视觉token
+
+    token_model:
+        tile  - OpenAI：缩放到 2048 以内、短边 768 后按 512 切块，85 + 170 × 块数
+        patch - 按像素面积（Claude 约 750 像素/token，Qwen 约 784 像素/token）
+        fixed - 每张图固定token数（Gemini）
+    """
+    policy = policy or {}
+    model = policy.get("token_model", "patch")
+
+    if model == "tile":
+        scale = min(1.0, 2048 / max(width, height))
+        w, h = width * scale, height * scale
+        scale = min(1.0, 768 / min(w, h))
+        w, h = w * scale, h * scale
+        tiles = -(-int(w) // 512) * -(-int(h) // 512)
+        return 85 + 170 * tiles
+    if model == "fixed":
+        return policy.get("tokens_per_image", 258)
+
+    tokens = int(width * height / policy.get("pixels_per_token", 750))
+    cap = policy.get("max_tokens_per_image")
+    return min(tokens, cap) if cap else tokens
+
+
+class ImageStats:
+    """统计一次运行中上传图片的字节数与估算token（线程安全）"""
+
+    def __init__(self, policy: Optional[Dict] = None):
+        self.policy = policy or {}
+        self.frames = 0
+        self.sent_bytes = 0
+        self.baseline_bytes = 0
+        self.baseline_measured = 0
+        self.sent_tokens = 0
+        self.original_tokens = 0
+        self.lock = threading.Lock()
+
+    def record(
+        self,
+        original_size: Tuple[int, int],
+        sent_size: Tuple[int, int],
+        sent_bytes: int,
+        baseline_bytes: Optional[int] = None
+    ):
+        """记录一帧（尺寸为 (宽, 高)）"""
+        with self.lock:
+            self.frames += 1
+            self.sent_bytes += sent_bytes
+            self.sent_tokens += estimate_vision_tokens(*sent_size, self.policy)
+            self.original_tokens += estimate_vision_tokens(*original_size, self.policy)
+            if baseline_bytes is not None:
+                self.baseline_bytes += baseline_bytes
+                self.baseline_measured += 1
+
+    def summary(self) -> Dict:
+        result = {
+            "frames": self.frames,
+            "sent_bytes": self.sent_bytes,
+            "sent_tokens_est": self.sent_tokens,
+            "original_tokens_est": self.original_tokens,
+            "tokens_saved_est": self.original_tokens - self.sent_tokens,
+        }
+        if self.baseline_measured:
+            result["baseline_bytes"] = self.baseline_bytes
+            result["bytes_saved"] = self.baseline_bytes - self.sent_bytes
+        return result
+
+    def print_summary(self):
+        if not self.frames:
+            return
+        s = self.summary()
+        print(f"上传图片: {s['frames']} 张，共 {s['sent_bytes'] / 1024 / 1024:.2f} MB，"
+              f"估算视觉token {s['sent_tokens_est']}"
+              f"（原分辨率约 {s['original_tokens_est']}，节省 {s['tokens_saved_est']}）")
+        if "baseline_bytes" in s:
+            ratio = s["bytes_saved"] / s["baseline_bytes"] if s["baseline_bytes"] else 0.0
+            print(f"  对比原分辨率 JPEG q{BASELINE_JPEG_QUALITY}: "
+                  f"{s['baseline_bytes'] / 1024 / 1024:.2f} MB，节省 {ratio:.1%}")
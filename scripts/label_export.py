@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Label Studio 导入文件的流式写出
+每标注完一帧就把该帧的区域写入文件，不在内存中累积整个 result 列表；
+默认紧凑 JSON（无缩进），输出路径以 .gz 结尾时 gzip 压缩，可按区域数分片
+
+帧号约定：脚本内部的帧号都是解码顺序的原始帧号（从 0 开始，与 cv2 的 CAP_PROP_POS_FRAMES 一致），
+写入 Label Studio 的 frame 从 1 开始（原始帧号 + 1），逐帧区域与轨迹关键帧都经 label_studio_frame 转换
+"""
+
+import gzip
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+COMPACT_SEPARATORS = (",", ":")
+
+
+def label_studio_frame(frame_number: int) -> int:
+    """原始帧号（从 0 开始）转换为 Label Studio 帧号（从 1 开始）"""
+    return frame_number + 1
+
+
+def rectangle_result(
+    bbox: List[float],
+    label: str,
+    frame: int,
+    time_seconds: float,
+    from_name: str = "box",
+    confidence: Optional[float] = None
+) -> Dict:
+    """
+    单个逐帧 videorectangle 区域
+
+    Args:
+        bbox: [x_min, y_min, x_max, y_max]，0-1 归一化坐标
+        label: 类别
+        frame: 原始帧号（从 0 开始），写出时转换为 Label Studio 帧号
+        time_seconds: 时间戳（秒）
+        from_name: 标注模板中的控件名
+        confidence: 可选，写入 meta.confidence
+    """
+    result = {
+        "value": {
+            "x": bbox[0] * 100,  # 转换为百分比
+            "y": bbox[1] * 100,
+            "width": (bbox[2] - bbox[0]) * 100,
+            "height": (bbox[3] - bbox[1]) * 100,
+            "rotation": 0,
+            "rectanglelabels": [label],
+            "frame": label_studio_frame(frame),
+            "time": time_seconds
+        },
+        "from_name": from_name,
+        "to_name": "video",
+        "type": "videorectangle"
+    }
+    if confidence is not None:
+        result["meta"] = {"confidence": confidence}
+    return result
+
+
+def video_task_data(video_path: str) -> Dict:
+    """任务的 data 字段（Label Studio 本地文件存储路径）"""
+    return {"video": f"/data/local-files/?d={os.path.basename(video_path)}"}
+
+
+def shard_path(path: str, index: int) -> str:
+    """第 index 个分片的路径：labels.json -> labels.part000.json（保留 .gz 后缀）"""
+    base, gz = (path[:-3], ".gz") if path.endswith(".gz") else (path, "")
+    stem, ext = os.path.splitext(base)
+    return f"{stem}.part{index:03d}{ext or '.json'}{gz}"
+
+
+class TaskWriter:
+    """
+    流式写出一个视频的 Label Studio 预标注任务
+
+    文件内容为 [{"data": ..., "predictions": [{..., "result": [区域, ...]}]}]，
+    区域逐个写入；分片时每个分片都是独立可导入的完整文件。
+    先写入 *.tmp，close() 时改名，中断时不会留下看似完成的输出。
+
+    用法:
+        with TaskWriter("labels.json", video_path) as writer:
+            for ...:
+                writer.write_frame(results)
+        paths = writer.paths
+    """
+
+    def __init__(
+        self,
+        path: str,
+        video_path: str,
+        model_version: Optional[str] = None,
+        indent: Optional[int] = None,
+        shard_size: Optional[int] = None
+    ):
+        """
+        Args:
+            path: 输出路径，以 .gz 结尾时 gzip 压缩
+            video_path: 视频文件路径
+            model_version: 可选，写入 predictions[].model_version
+            indent: 每个区域的缩进（默认紧凑输出）
+            shard_size: 每个分片最多的区域数（在帧或轨迹之间切分，单帧超出时整帧单独成片；默认不分片）
+        """
+        self.path = path
+        self.data = video_task_data(video_path)
+        self.model_version = model_version
+        self.indent = indent
+        self.shard_size = shard_size
+        self.compress = path.endswith(".gz")
+        self.paths: List[str] = []
+        self.total_results = 0
+        self._file = None
+        self._tmp_path = None
+        self._shard_results = 0
+
+    def _open_shard(self):
+        path = shard_path(self.path, len(self.paths)) if self.shard_size else self.path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._tmp_path = f"{path}.tmp"
+        if self.compress:
+            self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8")
+        else:
+            self._file = open(self._tmp_path, "w", encoding="utf-8")
+        self.paths.append(path)
+        self._shard_results = 0
+
+        prediction_head = ""
+        if self.model_version:
+            prediction_head = f'"model_version":{json.dumps(self.model_version)},'
+        self._file.write(
+            f'[{{"data":{json.dumps(self.data, ensure_ascii=False, separators=COMPACT_SEPARATORS)},'
+            f'"predictions":[{{{prediction_head}"score":0.0,"result":['
+        )
+
+    def _close_shard(self):
+        self._file.write("]}]}]\n")
+        self._file.close()
+        os.replace(self._tmp_path, self.paths[-1])
+        self._file = None
+
+    def write(self, result: Dict):
+        """写入一个区域"""
+        if self._file is None:
+            self._open_shard()
+        if self._shard_results:
+            self._file.write(",")
+        separators = None if self.indent is not None else COMPACT_SEPARATORS
+        self._file.write(json.dumps(result, ensure_ascii=False, indent=self.indent,
+                                    separators=separators))
+        self._shard_results += 1
+        self.total_results += 1
+
+    def write_frame(self, results: Iterable[Dict]):
+        """写入一帧的所有区域（分片只在帧之间切换，同一帧不会被拆开）"""
+        results = list(results)
+        if (self._file is not None and self.shard_size and self._shard_results
+                and self._shard_results + len(results) > self.shard_size):
+            self._close_shard()
+        for result in results:
+            self.write(result)
+
+    def write_tracks(self, results: Iterable[Dict]):
+        """写入轨迹区域（每条轨迹是一个区域，分片在轨迹之间切分，同一轨迹不会被拆开）"""
+        for result in results:
+            self.write_frame([result])
+
+    def close(self) -> List[str]:
+        """结束写出，返回所有输出文件路径"""
+        if self._file is None and not self.paths:
+            self._open_shard()  # 没有任何区域时也输出一个空任务
+        if self._file is not None:
+            self._close_shard()
+        return self.paths
+
+    def abort(self):
+        """丢弃当前未完成的分片"""
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._tmp_path)
+            self.paths.pop()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
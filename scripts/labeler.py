@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""
+多模态模型标注器 - 提示词、响应缓存、限流、并发调度与响应解析
+各提供商的请求格式是按需导入的插件（见 API_PROVIDERS 的 "plugin" 与 providers.py），
+本模块不在导入时加载 cv2、requests 或提供商 SDK，单张图片标注和批处理子进程启动更快
+"""
+
+import base64
+import importlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from rate_limit import ProviderRateLimiter
+from image_policy import ImageStats, encode_with_policy
+from response_cache import ResponseCache, make_cache_key
+from usage_stats import UsageStats
+from response_schema import parse_compact, parse_compact_frames
+from roi import RegionOfInterest
+from video_io import batched
+
+# 配置区域
+API_PROVIDERS = {
+    "openai": {
+        "model": "gpt-4o",  # 或 gpt-4-vision-preview
+        "api_key_env": "OPENAI_API_KEY",
+        "plugin": "providers:ChatCompletionsClient",  # 请求格式插件（"模块:类名"，首次使用时导入）
+        "endpoint": "https://api.openai.com/v1/chat/completions",
+        "max_concurrency": 8,  # 同时在途的请求数
+        "prompt_cache": "automatic",  # 提示缓存：automatic 前缀相同即自动命中，explicit 需在请求中标记 cache_control
+        "image": {  # 上传前预处理：长边上限、编码格式与质量、视觉token估算方式
+            "max_long_side": 1024,
+            "format": "jpeg",
+            "quality": 85,
+            "token_model": "tile"
+        },
+        "rate_limit": {
+            "requests_per_minute": 500,
+            "tokens_per_minute": 30000,
+            "estimated_tokens_per_request": 1500  # 图片+提示词+输出的估算值
+        },
+        "pricing": {  # 每百万token单价（以官网最新价格为准）
+            "currency": "USD",
+            "input_per_million": 2.50,
+            "output_per_million": 10.00,
+            "cached_input_factor": 0.5  # 提示缓存命中部分相对输入单价的比例
+        },
+        "batch": {  # 批处理接口（--batch-submit）
+            "base_url": "https://api.openai.com/v1",
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+            "max_requests": 50000,  # 单个任务的请求数上限
+            "max_file_mb": 190,  # 单个请求文件的大小上限
+            "price_factor": 0.5  # 相对实时接口的价格
+        }
+    },
+    "anthropic": {
+        "model": "claude-3-5-sonnet-20241022",
+        "api_key_env": "ANTHROPIC_API_KEY",
+        "plugin": "providers:AnthropicClient",
+        "endpoint": "https://api.anthropic.com/v1/messages",
+        "max_concurrency": 4,
+        "prompt_cache": "explicit",
+        "image": {
+            "max_long_side": 1280,
+            "format": "jpeg",
+            "quality": 85,
+            "token_model": "patch",
+            "pixels_per_token": 750,
+            "max_tokens_per_image": 1600
+        },
+        "rate_limit": {
+            "requests_per_minute": 50,
+            "tokens_per_minute": 40000,
+            "estimated_tokens_per_request": 2000
+        },
+        "pricing": {
+            "currency": "USD",
+            "input_per_million": 3.00,
+            "output_per_million": 15.00,
+            "cached_input_factor": 0.1,
+            "cache_write_factor": 1.25  # 写入缓存的部分按 1.25 倍计费
+        }
+    },
+    "gemini": {
+        "model": "gemini-1.5-pro",
+        "api_key_env": "GEMINI_API_KEY",
+        "plugin": "providers:GeminiClient",
+        "endpoint": "https://generativelanguage.googleapis.com/v1beta/models",
+        "max_concurrency": 4,
+        "image": {
+            "max_long_side": 1280,
+            "format": "jpeg",
+            "quality": 85,
+            "token_model": "fixed",
+            "tokens_per_image": 258
+        },
+        "rate_limit": {
+            "requests_per_minute": 60,
+            "tokens_per_minute": 32000,
+            "estimated_tokens_per_request": 1500
+        },
+        "pricing": {
+            "currency": "USD",
+            "input_per_million": 1.25,
+            "output_per_million": 5.00,
+            "cached_input_factor": 0.25  # 上下文缓存命中部分
+        }
+    },
+    "qwen": {
+        "model": "qwen-vl-max",  # 或 qwen-vl-plus
+        "api_key_env": "DASHSCOPE_API_KEY",
+        "plugin": "providers:ChatCompletionsClient",
+        "endpoint": "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
+        "max_concurrency": 8,
+        "prompt_cache": "explicit",
+        "image": {
+            "max_long_side": 1280,
+            "format": "jpeg",
+            "quality": 85,
+            "token_model": "patch",
+            "pixels_per_token": 784,
+            "max_tokens_per_image": 1280
+        },
+        "rate_limit": {
+            "requests_per_minute": 300,
+            "tokens_per_minute": 100000,
+            "estimated_tokens_per_request": 1500
+        },
+        "pricing": {
+            "currency": "CNY",
+            "input_per_million": 3.00,
+            "output_per_million": 9.00,
+            "cached_input_factor": 0.1,
+            "cache_write_factor": 1.25
+        },
+        "batch": {
+            "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+            "max_requests": 50000,
+            "max_file_mb": 480,
+            "price_factor": 0.5
+        }
+    }
+}
+
+OBJECT_CATEGORIES = [
+    "行人", "汽车", "摩托车", "自行车", 
+    "交通标志", "交通信号灯", "施工区域", "其他"
+]
+
+# 请求体骨架中图片数组的占位符
+IMAGES_PLACEHOLDER = "__IMAGES__"
+
+
+def register_provider(name: str, config: Dict):
+    """
+    注册提供商（或覆盖已有配置）
+    
+    config 的键同 API_PROVIDERS，必须包含 "plugin"（"模块:类名"，类继承 ProviderClient）；
+    插件模块在首次创建该提供商的标注器时才导入。
+    """
+    if ":" not in config.get("plugin", ""):
+        raise ValueError(f"提供商 {name} 缺少 plugin（格式为 \"模块:类名\"）")
+    API_PROVIDERS[name] = config
+
+
+def load_provider_class(name: str) -> type:
+    """导入提供商插件，返回 ProviderClient 子类"""
+    if name not in API_PROVIDERS:
+        raise ValueError(f"未知的提供商: {name}（可选: {', '.join(API_PROVIDERS)}）")
+    module_name, _, class_name = API_PROVIDERS[name]["plugin"].partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class ProviderClient:
+    """
+    提供商插件基类：把图片和对应帧数的提示词发给模型，返回模型输出文本
+    
+    HTTP 接口的插件实现 url/headers/build_payload/image_parts/response_text/record_usage，
+    请求体的静态骨架按 (帧数, max_tokens) 只序列化一次，每个请求只拼接图片部分；
+    使用 SDK 的插件直接覆盖 complete。
+    """
+    
+    def __init__(self, labeler: "MultiModalLabeler"):
+        self.labeler = labeler
+        self.config = labeler.config
+        self._templates: Dict[Tuple[int, int], Tuple[str, str]] = {}
+    
+    def instruction_block(self, frame_count: int) -> Dict:
+        """静态指令文本块，提供商支持显式提示缓存时标记为可缓存的前缀"""
+        block = {"type": "text", "text": self.labeler.prompt_for(frame_count)}
+        if self.labeler.prompt_cache and self.config.get("prompt_cache") == "explicit":
+            block["cache_control"] = {"type": "ephemeral"}
+        return block
+    
+    def complete(self, images: List[bytes], max_tokens: int) -> str:
+        """发送请求，记录 usage 与延迟，返回模型输出文本"""
+        start_time = time.perf_counter()
+        result = self.labeler.transport.post_json(self.url(), self.headers(), self.request_body(images, max_tokens))
+        self.record_usage(result, time.perf_counter() - start_time, len(images))
+        return self.response_text(result)
+    
+    def request_body(self, images: List[bytes], max_tokens: int) -> str:
+        """已序列化的请求体（批处理文件复用同一个请求体）"""
+        key = (len(images), max_tokens)
+        template = self._templates.get(key)
+        if template is None:
+            payload = json.dumps(self.build_payload(len(images), max_tokens), ensure_ascii=False)
+            head, tail = payload.split(json.dumps(IMAGES_PLACEHOLDER))
+            template = self._templates[key] = (head + "[", "]" + tail)
+        head, tail = template
+        return head + self.image_parts(images) + tail
+    
+    def url(self) -> str:
+        raise NotImplementedError
+    
+    def headers(self) -> Dict:
+        raise NotImplementedError
+    
+    def build_payload(self, frame_count: int, max_tokens: int) -> Dict:
+        """请求体骨架，图片数组所在位置填 IMAGES_PLACEHOLDER"""
+        raise NotImplementedError
+    
+    def image_parts(self, images: List[bytes]) -> str:
+        """图片数组元素的 JSON 文本（逗号分隔，不含方括号）"""
+        raise NotImplementedError
+    
+    def response_text(self, result: Dict) -> str:
+        raise NotImplementedError
+    
+    def record_usage(self, result: Dict, latency: Optional[float], frames: int):
+        """把响应中的 usage 记入 labeler.usage_stats（latency 为 None 表示批处理结果）"""
+        raise NotImplementedError
+
+
+class MultiModalLabeler:
+    """多模态模型标注器"""
+    
+    def __init__(
+        self,
+        provider: str = "openai",
+        max_concurrency: Optional[int] = None,
+        timeout: float = 60.0,
+        max_retries: int = 5,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[ProviderRateLimiter] = None,
+        request_slots=None,
+        endpoint: Optional[str] = None,
+        response_format: str = "verbose",
+        prompt_cache: bool = True,
+        roi: Optional[RegionOfInterest] = None
+    ):
+        """
+        Args:
+            provider: API提供商（API_PROVIDERS 中的键，如 openai, anthropic, gemini, qwen）
+            max_concurrency: 同时在途的请求数（默认取 API_PROVIDERS 配置）
+            timeout: 单次请求超时（秒）
+            max_retries: 429/5xx/网络错误的最大重试次数
+            cache: 可选的响应缓存，命中时不发起网络请求
+            rate_limiter: 可选，共享的限流器（多进程批处理时由主进程统一分配配额）
+            request_slots: 可选，跨进程共享的信号量，限制全局在途请求数
+            endpoint: 可选，覆盖 OpenAI 兼容接口地址（如本地模拟服务 mock_vlm_server.py）
+            response_format: 模型输出格式 verbose（完整键名）或 compact（整数数组，见 response_schema.py），
+                compact 时使用提供商原生的 JSON 输出模式（OpenAI json_schema，Qwen json_object）
+            prompt_cache: 是否给静态指令块加 cache_control 标记（仅 prompt_cache 为 explicit 的提供商）
+            roi: 可选，自车区域裁剪（见 roi.py）；图片在编码前裁剪，返回的框映射回整帧坐标
+        """
+        if response_format not in ("verbose", "compact"):
+            raise ValueError(f"未知的输出格式: {response_format}")
+        client_class = load_provider_class(provider)
+        self.provider = provider
+        self.config = API_PROVIDERS[provider]
+        self.endpoint = endpoint or self.config["endpoint"]
+        self.response_format = response_format
+        self.prompt_cache = prompt_cache
+        self.roi = roi
+        self.api_key = os.getenv(self.config["api_key_env"])
+        self.max_concurrency = max_concurrency or self.config.get("max_concurrency", 1)
+        self.rate_limiter = rate_limiter or ProviderRateLimiter(self.config.get("rate_limit"))
+        self.request_slots = request_slots
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = cache
+        self.image_policy = self.config.get("image")
+        self.image_stats = ImageStats(self.image_policy)
+        self.usage_stats = UsageStats(self.config.get("pricing"))
+        
+        if not self.api_key:
+            raise ValueError(f"请设置环境变量: {self.config['api_key_env']}")
+        
+        # 按帧数缓存的提示词（只有图片部分随请求变化）
+        self._prompts: Dict[int, str] = {}
+        self._transport = None
+        self._transport_lock = threading.Lock()
+        self.client: ProviderClient = client_class(self)
+    
+    @property
+    def transport(self):
+        """
+        每个标注器共享一个连接池（keep-alive，避免每帧重新握手）
+        
+        首次使用时才创建（并导入 requests），使用 SDK 的提供商不会加载。
+        """
+        with self._transport_lock:
+            if self._transport is None:
+                from transport import ProviderTransport
+                self._transport = ProviderTransport(
+                    pool_size=self.max_concurrency,
+                    timeout=self.timeout,
+                    max_retries=self.max_retries
+                )
+            return self._transport
+    
+    def _request_slot(self):
+        """占用一个全局请求名额（未配置时不限制）"""
+        return self.request_slots if self.request_slots is not None else nullcontext()
+    
+    def read_image(self, image: Union[str, bytes]) -> bytes:
+        """
+        读取图片字节
+        
+        内存中的字节视为已按策略编码并裁剪到 ROI（见 VideoFrameExtractor），直接使用；
+        文件路径则按 ROI 裁剪、按提供商的 image 策略缩放并重新编码。
+        """
+        if isinstance(image, (bytes, bytearray)):
+            return bytes(image)
+        if not self.image_policy and self.roi is None:
+            with open(image, "rb") as f:
+                return f.read()
+        
+        import cv2
+        frame = cv2.imread(image)
+        if frame is None:
+            raise ValueError(f"无法读取图片: {image}")
+        sent = self.roi.apply(frame) if self.roi is not None else frame
+        image_bytes, sent_size = encode_with_policy(sent, self.image_policy)
+        height, width = frame.shape[:2]
+        self.image_stats.record((width, height), sent_size, len(image_bytes), os.path.getsize(image))
+        return image_bytes
+    
+    def encode_image(self, image: Union[str, bytes]) -> str:
+        """将图片编码为base64（支持文件路径或内存中的JPEG字节）"""
+        return base64.b64encode(self.read_image(image)).decode('utf-8')
+    
+    def create_prompt(self) -> str:
+        """创建标注提示词"""
+        if self.response_format == "compact":
+            return self.create_compact_prompt()
+        categories = ", ".join(OBJECT_CATEGORIES)
+        
+        prompt = f"""请帮我分析这张摩托车第一人称视角的交通场景图片，检测并标注以下类别的目标：{categories}
+
+重要提示：
+- 这是摩托车骑手的第一人称视角
+- 不要标注拍摄者自己骑的摩托车（画面底部可见的车把、仪表盘等）
+- 只标注道路上的其他车辆、行人、交通标志等外部目标
+
+对于每个检测到的目标，请提供：
+1. 类别（从上述类别中选择）
+2. 边界框坐标（格式：[x_min, y_min, x_max, y_max]，相对于图片尺寸的比例，范围0-1）
+3. 置信度（0-1之间）
+
+请以JSON格式返回结果，格式如下：
+{{
+  "objects": [
+    {{
+      "category": "行人",
+      "bbox": [0.1, 0.2, 0.3, 0.5],
+      "confidence": 0.95
+    }}
+  ]
+}}
+
+只返回JSON，不要其他解释。"""
+        return prompt
+    
+    def create_multi_frame_prompt(self, frame_count: int) -> str:
+        """创建多帧标注提示词（一次请求标注多张连续帧）"""
+        if self.response_format == "compact":
+            return self.create_compact_prompt(frame_count)
+        categories = ", ".join(OBJECT_CATEGORIES)
+        
+        prompt = f"""以下是同一段摩托车第一人称视角视频中按时间顺序排列的 {frame_count} 帧图片，编号为 0 到 {frame_count - 1}（每张图片前标有"帧 N"）。请分别检测并标注每一帧中以下类别的目标：{categories}
+
+重要提示：
+- 这是摩托车骑手的第一人称视角
+- 不要标注拍摄者自己骑的摩托车（画面底部可见的车把、仪表盘等）
+- 只标注道路上的其他车辆、行人、交通标志等外部目标
+- 每一帧单独标注，坐标相对于该帧自身
+
+对于每个检测到的目标，请提供：
+1. 类别（从上述类别中选择）
+2. 边界框坐标（格式：[x_min, y_min, x_max, y_max]，相对于图片尺寸的比例，范围0-1）
+3. 置信度（0-1之间）
+
+请以JSON格式返回结果，每一帧都要出现（没有目标时 objects 为空列表），格式如下：
+{{
+  "frames": [
+    {{
+      "index": 0,
+      "objects": [
+        {{
+          "category": "行人",
+          "bbox": [0.1, 0.2, 0.3, 0.5],
+          "confidence": 0.95
+        }}
+      ]
+    }}
+  ]
+}}
+
+只返回JSON，不要其他解释。"""
+        return prompt
+    
+    def create_compact_prompt(self, frame_count: int = 1) -> str:
+        """创建紧凑输出格式的提示词（类别编号 + 千分比整数坐标，frame_count > 1 时为多帧）"""
+        categories = ", ".join(f"{i}={name}" for i, name in enumerate(OBJECT_CATEGORIES))
+        if frame_count == 1:
+            intro = "请检测这张摩托车第一人称视角交通场景图片中的目标。"
+            output = """以JSON返回：{"o": [[类别编号, x_min, y_min, x_max, y_max, 置信度], ...]}
+没有目标时返回 {"o": []}"""
+        else:
+            intro = (f"以下是同一段摩托车第一人称视角视频中按时间顺序排列的 {frame_count} 帧图片"
+                     f"（每张图片前标有\"帧 N\"，N 为 0 到 {frame_count - 1}），请逐帧检测目标。")
+            output = f"""以JSON返回：{{"f": [帧0的目标列表, 帧1的目标列表, ...]}}，共 {frame_count} 个列表，按帧顺序排列
+每个目标列表的格式为 [[类别编号, x_min, y_min, x_max, y_max, 置信度], ...]，没有目标时为 []"""
+        
+        return f"""{intro}
+类别编号：{categories}
+
+重要提示：
+- 不要标注拍摄者自己骑的摩托车（画面底部可见的车把、仪表盘等）
+- 只标注道路上的其他车辆、行人、交通标志等外部目标
+
+{output}
+- 坐标为相对图片宽高的整数千分比（0-1000），置信度为整数百分比（0-100）
+- 所有数值都是整数
+
+只返回JSON，不要其他解释。"""
+    
+    def prompt_for(self, frame_count: int = 1) -> str:
+        """单帧/多帧提示词，每个标注器按帧数只构建一次"""
+        prompt = self._prompts.get(frame_count)
+        if prompt is None:
+            prompt = self.create_prompt() if frame_count == 1 else self.create_multi_frame_prompt(frame_count)
+            self._prompts[frame_count] = prompt
+        return prompt
+    
+    def complete(self, images: List[bytes], max_tokens: int) -> str:
+        """由提供商插件发送多图请求（提示词由帧数决定），返回模型输出文本"""
+        return self.client.complete(images, max_tokens)
+    
+    @staticmethod
+    def _load_json(content: str):
+        # 移除可能的markdown代码块标记
+        content = content.replace("```json", "").replace("```", "").strip()
+        return json.loads(content)
+    
+    def _to_full_frame(self, annotation: Dict) -> Dict:
+        """ROI 内的框映射回整帧归一化坐标（未配置 ROI 时原样返回）"""
+        if self.roi is None or not isinstance(annotation.get("objects"), list):
+            return annotation
+        return {**annotation, "objects": self.roi.remap_objects(annotation["objects"])}
+    
+    def parse_response(self, content: str) -> Dict:
+        """解析单帧响应（框为整帧坐标）"""
+        return self._to_full_frame(self._parse_single(content))
+    
+    def parse_multi_frame_response(self, content: str, frame_count: int) -> Optional[List[Dict]]:
+        """解析多帧响应（框为整帧坐标），格式不符（缺帧、编号越界等）时返回 None"""
+        annotations = self._parse_frames(content, frame_count)
+        if annotations is None:
+            return None
+        return [self._to_full_frame(annotation) for annotation in annotations]
+    
+    def _parse_single(self, content: str) -> Dict:
+        if self.response_format == "compact":
+            try:
+                return parse_compact(content, OBJECT_CATEGORIES)
+            except (json.JSONDecodeError, ValueError) as e:
+                print(f"紧凑格式解析失败（{e}），原始响应: {content[:500]}")
+                return {"objects": [], "error": "JSON解析失败"}
+        try:
+            return self._load_json(content)
+        except json.JSONDecodeError:
+            print(f"JSON解析失败，原始响应: {content}")
+            return {"objects": [], "error": "JSON解析失败"}
+    
+    def _parse_frames(self, content: str, frame_count: int) -> Optional[List[Dict]]:
+        if self.response_format == "compact":
+            try:
+                return parse_compact_frames(content, frame_count, OBJECT_CATEGORIES)
+            except (json.JSONDecodeError, ValueError):
+                return None
+        try:
+            data = self._load_json(content)
+            by_index = {}
+            for item in data["frames"]:
+                index = int(item["index"])
+                if not 0 <= index < frame_count or not isinstance(item["objects"], list):
+                    return None
+                by_index[index] = {"objects": item["objects"]}
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+        
+        if len(by_index) != frame_count:
+            return None
+        return [by_index[i] for i in range(frame_count)]
+    
+    def _cache_key(self, image: bytes, prompt: str) -> str:
+        """响应缓存键（缓存的框已映射回整帧，配置了 ROI 时把裁剪区域也计入键）"""
+        if self.roi is not None:
+            prompt = f"{prompt}|roi={list(self.roi.crop)}"
+        return make_cache_key(image, prompt, self.provider, self.config["model"])
+    
+    def label_image(self, image: Union[str, bytes]) -> Dict:
+        """
+        标注单张图片（文件路径或内存中的JPEG字节）
+        
+        先查响应缓存，未命中时在限流配额内请求模型；失败结果不写入缓存。
+        """
+        image = self.read_image(image)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(image, self.prompt_for(1))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        self.rate_limiter.acquire()
+        with self._request_slot():
+            annotation = self.request_label(image)
+        
+        if cache_key is not None and not annotation.get("error"):
+            self.cache.put(cache_key, annotation)
+        return annotation
+    
+    def request_label(self, image: Union[str, bytes]) -> Dict:
+        """请求模型标注单张图片"""
+        return self.parse_response(self.complete([self.read_image(image)], max_tokens=1000))
+    
+    def _label_image_safe(self, image: Union[str, bytes]) -> Dict:
+        """
+        标注单张图片，单帧失败不影响其他帧
+        
+        重试耗尽后返回带 "error" 字段的空结果，调用方据此统计失败帧，
+        而不是把它当成"没有目标"静默丢弃。
+        """
+        try:
+            return self.label_image(image)
+        except Exception as e:
+            print(f"标注请求失败: {e}")
+            return {"objects": [], "error": str(e)}
+    
+    def label_frame_group(self, images: List[Union[str, bytes]]) -> List[Dict]:
+        """
+        一次请求标注多张连续帧，返回逐帧结果
+        
+        响应格式不符时回退为逐帧单独请求。
+        """
+        images = [self.read_image(image) for image in images]
+        if len(images) == 1:
+            return [self.label_image(images[0])]
+        
+        prompt = self.prompt_for(len(images))
+        cache_keys = None
+        if self.cache is not None:
+            cache_keys = [
+                self._cache_key(image, f"{prompt}#{i}")
+                for i, image in enumerate(images)
+            ]
+            cached = [self.cache.get(key) for key in cache_keys]
+            if all(c is not None for c in cached):
+                return cached
+        
+        self.rate_limiter.acquire(frames=len(images))
+        with self._request_slot():
+            content = self.complete(images, max_tokens=1000 * len(images))
+        annotations = self.parse_multi_frame_response(content, len(images))
+        if annotations is None:
+            print(f"多帧响应格式不符，回退为逐帧请求（{len(images)} 帧）")
+            return [self._label_image_safe(image) for image in images]
+        
+        if cache_keys is not None:
+            for key, annotation in zip(cache_keys, annotations):
+                self.cache.put(key, annotation)
+        return annotations
+    
+    def _label_group_safe(self, images: List[Union[str, bytes]]) -> List[Dict]:
+        """多帧版本的 _label_image_safe"""
+        try:
+            return self.label_frame_group(images)
+        except Exception as e:
+            print(f"标注请求失败: {e}")
+            return [{"objects": [], "error": str(e)} for _ in images]
+    
+    def batch_request_body(self, images: List[bytes]) -> str:
+        """批处理文件中一个请求的 body（与实时请求相同的提示词和参数，已序列化）"""
+        return self.client.request_body(images, 1000 * len(images))
+    
+    def parse_batch_result(self, line: Dict, frame_count: int) -> List[Dict]:
+        """解析批处理结果文件中的一行，返回逐帧结果（失败时为带 error 的空结果）"""
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if response.get("status_code") != 200:
+            error = line.get("error") or body.get("error") or f"状态码 {response.get('status_code')}"
+            message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            return [{"objects": [], "error": f"批处理请求失败: {message}"} for _ in range(frame_count)]
+        
+        self.client.record_usage(body, None, frame_count)
+        content = self.client.response_text(body)
+        if frame_count == 1:
+            return [self.parse_response(content)]
+        annotations = self.parse_multi_frame_response(content, frame_count)
+        if annotations is None:
+            return [{"objects": [], "error": "多帧响应格式不符"} for _ in range(frame_count)]
+        return annotations
+    
+    def iter_label_images(
+        self,
+        images: Iterable[Union[str, bytes]],
+        frames_per_request: int = 1
+    ) -> Iterator[Dict]:
+        """
+        并发标注多张图片，按输入顺序逐个返回结果
+        
+        同时在途的请求数不超过 max_concurrency，输入可以是生成器（按需拉取，
+        不会一次性把所有帧读入内存）。frames_per_request > 1 时每个请求打包
+        K 张连续帧，减少请求次数与重复的提示词开销。
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            for group in batched(images, frames_per_request):
+                pending.append(executor.submit(self._label_group_safe, group))
+                if len(pending) >= 2 * self.max_concurrency:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+    
+    def label_images(
+        self,
+        images: Iterable[Union[str, bytes]],
+        frames_per_request: int = 1
+    ) -> List[Dict]:
+        """并发标注多张图片，结果与输入顺序一致"""
+        return list(self.iter_label_images(images, frames_per_request))
+
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+本地模拟多模态模型服务 - 兼容 OpenAI / DashScope 的 chat/completions 接口
+用于离线调优并发、多帧批量、缓存等参数，不消耗 API 额度
+
+可配置延迟分布（对数正态）、429/5xx 比例和固定的检测结果；
+GET /stats 返回请求数、状态码分布、在途请求峰值与平均重叠度，POST /reset 清零统计
+
+同时模拟批处理接口（--batch-submit）：POST /v1/files、POST /v1/batches、
+GET /v1/batches/{id}、GET /v1/files/{id}/content，任务在 --batch-seconds 秒后完成
+
+用法:
+  python scripts/mock_vlm_server.py --port 8765 --latency-ms 800 --latency-sigma 0.4 --rate-limit-rate 0.05
+  DASHSCOPE_API_KEY=mock python scripts/video_auto_labeling.py video.mp4 --provider qwen \\
+      --endpoint http://127.0.0.1:8765/v1/chat/completions --no-rate-limit
+"""
+
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from response_schema import encode_rows
+from labeler import OBJECT_CATEGORIES
+
+# 默认返回的检测结果（每帧相同）
+DEFAULT_OBJECTS = [
+    {"category": "汽车", "bbox": [0.12, 0.40, 0.35, 0.62], "confidence": 0.92},
+    {"category": "行人", "bbox": [0.61, 0.35, 0.67, 0.58], "confidence": 0.85},
+    {"category": "交通信号灯", "bbox": [0.48, 0.08, 0.51, 0.16], "confidence": 0.78}
+]
+
+
+class MockStats:
+    """线程安全的服务端统计（在途请求数按时间积分得到平均重叠度）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.images = 0
+            self.bytes_received = 0
+            self.status_counts: Dict[int, int] = {}
+            self.inflight = 0
+            self.peak_inflight = 0
+            self.busy_integral = 0.0
+            self.first_start: Optional[float] = None
+            self.last_change: Optional[float] = None
+
+    def _advance(self, now: float):
+        if self.last_change is not None:
+            self.busy_integral += self.inflight * (now - self.last_change)
+        self.last_change = now
+
+    def begin(self, images: int, size: int):
+        with self.lock:
+            now = time.monotonic()
+            self._advance(now)
+            if self.first_start is None:
+                self.first_start = now
+            self.requests += 1
+            self.images += images
+            self.bytes_received += size
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+
+    def end(self, status: int):
+        with self.lock:
+            self._advance(time.monotonic())
+            self.inflight -= 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            span = (self.last_change - self.first_start) if self.first_start is not None else 0.0
+            return {
+                "requests": self.requests,
+                "images": self.images,
+                "bytes_received": self.bytes_received,
+                "status_counts": {str(k): v for k, v in sorted(self.status_counts.items())},
+                "inflight": self.inflight,
+                "peak_inflight": self.peak_inflight,
+                "mean_inflight": self.busy_integral / span if span > 0 else 0.0,
+                "active_seconds": span
+            }
+
+
+class MockVLMServer(ThreadingHTTPServer):
+    """模拟服务（daemon_threads，关闭时不等待未完成的请求）"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 8765),
+        latency_ms: float = 500.0,
+        latency_sigma: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        objects: Optional[List[Dict]] = None,
+        tokens_per_image: int = 1000,
+        seed: Optional[int] = None,
+        batch_seconds: float = 2.0
+    ):
+        """
+        Args:
+            address: 监听地址 (host, port)，端口为 0 时自动分配
+            latency_ms: 成功请求的延迟中位数（毫秒）
+            latency_sigma: 对数正态分布的 sigma，0 表示固定延迟
+            error_rate: 返回 500 的比例
+            rate_limit_rate: 返回 429（带 Retry-After）的比例
+            retry_after: 429 响应的 Retry-After（秒）
+            objects: 每帧返回的检测结果
+            tokens_per_image: usage.prompt_tokens 中每张图片计入的token数
+            seed: 随机种子（延迟与错误注入可复现）
+            batch_seconds: 批处理任务从创建到完成的时间（秒）
+        """
+        super().__init__(address, MockVLMHandler)
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.objects = DEFAULT_OBJECTS if objects is None else objects
+        self.tokens_per_image = tokens_per_image
+        self.stats = MockStats()
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.batch_seconds = batch_seconds
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.prefixes = set()  # 见过的提示前缀（模拟服务端提示缓存）
+        self.ids = itertools.count(1)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def draw(self):
+        """抽取本次请求的结果：(状态码, 延迟秒)"""
+        with self.random_lock:
+            roll = self.random.random()
+            noise = self.random.gauss(0.0, self.latency_sigma) if self.latency_sigma > 0 else 0.0
+        if roll < self.rate_limit_rate:
+            return 429, 0.0
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, 0.0
+        return 200, self.latency_ms / 1000.0 * math.exp(noise)
+
+    def completion(self, payload: Dict, images: int) -> Dict:
+        """
+        构造 chat/completions 响应；多图请求按多帧提示词的 {"frames": [...]} 格式返回，
+        请求带 response_format（紧凑输出模式）时按 response_schema.py 的紧凑格式返回
+        """
+        if payload.get("response_format"):
+            rows = encode_rows(self.objects, OBJECT_CATEGORIES)
+            content = {"f": [rows] * images} if images > 1 else {"o": rows}
+        elif images > 1:
+            content = {"frames": [{"index": i, "objects": self.objects} for i in range(images)]}
+        else:
+            content = {"objects": self.objects}
+        text = json.dumps(content, ensure_ascii=False)
+        prompt_chars = sum(
+            len(block.get("text", ""))
+            for message in payload.get("messages", [])
+            for block in (message["content"] if isinstance(message.get("content"), list) else [])
+        )
+        cached_tokens = self.cached_prefix_tokens(payload)
+        return {
+            "id": "mock-completion",
+            "object": "chat.completion",
+            "model": payload.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": images * self.tokens_per_image + prompt_chars // 2,
+                "completion_tokens": len(text) // 3,
+                "total_tokens": images * self.tokens_per_image + prompt_chars // 2 + len(text) // 3,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+        }
+
+    def cached_prefix_tokens(self, payload: Dict) -> int:
+        """第一张图片之前的文本前缀与之前的请求相同时，按命中提示缓存计入 cached_tokens"""
+        prefix = []
+        for message in payload.get("messages", []):
+            content = message.get("content")
+            blocks = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+            for block in blocks:
+                if block.get("type") != "text":
+                    break
+                prefix.append(block.get("text", ""))
+            else:
+                continue
+            break
+        key = "\n".join(prefix)
+        with self.random_lock:
+            hit = key in self.prefixes
+            self.prefixes.add(key)
+        return len(key) // 2 if hit else 0
+
+
+    def add_file(self, data: bytes) -> Dict:
+        file_id = f"file-mock{next(self.ids)}"
+        self.files[file_id] = data
+        return {"id": file_id, "object": "file", "bytes": len(data), "purpose": "batch"}
+
+    def create_batch(self, request: Dict) -> Dict:
+        if request.get("input_file_id") not in self.files:
+            raise KeyError(request.get("input_file_id"))
+        batch_id = f"batch_mock{next(self.ids)}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": request.get("endpoint"),
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": request.get("metadata")
+        }
+        self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+        return batch
+
+    def _run_batch(self, batch: Dict):
+        """按 OpenAI 批处理结果格式处理每一行请求（失败的写入错误文件）"""
+        time.sleep(self.batch_seconds / 2)
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]].splitlines() if line.strip()]
+        batch["request_counts"]["total"] = len(lines)
+        batch["status"] = "in_progress"
+
+        outputs, errors = [], []
+        for i, line in enumerate(lines):
+            status, _ = self.draw()
+            entry = {"id": f"batch_req_{i}", "custom_id": line["custom_id"], "error": None}
+            if status == 200:
+                body = self.completion(line["body"], count_images(line["body"]))
+                entry["response"] = {"status_code": 200, "request_id": f"req_{i}", "body": body}
+                outputs.append(entry)
+                batch["request_counts"]["completed"] += 1
+            else:
+                entry["response"] = {"status_code": status, "request_id": f"req_{i}",
+                                     "body": {"error": {"message": f"mock error {status}"}}}
+                errors.append(entry)
+                batch["request_counts"]["failed"] += 1
+        time.sleep(self.batch_seconds / 2)
+
+        for key, entries in (("output_file_id", outputs), ("error_file_id", errors)):
+            if entries:
+                data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+                batch[key] = self.add_file(data)["id"]
+        batch["status"] = "completed"
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, bytes]:
+    """解析 multipart/form-data，返回 {字段名: 内容}"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+        for part in message.iter_parts()
+    }
+
+
+def count_images(payload: Dict) -> int:
+    """统计请求中的图片块数"""
+    count = 0
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            count += sum(1 for block in content if block.get("type") in ("image_url", "image"))
+    return count
+
+
+class MockVLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive，与客户端连接池行为一致
+
+    def _send_json(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        parts = path.strip("/").split("/")
+        if path == "/stats":
+            self._send_json(200, self.server.stats.snapshot())
+        elif parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in self.server.batches:
+            self._send_json(200, self.server.batches[parts[2]])
+        elif (parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content"
+              and parts[2] in self.server.files):
+            data = self.server.files[parts[2]]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.rstrip("/")
+        if path == "/reset":
+            self.server.stats.reset()
+            self._send_json(200, {"ok": True})
+            return
+        if path == "/v1/files":
+            fields = parse_multipart(self.headers.get("Content-Type", ""), raw)
+            if "file" not in fields:
+                self._send_json(400, {"error": {"message": "missing file"}})
+            else:
+                self._send_json(200, self.server.add_file(fields["file"]))
+            return
+        if path == "/v1/batches":
+            try:
+                self._send_json(200, self.server.create_batch(json.loads(raw)))
+            except (json.JSONDecodeError, KeyError):
+                self._send_json(400, {"error": {"message": "invalid input_file_id"}})
+            return
+
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        images = count_images(payload)
+        stats = self.server.stats
+        stats.begin(images, len(raw))
+        status, delay = self.server.draw()
+        try:
+            if status == 429:
+                self._send_json(429, {"error": {"message": "rate limited (mock)"}},
+                                {"Retry-After": f"{self.server.retry_after:g}"})
+            elif status == 500:
+                self._send_json(500, {"error": {"message": "internal error (mock)"}})
+            else:
+                time.sleep(delay)
+                self._send_json(200, self.server.completion(payload, images))
+        finally:
+            stats.end(status)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(**kwargs) -> MockVLMServer:
+    """在后台线程启动模拟服务（参数同 MockVLMServer），返回服务对象，用完调用 shutdown()"""
+    server = MockVLMServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_objects(path: Optional[str]) -> Optional[List[Dict]]:
+    """读取固定检测结果文件：{"objects": [...]} 或直接是列表"""
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["objects"] if isinstance(data, dict) else data
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="本地模拟多模态模型服务（OpenAI/DashScope chat/completions 格式）",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--latency-ms", type=float, default=500.0,
+                        help="成功请求的延迟中位数（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.0,
+                        help="延迟对数正态分布的 sigma（0 为固定延迟，0.5 时 p95 约为中位数的 2.3 倍）")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--detections",
+                        help="固定检测结果 JSON 文件（{\"objects\": [...]}），默认返回3个目标")
+    parser.add_argument("--tokens-per-image", type=int, default=1000,
+                        help="usage 中每张图片计入的输入token数")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    parser.add_argument("--batch-seconds", type=float, default=2.0,
+                        help="模拟批处理任务从创建到完成的时间（秒）")
+    args = parser.parse_args()
+
+    server = MockVLMServer(
+        (args.host, args.port),
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        objects=load_objects(args.detections),
+        tokens_per_image=args.tokens_per_image,
+        seed=args.seed,
+        batch_seconds=args.batch_seconds
+    )
+    print(f"模拟服务已启动: {server.url}")
+    print(f"统计信息: http://{args.host}:{server.server_address[1]}/stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
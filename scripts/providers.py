@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+内置的提供商插件 - 各提供商的请求格式、响应文本与 usage 解析
+由 labeler.load_provider_class 按 API_PROVIDERS 的 "plugin" 在首次使用时导入
+
+    ChatCompletionsClient  OpenAI 兼容的 chat/completions（openai、qwen）
+    AnthropicClient        Claude Messages API（anthropic SDK）
+    GeminiClient           Gemini generateContent REST 接口
+
+指令都放在所有图片之前（system 消息 / systemInstruction），同一次运行的请求前缀逐字节相同，
+可以命中服务端的提示缓存。
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from labeler import IMAGES_PLACEHOLDER, ProviderClient
+from image_policy import image_media_type
+from response_schema import response_format_param
+
+
+class ChatCompletionsClient(ProviderClient):
+    """OpenAI 兼容的 chat/completions 接口（OpenAI、DashScope 兼容模式）"""
+
+    def url(self) -> str:
+        return self.labeler.endpoint
+
+    def headers(self) -> Dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.labeler.api_key}"
+        }
+
+    def build_payload(self, frame_count: int, max_tokens: int) -> Dict:
+        payload = {
+            "model": self.config["model"],
+            "messages": [
+                {"role": "system", "content": [self.instruction_block(frame_count)]},
+                {"role": "user", "content": IMAGES_PLACEHOLDER}
+            ],
+            "max_tokens": max_tokens
+        }
+        if self.labeler.response_format == "compact":
+            payload.update(response_format_param(self.labeler.provider, frame_count))
+        return payload
+
+    def image_parts(self, images: List[bytes]) -> str:
+        """图片内容块（多帧时在每张图前加帧编号）"""
+        blocks = []
+        for i, image in enumerate(images):
+            if len(images) > 1:
+                blocks.append(f'{{"type": "text", "text": "帧 {i}"}}')
+            # base64 与 MIME 类型中没有需要转义的字符，直接拼接，避免对整段图片数据再做一次 JSON 序列化
+            blocks.append(f'{{"type": "image_url", "image_url": {{"url": '
+                          f'"data:{image_media_type(image)};base64,{self.labeler.encode_image(image)}"}}}}')
+        return ", ".join(blocks)
+
+    def response_text(self, result: Dict) -> str:
+        return result["choices"][0]["message"]["content"]
+
+    def record_usage(self, result: Dict, latency: Optional[float], frames: int):
+        """记录 usage（含 prompt_tokens_details 中提示缓存命中/写入的token）"""
+        usage = result.get("usage") or {}
+        details = usage.get("prompt_tokens_details") or {}
+        self.labeler.usage_stats.record(
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+            latency,
+            frames,
+            cached_tokens=details.get("cached_tokens", 0),
+            cache_write_tokens=details.get("cache_creation_input_tokens", 0)
+        )
+
+
+class AnthropicClient(ProviderClient):
+    """Claude Messages API（SDK 自带连接池与 Retry-After 感知的重试）"""
+
+    def __init__(self, labeler):
+        super().__init__(labeler)
+        import anthropic
+        self.sdk = anthropic.Anthropic(
+            api_key=labeler.api_key,
+            timeout=labeler.timeout,
+            max_retries=labeler.max_retries
+        )
+        self._systems: Dict[int, List[Dict]] = {}
+
+    def system(self, frame_count: int) -> List[Dict]:
+        """system 参数（静态指令块，按帧数只构建一次）"""
+        system = self._systems.get(frame_count)
+        if system is None:
+            system = self._systems[frame_count] = [self.instruction_block(frame_count)]
+        return system
+
+    def complete(self, images: List[bytes], max_tokens: int) -> str:
+        content = []
+        for i, image in enumerate(images):
+            if len(images) > 1:
+                content.append({"type": "text", "text": f"帧 {i}"})
+            content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": image_media_type(image),
+                    "data": self.labeler.encode_image(image),
+                },
+            })
+
+        start_time = time.perf_counter()
+        message = self.sdk.messages.create(
+            model=self.config["model"],
+            max_tokens=max_tokens,
+            system=self.system(len(images)),
+            messages=[{"role": "user", "content": content}],
+        )
+        # input_tokens 不含缓存命中与写入的部分，这里合并为总输入token
+        usage = message.usage
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        self.labeler.usage_stats.record(
+            usage.input_tokens + cache_read + cache_write,
+            usage.output_tokens,
+            time.perf_counter() - start_time,
+            len(images),
+            cached_tokens=cache_read,
+            cache_write_tokens=cache_write
+        )
+        return message.content[0].text
+
+
+class GeminiClient(ProviderClient):
+    """Gemini generateContent REST 接口（不依赖 google-generativeai SDK，复用标注器的连接池与重试）"""
+
+    def url(self) -> str:
+        return f"{self.labeler.endpoint}/{self.config['model']}:generateContent"
+
+    def headers(self) -> Dict:
+        return {
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.labeler.api_key
+        }
+
+    def build_payload(self, frame_count: int, max_tokens: int) -> Dict:
+        # 提示词要求只返回 JSON，两种输出格式都可以使用原生 JSON 模式
+        return {
+            "systemInstruction": {"parts": [{"text": self.labeler.prompt_for(frame_count)}]},
+            "contents": [{"role": "user", "parts": IMAGES_PLACEHOLDER}],
+            "generationConfig": {
+                "maxOutputTokens": max_tokens,
+                "responseMimeType": "application/json"
+            }
+        }
+
+    def image_parts(self, images: List[bytes]) -> str:
+        parts = []
+        for i, image in enumerate(images):
+            if len(images) > 1:
+                parts.append(f'{{"text": "帧 {i}"}}')
+            parts.append(f'{{"inline_data": {{"mime_type": "{image_media_type(image)}", '
+                         f'"data": "{self.labeler.encode_image(image)}"}}}}')
+        return ", ".join(parts)
+
+    def response_text(self, result: Dict) -> str:
+        candidates = result.get("candidates") or []
+        if not candidates or "content" not in candidates[0]:
+            feedback = result.get("promptFeedback") or (candidates[0].get("finishReason") if candidates else None)
+            raise ValueError(f"Gemini 未返回内容: {feedback}")
+        return "".join(part.get("text", "") for part in candidates[0]["content"].get("parts", []))
+
+    def record_usage(self, result: Dict, latency: Optional[float], frames: int):
+        usage = result.get("usageMetadata") or {}
+        self.labeler.usage_stats.record(
+            usage.get("promptTokenCount", 0),
+            usage.get("candidatesTokenCount", 0),
+            latency,
+            frames,
+            cached_tokens=usage.get("cachedContentTokenCount", 0)
+        )
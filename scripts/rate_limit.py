@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+API 限流工具 - 令牌桶实现
+每个提供商一个 ProviderRateLimiter，同时限制每分钟请求数与每分钟token数
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """线程安全的令牌桶（容量 = 每分钟配额，按秒匀速补充）"""
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute: 每分钟配额
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0):
+        """阻塞直到桶内有足够配额"""
+        # 单次请求超过桶容量时按容量计，避免永远等待
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderRateLimiter:
+    """按 API_PROVIDERS 中的 rate_limit 配置限制请求数和token数"""
+
+    def __init__(self, rate_limit: Optional[Dict] = None):
+        """
+        Args:
+            rate_limit: {"requests_per_minute": ..., "tokens_per_minute": ...,
+                         "estimated_tokens_per_request": ...}，缺省项不限制
+        """
+        rate_limit = rate_limit or {}
+        rpm = rate_limit.get("requests_per_minute")
+        tpm = rate_limit.get("tokens_per_minute")
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.estimated_tokens = rate_limit.get("estimated_tokens_per_request", 1000)
+
+    def acquire(self, tokens: Optional[int] = None, frames: int = 1):
+        """
+        发送请求前调用，阻塞直到两个桶都有配额
+
+        Args:
+            tokens: 本次请求的token数，缺省按每帧估算值 × frames 计
+            frames: 请求中打包的帧数（多帧批量模式）
+        """
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(tokens if tokens is not None else self.estimated_tokens * frames)
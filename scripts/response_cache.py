@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+多模态模型响应缓存 - 基于 SQLite 的内容寻址缓存
+键 = sha256(图片字节 + 提示词 + 提供商 + 模型)，值 = 解析后的标注结果
+超过容量上限时按最近访问时间（LRU）淘汰
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "video-autolabeling", "vlm_responses.sqlite"
+)
+
+
+def make_cache_key(image_bytes: bytes, prompt: str, provider: str, model: str) -> str:
+    """计算缓存键（内容哈希）"""
+    h = hashlib.sha256()
+    for part in (provider.encode("utf-8"), model.encode("utf-8"), prompt.encode("utf-8")):
+        h.update(part)
+        h.update(b"\0")
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """线程安全的持久化响应缓存"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_size_mb: float = 512):
+        """
+        Args:
+            path: SQLite 文件路径
+            max_size_mb: 缓存容量上限（MB），超出后按 LRU 淘汰
+        """
+        self.path = path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        # 条目总大小存在 meta 行中，写入/淘汰时增量更新（多个进程共用同一个缓存文件时也保持一致），
+        # 只在旧缓存文件第一次打开时统计一次
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) "
+            "SELECT 'total_size', COALESCE(SUM(size), 0) FROM responses"
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """查询缓存，命中时更新访问时间"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict):
+        """写入缓存，必要时淘汰最久未访问的条目"""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        with self.lock:
+            # 读旧大小、写入与更新总大小在同一个写事务中，其他进程不会交错
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, data, size, time.time())
+                )
+                total = self._add_total(size - (row[0] if row else 0))
+                if total > self.max_size_bytes:
+                    self._evict(total)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def total_size(self) -> int:
+        """当前缓存条目的总大小（字节）"""
+        with self.lock:
+            return self.conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+
+    def _add_total(self, delta: int) -> int:
+        self.conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_size'", (delta,))
+        return self.conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+
+    def _evict(self, total: int):
+        """按访问时间从旧到新淘汰，直到总大小不超过上限（沿 last_access 索引读取，不扫描全表求和）"""
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC")
+        evicted = []
+        freed = 0
+        for key, size in rows:
+            if total - freed <= self.max_size_bytes:
+                break
+            evicted.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self._add_total(-freed)
+
+    def stats(self) -> Dict:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
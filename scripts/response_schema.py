@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+紧凑响应格式 - 减少模型输出token、解析耗时和截断失败
+
+默认（verbose）格式每个目标都带 "category"/"bbox"/"confidence" 键和中文类别名；
+紧凑格式每个目标是一个整数数组：
+    [类别编号, x_min, y_min, x_max, y_max, 置信度]
+类别编号是 OBJECT_CATEGORIES 的下标，坐标为 0-1000 的千分比，置信度为 0-100 的百分比。
+
+    单帧: {"o": [[1, 120, 400, 350, 620, 92], ...]}
+    多帧: {"f": [[帧0的目标...], [帧1的目标...], ...]}
+
+解析时严格校验结构（数组长度、整数、类别编号范围），展开为与 verbose 格式相同的
+{"objects": [{"category", "bbox", "confidence"}]}，格式不符时抛出 ValueError。
+"""
+
+import json
+from typing import Dict, List, Sequence
+
+COORD_SCALE = 1000
+CONFIDENCE_SCALE = 100
+ROW_LENGTH = 6
+
+_ROW_SCHEMA = {
+    "type": "array",
+    "items": {"type": "integer"},
+    "description": "[类别编号, x_min, y_min, x_max, y_max, 置信度]"
+}
+
+
+def json_schema(frame_count: int = 1) -> Dict:
+    """紧凑格式的 JSON Schema（用于 OpenAI 结构化输出）"""
+    rows = {"type": "array", "items": _ROW_SCHEMA}
+    if frame_count == 1:
+        properties, key = {"o": rows}, "o"
+    else:
+        properties, key = {"f": {"type": "array", "items": rows}}, "f"
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": [key],
+        "additionalProperties": False
+    }
+
+
+def response_format_param(provider: str, frame_count: int = 1) -> Dict:
+    """
+    各提供商原生 JSON 输出模式的请求参数（不支持时返回空字典，仅靠提示词约束）
+
+    openai: json_schema 严格模式；qwen（DashScope 兼容模式）: json_object
+    """
+    if provider == "openai":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "detections", "strict": True, "schema": json_schema(frame_count)}
+        }}
+    if provider == "qwen":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _load(content: str):
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        # 未启用原生 JSON 模式时模型可能包一层 markdown 代码块
+        return json.loads(content.replace("```json", "").replace("```", "").strip())
+
+
+def _clamp(value: int, upper: int) -> int:
+    return 0 if value < 0 else upper if value > upper else value
+
+
+def expand_rows(rows, categories: Sequence[str]) -> List[Dict]:
+    """把紧凑数组展开为 {"category", "bbox", "confidence"} 目标列表"""
+    if not isinstance(rows, list):
+        raise ValueError(f"目标列表应为数组: {rows!r}")
+    objects = []
+    for row in rows:
+        if (not isinstance(row, list) or len(row) != ROW_LENGTH
+                or not all(type(v) is int for v in row)):
+            raise ValueError(f"无效的目标: {row!r}")
+        index, x1, y1, x2, y2, confidence = row
+        if not 0 <= index < len(categories):
+            raise ValueError(f"类别编号越界: {index}")
+        x1, x2 = sorted((_clamp(x1, COORD_SCALE), _clamp(x2, COORD_SCALE)))
+        y1, y2 = sorted((_clamp(y1, COORD_SCALE), _clamp(y2, COORD_SCALE)))
+        objects.append({
+            "category": categories[index],
+            "bbox": [x1 / COORD_SCALE, y1 / COORD_SCALE, x2 / COORD_SCALE, y2 / COORD_SCALE],
+            "confidence": _clamp(confidence, CONFIDENCE_SCALE) / CONFIDENCE_SCALE
+        })
+    return objects
+
+
+def parse_compact(content: str, categories: Sequence[str]) -> Dict:
+    """解析单帧紧凑响应，返回 {"objects": [...]}"""
+    data = _load(content)
+    if not isinstance(data, dict) or "o" not in data:
+        raise ValueError("缺少 \"o\" 字段")
+    return {"objects": expand_rows(data["o"], categories)}
+
+
+def parse_compact_frames(content: str, frame_count: int, categories: Sequence[str]) -> List[Dict]:
+    """解析多帧紧凑响应，帧数必须与请求一致"""
+    data = _load(content)
+    if not isinstance(data, dict) or not isinstance(data.get("f"), list):
+        raise ValueError("缺少 \"f\" 字段")
+    if len(data["f"]) != frame_count:
+        raise ValueError(f"帧数不符: 期望 {frame_count}，实际 {len(data['f'])}")
+    return [{"objects": expand_rows(rows, categories)} for rows in data["f"]]
+
+
+def encode_rows(objects: List[Dict], categories: Sequence[str]) -> List[List[int]]:
+    """verbose 目标列表编码为紧凑数组（未知类别归为最后一类）"""
+    lookup = {name: i for i, name in enumerate(categories)}
+    return [
+        [lookup.get(obj["category"], len(categories) - 1)]
+        + [round(v * COORD_SCALE) for v in obj["bbox"]]
+        + [round(obj.get("confidence", 1.0) * CONFIDENCE_SCALE)]
+        for obj in objects
+    ]
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+自车区域裁剪/遮挡 - 按相机安装方式配置的静态感兴趣区域（ROI）
+第一人称视角画面底部是自己的车把、仪表盘，上传和推理这部分像素既花钱又容易误检；
+推理前把帧裁剪到 ROI（并可把 ROI 内残留的自车部分涂黑），返回的框再映射回整帧的归一化坐标
+
+ROI 配置（坐标都是相对整帧宽高的 0-1 比例）：
+    {"crop": [x_min, y_min, x_max, y_max],         # 保留的区域
+     "mask": [[[x, y], [x, y], ...], ...]}         # 可选，ROI 内需要涂黑的多边形（如后视镜）
+
+--roi 可以是预设名（ROI_PRESETS）、上述格式的 JSON 文件，或 "x_min,y_min,x_max,y_max"
+
+预览（在画面上标出被裁掉/涂黑的区域）:
+  python scripts/roi.py video.mp4 --roi helmet --output roi_preview.jpg
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 常见安装方式的起点配置，实际画面差异较大，请用预览确认后调整或改用 JSON 文件
+ROI_PRESETS = {
+    "helmet": {"crop": [0.0, 0.0, 1.0, 0.82]},     # 头盔相机：车把/仪表盘只占画面底部一条
+    "handlebar": {"crop": [0.0, 0.0, 1.0, 0.72]},  # 车把相机：仪表盘和车头占画面底部约三成
+}
+
+
+class RegionOfInterest:
+    """静态 ROI：裁剪帧并把 ROI 内的归一化坐标映射回整帧"""
+
+    def __init__(self, crop: Sequence[float] = (0.0, 0.0, 1.0, 1.0),
+                 mask: Optional[List[List[Sequence[float]]]] = None, name: Optional[str] = None):
+        """
+        Args:
+            crop: 保留区域 [x_min, y_min, x_max, y_max]（整帧归一化坐标）
+            mask: 可选，需要涂黑的多边形列表（整帧归一化坐标）
+            name: 预设名或配置来源（写入运行摘要）
+        """
+        x_min, y_min, x_max, y_max = (float(v) for v in crop)
+        if not (0.0 <= x_min < x_max <= 1.0 and 0.0 <= y_min < y_max <= 1.0):
+            raise ValueError(f"无效的 ROI 区域: {list(crop)}")
+        self.crop = (x_min, y_min, x_max, y_max)
+        self.mask = [[(float(x), float(y)) for x, y in polygon] for polygon in (mask or [])]
+        self.name = name
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "RegionOfInterest":
+        """解析 --roi：预设名、JSON 文件路径或 "x_min,y_min,x_max,y_max" """
+        if spec in ROI_PRESETS:
+            return cls(name=spec, **ROI_PRESETS[spec])
+        if os.path.exists(spec):
+            with open(spec, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            return cls(config.get("crop", (0.0, 0.0, 1.0, 1.0)), config.get("mask"), name=spec)
+        try:
+            values = [float(v) for v in spec.split(",")]
+        except ValueError:
+            values = []
+        if len(values) != 4:
+            raise ValueError(f"无法解析 ROI: {spec}（可选预设: {', '.join(ROI_PRESETS)}）")
+        return cls(values, name=spec)
+
+    @property
+    def kept_fraction(self) -> float:
+        """保留区域占整帧的面积比例"""
+        x_min, y_min, x_max, y_max = self.crop
+        return (x_max - x_min) * (y_max - y_min)
+
+    def pixel_box(self, width: int, height: int) -> Tuple[int, int, int, int]:
+        """保留区域的像素坐标 (x0, y0, x1, y1)"""
+        x_min, y_min, x_max, y_max = self.crop
+        return (round(x_min * width), round(y_min * height),
+                max(round(x_max * width), 1), max(round(y_max * height), 1))
+
+    def apply(self, frame):
+        """裁剪到保留区域并涂黑 mask 多边形（无 mask 时返回原帧的视图，不复制像素）"""
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.pixel_box(width, height)
+        cropped = frame[y0:y1, x0:x1]
+        if not self.mask:
+            return cropped
+
+        import cv2
+        import numpy as np
+        cropped = cropped.copy()
+        polygons = [
+            np.array([(round(x * width) - x0, round(y * height) - y0) for x, y in polygon], dtype=np.int32)
+            for polygon in self.mask
+        ]
+        cv2.fillPoly(cropped, polygons, (0, 0, 0))
+        return cropped
+
+    def to_full_frame(self, bbox: Sequence[float]) -> List[float]:
+        """ROI 内的归一化框 [x_min, y_min, x_max, y_max] 映射为整帧归一化坐标"""
+        x_min, y_min, x_max, y_max = self.crop
+        scale_x, scale_y = x_max - x_min, y_max - y_min
+        return [x_min + bbox[0] * scale_x, y_min + bbox[1] * scale_y,
+                x_min + bbox[2] * scale_x, y_min + bbox[3] * scale_y]
+
+    def remap_objects(self, objects: List[Dict]) -> List[Dict]:
+        """目标列表中的 bbox 映射回整帧（格式不对的框原样保留，由下游校验）"""
+        remapped = []
+        for obj in objects:
+            bbox = obj.get("bbox") if isinstance(obj, dict) else None
+            if isinstance(bbox, list) and len(bbox) == 4 and all(isinstance(v, (int, float)) for v in bbox):
+                obj = {**obj, "bbox": self.to_full_frame(bbox)}
+            remapped.append(obj)
+        return remapped
+
+    def to_dict(self) -> Dict:
+        result = {"name": self.name, "crop": list(self.crop), "kept_fraction": self.kept_fraction}
+        if self.mask:
+            result["mask"] = [[list(point) for point in polygon] for polygon in self.mask]
+        return result
+
+
+def parse_roi(spec: Optional[str]) -> Optional[RegionOfInterest]:
+    """命令行参数 --roi（未指定时返回 None）"""
+    return RegionOfInterest.from_spec(spec) if spec else None
+
+
+def draw_preview(frame, roi: RegionOfInterest):
+    """整帧预览：裁掉的区域压暗，涂黑的多边形填黑，保留区域画框"""
+    import cv2
+    import numpy as np
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = roi.pixel_box(width, height)
+    preview = (frame * 0.35).astype(np.uint8)
+    preview[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+    for polygon in roi.mask:
+        points = np.array([(round(x * width), round(y * height)) for x, y in polygon], dtype=np.int32)
+        cv2.fillPoly(preview, [points], (0, 0, 0))
+    cv2.rectangle(preview, (x0, y0), (x1 - 1, y1 - 1), (0, 255, 0), 2)
+    return preview
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="预览自车区域裁剪/遮挡",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("video_path", help="视频或图片路径")
+    parser.add_argument("--roi", required=True,
+                        help=f"预设名（{', '.join(ROI_PRESETS)}）、JSON 文件或 x_min,y_min,x_max,y_max")
+    parser.add_argument("--frame", type=int, default=0, help="预览的帧号（视频）")
+    parser.add_argument("--output", default="roi_preview.jpg", help="预览图路径")
+    args = parser.parse_args()
+
+    import cv2
+    roi = RegionOfInterest.from_spec(args.roi)
+    frame = cv2.imread(args.video_path)
+    if frame is None:
+        cap = cv2.VideoCapture(args.video_path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, args.frame)
+        ok, frame = cap.read()
+        cap.release()
+        if not ok:
+            raise SystemExit(f"无法读取: {args.video_path}")
+
+    cv2.imwrite(args.output, draw_preview(frame, roi))
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = roi.pixel_box(width, height)
+    print(f"整帧 {width}x{height} -> ROI {x1 - x0}x{y1 - y0}（保留 {roi.kept_fraction:.0%} 面积）")
+    print(f"预览: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试批处理对失败帧的续跑（离线运行，使用本地模拟服务）
+
+第一次运行时模拟服务让一部分请求返回 500：视频的输出文件照常写出，失败帧留在检查点之外、
+检查点保留。第二次运行同一批处理命令时，该视频不能被当作"已存在"跳过，而应从检查点续跑，
+只重新请求失败的帧。
+
+用法:
+  python scripts/test_batch_resume.py
+  python -m pytest scripts/test_batch_resume.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from benchmark_labeling import make_synthetic_video  # noqa: E402
+from checkpoint import checkpoint_path_for  # noqa: E402
+from mock_vlm_server import start_server  # noqa: E402
+
+
+def run_batch(video: str, output_dir: str, endpoint: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, DASHSCOPE_API_KEY="mock")
+    return subprocess.run(
+        [sys.executable, os.path.join(SCRIPT_DIR, "batch_auto_labeling.py"), video,
+         "--workers", "1", "--output-dir", output_dir, "--",
+         "--provider", "qwen", "--endpoint", endpoint, "--sample-rate", "30",
+         "--no-rate-limit", "--no-cache", "--max-retries", "0"],
+        env=env, capture_output=True, text=True, timeout=300
+    )
+
+
+def read_summary(output_dir: str) -> dict:
+    with open(os.path.join(output_dir, "clip_sr30.summary.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_batch_retries_failed_frames():
+    with tempfile.TemporaryDirectory() as work_dir:
+        video = os.path.join(work_dir, "clip.mp4")
+        make_synthetic_video(video, seconds=10.0, fps=30.0, width=320, height=240)
+        output_dir = os.path.join(work_dir, "out")
+        output = os.path.join(output_dir, "clip_sr30.json")
+
+        server = start_server(address=("127.0.0.1", 0), latency_ms=5, error_rate=0.5, seed=7)
+        try:
+            # 第一次：约一半的帧请求失败，输出写出，检查点保留
+            first = run_batch(video, output_dir, server.url)
+            assert first.returncode == 0, first.stdout + first.stderr
+            summary = read_summary(output_dir)
+            failed = summary["failed_frames"]
+            assert 0 < failed < summary["frames"], summary
+            assert os.path.exists(output)
+            assert os.path.exists(checkpoint_path_for(output))
+
+            # 第二次：不再注入错误，视频不能被跳过，只请求上次失败的帧
+            server.error_rate = 0.0
+            server.stats.reset()
+            second = run_batch(video, output_dir, server.url)
+            assert second.returncode == 0, second.stdout + second.stderr
+            assert "跳过（已完成）" not in second.stdout, second.stdout
+            summary = read_summary(output_dir)
+            assert summary["failed_frames"] == 0, summary
+            assert summary["frames"] == 10
+            assert summary["resumed_frames"] == 10 - failed
+            assert server.stats.requests == failed
+            assert not os.path.exists(checkpoint_path_for(output))
+
+            # 第三次：已完整标注，跳过且不发请求
+            server.stats.reset()
+            third = run_batch(video, output_dir, server.url)
+            assert third.returncode == 0, third.stdout + third.stderr
+            assert "跳过（已完成）" in third.stdout, third.stdout
+            assert server.stats.requests == 0
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    test_batch_retries_failed_frames()
+    print("✓ 失败帧在重新运行批处理时被重试")
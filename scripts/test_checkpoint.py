@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+测试逐帧检查点：记录与续跑、运行参数不一致时移到 *.stale、末尾半行的处理
+
+用法:
+  python scripts/test_checkpoint.py
+  python -m pytest scripts/test_checkpoint.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from checkpoint import FrameCheckpoint, checkpoint_path_for  # noqa: E402
+
+META = {"video": "clip.mp4", "provider": "qwen", "model": "qwen-vl-max", "sample_rate": 30}
+
+
+def annotation(category: str) -> dict:
+    return {"objects": [{"category": category, "bbox": [0.1, 0.2, 0.3, 0.4], "confidence": 0.9}]}
+
+
+def test_records_resume_after_reopen():
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = checkpoint_path_for(os.path.join(work_dir, "out.json"))
+        checkpoint = FrameCheckpoint(path, META)
+        assert checkpoint.records == {}
+        checkpoint.append(0, annotation("汽车"), 0.0)
+        checkpoint.append(30, {"error": "500"}, 1.0)  # 失败帧不记录，续跑时重新请求
+        checkpoint.append(60, annotation("行人"), 2.0)
+        checkpoint.close()
+
+        resumed = FrameCheckpoint(path, META)
+        assert sorted(resumed.records) == [0, 60]
+        assert resumed.records[60] == annotation("行人")
+        assert resumed.times == {0: 0.0, 60: 2.0}
+        resumed.remove()
+        assert not os.path.exists(path)
+
+
+def test_meta_mismatch_moves_checkpoint_to_stale():
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = checkpoint_path_for(os.path.join(work_dir, "out.json"))
+        checkpoint = FrameCheckpoint(path, META)
+        checkpoint.append(0, annotation("汽车"), 0.0)
+        checkpoint.close()
+
+        # 采样率不同：旧记录不能混入本次输出
+        changed = dict(META, sample_rate=15)
+        fresh = FrameCheckpoint(path, changed)
+        fresh.close()
+        assert fresh.records == {} and fresh.times == {}
+        assert os.path.exists(f"{path}.stale")
+        with open(path, "r", encoding="utf-8") as f:
+            assert [json.loads(line) for line in f] == [{"meta": changed}]
+
+
+def test_truncated_last_line_is_dropped():
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = checkpoint_path_for(os.path.join(work_dir, "out.json"))
+        checkpoint = FrameCheckpoint(path, META)
+        checkpoint.append(0, annotation("汽车"), 0.0)
+        checkpoint.close()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"frame": 30, "time": 1.0, "annot')  # 写到一半时被中断
+
+        resumed = FrameCheckpoint(path, META)
+        resumed.append(30, annotation("行人"), 1.0)
+        resumed.close()
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]  # 半行已被重写掉，每行都是完整 JSON
+        assert [entry.get("frame") for entry in lines] == [None, 0, 30]
+        assert sorted(FrameCheckpoint(path, META).records) == [0, 30]
+
+
+if __name__ == "__main__":
+    test_records_resume_after_reopen()
+    test_meta_mismatch_moves_checkpoint_to_stale()
+    test_truncated_last_line_is_dropped()
+    print("✓ 检查点测试通过")
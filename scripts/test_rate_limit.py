@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+测试令牌桶限流：桶满时不等待、配额用完后按速率等待、单次请求超过容量、按帧估算token
+
+用虚拟时钟代替 time.monotonic/time.sleep，测试不真的等待。
+
+用法:
+  python scripts/test_rate_limit.py
+  python -m pytest scripts/test_rate_limit.py
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import rate_limit  # noqa: E402
+from rate_limit import ProviderRateLimiter, TokenBucket  # noqa: E402
+
+
+class FakeClock:
+    """sleep 只推进虚拟时间并累计等待时长"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+        self.slept += seconds
+
+
+def with_fake_clock(test):
+    def run():
+        original = rate_limit.time
+        rate_limit.time = FakeClock()
+        try:
+            test(rate_limit.time)
+        finally:
+            rate_limit.time = original
+    run.__name__ = test.__name__
+    return run
+
+
+@with_fake_clock
+def test_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(60)  # 每秒补充 1 个
+    for _ in range(60):
+        bucket.acquire()
+    assert clock.slept == 0.0  # 初始桶满，突发不等待
+
+    bucket.acquire()
+    assert abs(clock.slept - 1.0) < 1e-9
+    bucket.acquire(3)
+    assert abs(clock.slept - 4.0) < 1e-9
+
+
+@with_fake_clock
+def test_bucket_caps_oversized_request(clock):
+    bucket = TokenBucket(120)
+    bucket.acquire(1000)  # 超过容量按容量计，不会永远等待
+    assert clock.slept == 0.0
+    bucket.acquire(1000)
+    assert abs(clock.slept - 60.0) < 1e-9
+
+
+@with_fake_clock
+def test_provider_limiter_uses_token_estimate(clock):
+    unlimited = ProviderRateLimiter(None)
+    for _ in range(1000):
+        unlimited.acquire(frames=4)
+    assert clock.slept == 0.0
+
+    limiter = ProviderRateLimiter({
+        "requests_per_minute": 600,
+        "tokens_per_minute": 6000,
+        "estimated_tokens_per_request": 1000
+    })
+    limiter.acquire(frames=3)        # 缺省按每帧估算值 × 帧数计
+    assert limiter.tokens.tokens == 3000
+    assert limiter.requests.tokens == 599
+    limiter.acquire(tokens=500)      # 已知实际 token 数时按实际计
+    assert limiter.tokens.tokens == 2500
+    limiter.acquire(frames=3)        # 差 500 个 token，按每秒 100 个补充等待 5 秒
+    assert abs(clock.slept - 5.0) < 1e-9
+
+
+if __name__ == "__main__":
+    test_bucket_waits_for_refill()
+    test_bucket_caps_oversized_request()
+    test_provider_limiter_uses_token_estimate()
+    print("✓ 限流测试通过")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+测试响应缓存：命中统计、按最近访问时间（LRU）淘汰、增量维护的总大小
+
+用法:
+  python scripts/test_response_cache.py
+  python -m pytest scripts/test_response_cache.py
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import response_cache  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+
+class FakeClock:
+    """每次读取时间前进 1 秒，访问顺序与时间戳一一对应"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        self.now += 1.0
+        return self.now
+
+
+def entry(name: str) -> dict:
+    return {"objects": [], "name": name, "pad": "x" * 1000}
+
+
+def entry_size(name: str) -> int:
+    return len(json.dumps(entry(name), ensure_ascii=False).encode("utf-8"))
+
+
+def with_fake_clock(test):
+    def run():
+        original = response_cache.time
+        response_cache.time = FakeClock()
+        try:
+            test()
+        finally:
+            response_cache.time = original
+    run.__name__ = test.__name__
+    return run
+
+
+@with_fake_clock
+def test_get_put_and_stats():
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache = ResponseCache(os.path.join(work_dir, "cache.sqlite"))
+        assert cache.get("a") is None
+        cache.put("a", entry("a"))
+        assert cache.get("a") == entry("a")
+        assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+        cache.close()
+
+
+@with_fake_clock
+def test_lru_eviction_keeps_recently_used():
+    with tempfile.TemporaryDirectory() as work_dir:
+        size = entry_size("a")
+        # 容量略大于 3 个条目
+        cache = ResponseCache(os.path.join(work_dir, "cache.sqlite"), max_size_mb=(3.5 * size) / (1024 * 1024))
+        for key in ("a", "b", "c"):
+            cache.put(key, entry(key))
+        assert cache.get("a") is not None  # a 变为最近访问
+        cache.put("d", entry("d"))          # 超出容量，淘汰最久未访问的 b
+        assert cache.get("b") is None
+        assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+        assert cache.total_size() == 3 * size
+        cache.close()
+
+
+@with_fake_clock
+def test_total_size_tracks_replacements_and_reopen():
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "cache.sqlite")
+        cache = ResponseCache(path)
+        cache.put("a", entry("a"))
+        cache.put("b", entry("b"))
+        cache.put("a", {"objects": []})     # 覆盖写入只计新大小
+        expected = entry_size("b") + len(json.dumps({"objects": []}).encode("utf-8"))
+        assert cache.total_size() == expected
+        cache.close()
+
+        reopened = ResponseCache(path)
+        assert reopened.total_size() == expected
+        reopened.close()
+
+
+def test_total_size_seeded_for_existing_cache_file():
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 没有 meta 表的旧缓存文件，第一次打开时统计一次总大小
+        path = os.path.join(work_dir, "cache.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                     "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        conn.executemany("INSERT INTO responses VALUES (?, ?, ?, ?)",
+                         [("a", "{}", 100, 1.0), ("b", "{}", 250, 2.0)])
+        conn.commit()
+        conn.close()
+
+        cache = ResponseCache(path)
+        assert cache.total_size() == 350
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_get_put_and_stats()
+    test_lru_eviction_keeps_recently_used()
+    test_total_size_tracks_replacements_and_reopen()
+    test_total_size_seeded_for_existing_cache_file()
+    print("✓ 响应缓存测试通过")
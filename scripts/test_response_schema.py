@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试紧凑响应格式的解析：展开为 verbose 目标、坐标裁剪与排序、结构校验
+
+用法:
+  python scripts/test_response_schema.py
+  python -m pytest scripts/test_response_schema.py
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from response_schema import encode_rows, parse_compact, parse_compact_frames  # noqa: E402
+
+CATEGORIES = ["行人", "汽车", "交通信号灯", "其他"]
+
+
+def expect_value_error(content: str, frame_count: int = 0):
+    try:
+        if frame_count:
+            parse_compact_frames(content, frame_count, CATEGORIES)
+        else:
+            parse_compact(content, CATEGORIES)
+    except ValueError:
+        return
+    raise AssertionError(f"应当拒绝: {content}")
+
+
+def test_parse_compact_expands_rows():
+    result = parse_compact('{"o": [[1, 120, 400, 350, 620, 92]]}', CATEGORIES)
+    assert result == {"objects": [
+        {"category": "汽车", "bbox": [0.12, 0.4, 0.35, 0.62], "confidence": 0.92}
+    ]}
+
+    # 坐标裁剪到 0-1000 并按大小排序，置信度裁剪到 0-100；允许外层 markdown 代码块
+    result = parse_compact('```json\n{"o": [[0, 900, 1200, 100, -5, 150]]}\n```', CATEGORIES)
+    assert result["objects"][0]["bbox"] == [0.1, 0.0, 0.9, 1.0]
+    assert result["objects"][0]["confidence"] == 1.0
+    assert parse_compact('{"o": []}', CATEGORIES) == {"objects": []}
+
+
+def test_parse_compact_rejects_invalid_rows():
+    expect_value_error('{"objects": []}')                 # 缺少 "o"
+    expect_value_error('{"o": {"a": 1}}')                 # 目标列表不是数组
+    expect_value_error('{"o": [[1, 120, 400, 350, 620]]}')  # 长度不对
+    expect_value_error('{"o": [[1, 0.1, 400, 350, 620, 92]]}')  # 非整数
+    expect_value_error('{"o": [[4, 120, 400, 350, 620, 92]]}')  # 类别编号越界
+    expect_value_error('{"o": [[true, 120, 400, 350, 620, 92]]}')  # 布尔值不算整数
+
+
+def test_parse_compact_frames_checks_frame_count():
+    frames = parse_compact_frames('{"f": [[[0, 0, 0, 500, 500, 80]], []]}', 2, CATEGORIES)
+    assert [len(f["objects"]) for f in frames] == [1, 0]
+    assert frames[0]["objects"][0]["category"] == "行人"
+    expect_value_error('{"f": [[]]}', frame_count=2)
+    expect_value_error('{"o": []}', frame_count=1)
+
+
+def test_encode_rows_round_trip():
+    objects = [
+        {"category": "交通信号灯", "bbox": [0.25, 0.125, 0.5, 0.75], "confidence": 0.5},
+        {"category": "施工区域", "bbox": [0.0, 0.0, 1.0, 1.0], "confidence": 1.0}  # 未知类别归为最后一类
+    ]
+    rows = encode_rows(objects, CATEGORIES)
+    assert rows == [[2, 250, 125, 500, 750, 50], [3, 0, 0, 1000, 1000, 100]]
+    decoded = parse_compact(f'{{"o": {rows}}}', CATEGORIES)["objects"]
+    assert decoded[0] == objects[0]
+    assert decoded[1]["category"] == "其他"
+
+
+if __name__ == "__main__":
+    test_parse_compact_expands_rows()
+    test_parse_compact_rejects_invalid_rows()
+    test_parse_compact_frames_checks_frame_count()
+    test_encode_rows_round_trip()
+    print("✓ 紧凑响应格式测试通过")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+测试切片推理的 NMS 与整帧/切片结果合并
+
+用法:
+  python scripts/test_tiling.py
+  python -m pytest scripts/test_tiling.py
+"""
+
+import os
+import sys
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from tiling import TileGrid, nms, tile_starts  # noqa: E402
+
+LIGHT, CAR = 9, 2
+
+
+def detections(rows):
+    """[(类别id, 置信度, x0, y0, x1, y1), ...] -> (类别id, 置信度, 像素框)"""
+    array = np.array(rows, dtype=np.float32).reshape(-1, 6)
+    return array[:, 0].astype(int), array[:, 1], array[:, 2:]
+
+
+def test_nms_suppresses_same_class_only():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10], [50, 50, 60, 60]], dtype=float)
+    scores = np.array([0.6, 0.9, 0.8, 0.3])
+    classes = np.array([CAR, CAR, LIGHT, CAR])
+    # 第0个框与更高分的第1个同类框重叠被抑制；第2个框类别不同，保留；结果按置信度排序
+    assert nms(boxes, scores, classes, 0.5).tolist() == [1, 2, 3]
+    assert nms(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)).tolist() == []
+
+
+def test_tile_grid_covers_upper_region():
+    grid = TileGrid(tile_size=640, overlap=0.2, region=0.5)
+    assert len(grid.boxes(640, 480)) == 0  # 整帧不超过一个切片时不切片
+
+    boxes = grid.boxes(1920, 1080)
+    assert len(boxes) == 4
+    assert boxes[:, 1].min() == 0 and boxes[:, 3].max() == 540
+    assert boxes[0, 0] == 0 and boxes[-1, 2] == 1920
+    widths = boxes[:, 2] - boxes[:, 0]
+    assert (widths == 640).all()
+    # 相邻切片至少重叠 20%
+    assert ((boxes[:-1, 2] - boxes[1:, 0]) >= 0.2 * 640).all()
+    assert tile_starts(500, 640, 0.2) == [0]
+
+
+def test_merge_maps_tiles_and_drops_clipped_boxes():
+    grid = TileGrid(tile_size=640, overlap=0.2, region=0.5, iou_threshold=0.5)
+    width, height = 1920, 1080
+    tile_boxes = grid.boxes(width, height)
+    x0 = int(tile_boxes[1, 0])
+
+    full = detections([
+        (CAR, 0.9, 800, 600, 1200, 900),
+        (LIGHT, 0.4, x0 + 101, 21, x0 + 121, 61)  # 与切片中的同一个信号灯重复，置信度更低
+    ])
+    empty = detections([])
+    tiles = [empty, detections([
+        (LIGHT, 0.8, 100, 20, 120, 60),   # 完整的小目标
+        (LIGHT, 0.7, 600, 20, 640, 60)    # 贴着切片右侧内边缘，被截断，丢弃
+    ]), empty, empty]
+
+    cls_ids, confs, xyxy = grid.merge(full, tiles, width, height)
+    assert cls_ids.tolist() == [CAR, LIGHT]
+    assert np.allclose(confs, [0.9, 0.8])
+    # 切片框平移回整帧坐标
+    assert xyxy[1].tolist() == [x0 + 100, 20, x0 + 120, 60]
+
+
+if __name__ == "__main__":
+    test_nms_suppresses_same_class_only()
+    test_tile_grid_covers_upper_region()
+    test_merge_maps_tiles_and_drops_clipped_boxes()
+    print("✓ 切片推理测试通过")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试跨帧目标关联：同类别按 IoU 连接、漏检容忍（max_gap）与关键帧导出
+
+用法:
+  python scripts/test_tracking.py
+  python -m pytest scripts/test_tracking.py
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+from tracking import link_tracks, tracks_to_label_studio_results  # noqa: E402
+
+
+def obj(category: str, x: float, y: float = 0.5, size: float = 0.1, confidence: float = 0.9) -> dict:
+    return {"category": category, "bbox": [x, y, x + size, y + size], "confidence": confidence}
+
+
+def test_link_tracks_follows_moving_objects():
+    frames = [0, 30, 60]
+    annotations = [
+        {"objects": [obj("汽车", 0.10), obj("行人", 0.60)]},
+        {"objects": [obj("行人", 0.61), obj("汽车", 0.11)]},  # 顺序变化不影响关联
+        {"objects": [obj("汽车", 0.12), obj("行人", 0.62)]},
+    ]
+    tracks = link_tracks(frames, annotations, iou_threshold=0.3, frame_times=[0.0, 1.0, 2.0])
+    assert len(tracks) == 2
+    by_category = {t["category"]: t for t in tracks}
+    car = by_category["汽车"]["keyframes"]
+    assert [kf["frame"] for kf in car] == frames
+    assert [kf["time"] for kf in car] == [0.0, 1.0, 2.0]
+    assert car[-1]["bbox"] == obj("汽车", 0.12)["bbox"]
+
+
+def test_different_category_or_low_iou_starts_new_track():
+    annotations = [
+        {"objects": [obj("汽车", 0.10)]},
+        {"objects": [obj("卡车", 0.10)]},   # 同位置不同类别
+        {"objects": [obj("卡车", 0.50)]},   # 同类别但不重叠
+    ]
+    tracks = link_tracks([0, 1, 2], annotations)
+    assert [len(t["keyframes"]) for t in tracks] == [1, 1, 1]
+
+
+def test_max_gap_bridges_missed_detections():
+    annotations = [
+        {"objects": [obj("汽车", 0.10)]},
+        {"objects": []},                    # 漏检一帧
+        {"objects": [obj("汽车", 0.11)]},
+    ]
+    assert len(link_tracks([0, 10, 20], annotations, max_gap=1)) == 2
+    tracks = link_tracks([0, 10, 20], annotations, max_gap=2)
+    assert len(tracks) == 1
+    assert [kf["frame"] for kf in tracks[0]["keyframes"]] == [0, 20]
+
+
+def test_keyframes_export_to_label_studio_frames():
+    annotations = [{"objects": [obj("汽车", 0.10)]}, {"objects": [obj("汽车", 0.11), obj("行人", 0.7)]}]
+    tracks = link_tracks([0, 30], annotations)
+    results = tracks_to_label_studio_results(tracks, fps=30.0, total_frames=60, min_length=2)
+    assert len(results) == 1  # 只有一个关键帧的行人轨迹被 min_length 过滤
+    sequence = results[0]["value"]["sequence"]
+    assert [kf["frame"] for kf in sequence] == [1, 31]  # Label Studio 帧号 = 原始帧号 + 1
+    assert [kf["enabled"] for kf in sequence] == [True, False]
+    assert [kf["time"] for kf in sequence] == [0.0, 1.0]  # 没有真实时间戳时按帧率换算
+    assert results[0]["value"]["labels"] == ["汽车"]
+
+
+if __name__ == "__main__":
+    test_link_tracks_follows_moving_objects()
+    test_different_category_or_low_iou_starts_new_track()
+    test_max_gap_bridges_missed_detections()
+    test_keyframes_export_to_label_studio_frames()
+    print("✓ 轨迹关联测试通过")
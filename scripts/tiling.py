@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+切片推理 - 把画面上部（地平线附近）切成相互重叠的切片，小目标以接近原分辨率送入模型
+广角 1080p 画面整帧缩放到 640 后，远处的信号灯、标志只剩十几个像素；切片按原分辨率推理，
+再把切片检测框平移回整帧、与整帧检测合并做 NMS，用小模型即可提高小目标召回
+
+每个采样帧的推理量 = 1 次整帧 + N 个切片（1080p、默认参数下 N=4）
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from tracking import iou_matrix
+
+# 切片只检测这些小目标类别；大目标整帧推理已经能检出，被切片截断的部分框反而会产生重复
+SMALL_OBJECT_CATEGORIES = {"traffic light", "stop sign"}
+
+
+def tile_starts(length: int, tile: int, overlap: float) -> List[int]:
+    """一个维度上切片的起点：均匀分布，相邻切片至少重叠 overlap 比例，首尾贴齐边缘"""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    count = -(-(length - tile) // stride) + 1
+    return np.linspace(0, length - tile, count).round().astype(int).tolist()
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_threshold: float = 0.5) -> np.ndarray:
+    """
+    按类别的 NMS（一次算出 IoU 矩阵，逐个保留框时只做向量运算）
+
+    Args:
+        boxes: (N, 4) [x_min, y_min, x_max, y_max]
+        scores: (N,) 置信度
+        classes: (N,) 类别id，不同类别的框互不抑制
+        iou_threshold: IoU 超过该值的同类框被抑制
+
+    Returns:
+        保留的框下标（按置信度从高到低）
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+    order = np.argsort(-scores, kind="stable")
+    overlap = iou_matrix(boxes[order], boxes[order]) > iou_threshold
+    overlap &= classes[order][:, None] == classes[order][None, :]
+
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if not suppressed[i]:
+            suppressed[i + 1:] |= overlap[i, i + 1:]
+    return order[~suppressed]
+
+
+class TileGrid:
+    """画面上部的重叠切片网格（像素坐标按帧尺寸缓存）"""
+
+    def __init__(self, tile_size: int = 640, overlap: float = 0.2, region: float = 0.5,
+                 iou_threshold: float = 0.5):
+        """
+        Args:
+            tile_size: 切片边长（像素），与模型输入尺寸一致时切片不再缩放
+            overlap: 相邻切片的最小重叠比例，应大于要检测的小目标尺寸
+            region: 切片覆盖的画面上部比例（0-1，从顶部算起）
+            iou_threshold: 合并整帧与切片检测时 NMS 的 IoU 阈值
+        """
+        if not 0.0 < region <= 1.0:
+            raise ValueError(f"无效的切片区域比例: {region}")
+        if not 0.0 <= overlap < 1.0:
+            raise ValueError(f"无效的切片重叠比例: {overlap}")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.region = region
+        self.iou_threshold = iou_threshold
+        self._boxes: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def boxes(self, width: int, height: int) -> np.ndarray:
+        """切片的像素框 (N, 4) [x0, y0, x1, y1]；整帧不超过一个切片时不切片（返回空）"""
+        key = (width, height)
+        boxes = self._boxes.get(key)
+        if boxes is None:
+            if max(width, height) <= self.tile_size:
+                boxes = np.zeros((0, 4), dtype=int)
+            else:
+                region_height = max(1, round(height * self.region))
+                tile_w, tile_h = min(self.tile_size, width), min(self.tile_size, region_height)
+                boxes = np.array([
+                    (x, y, x + tile_w, y + tile_h)
+                    for y in tile_starts(region_height, tile_h, self.overlap)
+                    for x in tile_starts(width, tile_w, self.overlap)
+                ], dtype=int).reshape(-1, 4)
+            self._boxes[key] = boxes
+        return boxes
+
+    def crop(self, frame: np.ndarray) -> List[np.ndarray]:
+        """帧的切片（原帧的视图，不复制像素）"""
+        height, width = frame.shape[:2]
+        return [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in self.boxes(width, height)]
+
+    def merge(
+        self,
+        full: Tuple[np.ndarray, np.ndarray, np.ndarray],
+        tiles: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+        width: int,
+        height: int,
+        edge_margin: float = 2.0
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        合并整帧与切片的检测结果
+
+        切片框平移回整帧坐标；贴着切片内侧边缘（不是画面边缘）的框是被截断的目标，
+        完整的目标会出现在相邻切片或整帧结果中，直接丢弃；最后按类别做 NMS。
+
+        Args:
+            full: 整帧结果 (类别id, 置信度, 像素框)
+            tiles: 与 boxes(width, height) 顺序一致的切片结果，框为切片内像素坐标
+            width, height: 整帧尺寸
+
+        Returns:
+            (类别id, 置信度, 像素框)
+        """
+        cls_parts, conf_parts, xyxy_parts = [full[0]], [full[1]], [full[2].reshape(-1, 4)]
+        for (x0, y0, x1, y1), (cls_ids, confs, xyxy) in zip(self.boxes(width, height), tiles):
+            if len(xyxy) == 0:
+                continue
+            xyxy = xyxy.reshape(-1, 4)
+            # 切片的内侧边缘（与画面边缘重合的一侧不算截断）
+            inner = np.array([x0 > 0, y0 > 0, x1 < width, y1 < height])
+            clipped = np.concatenate([xyxy[:, :2] <= edge_margin,
+                                      xyxy[:, 2:] >= np.array([x1 - x0, y1 - y0]) - edge_margin], axis=1)
+            keep = ~(clipped & inner).any(axis=1)
+            cls_parts.append(cls_ids[keep])
+            conf_parts.append(confs[keep])
+            xyxy_parts.append(xyxy[keep] + np.array([x0, y0, x0, y0], dtype=xyxy.dtype))
+
+        cls_ids = np.concatenate(cls_parts)
+        confs = np.concatenate(conf_parts)
+        xyxy = np.concatenate(xyxy_parts)
+        keep = nms(xyxy, confs, cls_ids, self.iou_threshold)
+        return cls_ids[keep], confs[keep], xyxy[keep]
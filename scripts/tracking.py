@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+跨帧目标关联 - 把逐帧检测框连接成轨迹，导出为 Label Studio 关键帧插值格式
+每条轨迹导出为一个 videorectangle 区域（sequence 中的每个采样帧是一个关键帧，
+关键帧之间由 Label Studio 插值），因此可以用更稀疏的采样率得到逐帧的框
+"""
+
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from label_export import label_studio_frame, video_task_data
+
+
+def _scipy_assignment():
+    """scipy 可选，缺失时退化为贪心匹配；导入 scipy.optimize 约需 0.4 秒，只在第一次关联时导入"""
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return None
+    return linear_sum_assignment
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    向量化计算两组框的 IoU
+
+    Args:
+        boxes_a: (N, 4) [x_min, y_min, x_max, y_max]
+        boxes_b: (M, 4)
+
+    Returns:
+        (N, M) IoU 矩阵
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).clip(0).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).clip(0).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _greedy_assignment(cost: np.ndarray):
+    rows, cols = [], []
+    order = np.dstack(np.unravel_index(np.argsort(cost, axis=None), cost.shape))[0]
+    used_rows, used_cols = set(), set()
+    for r, c in order:
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        rows.append(r)
+        cols.append(c)
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
+def assign(cost: np.ndarray):
+    """最小代价匹配（有 scipy 时用匈牙利算法，否则贪心）"""
+    if cost.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    linear_sum_assignment = _scipy_assignment()
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+    return _greedy_assignment(cost)
+
+
+def link_tracks(
+    frame_numbers: List[int],
+    frame_annotations: List[Dict],
+    iou_threshold: float = 0.3,
+    max_gap: int = 1,
+    frame_times: Optional[List[float]] = None
+) -> List[Dict]:
+    """
+    把逐帧检测框连接成轨迹
+
+    相邻采样帧之间按 1 - IoU 做最优匹配，只匹配同类别且 IoU 不低于阈值的框。
+    轨迹允许中断最多 max_gap - 1 个采样帧（漏检）后继续。
+
+    Args:
+        frame_numbers: 采样帧的原始帧号
+        frame_annotations: 与 frame_numbers 对应的标注结果
+        iou_threshold: 关联的最小 IoU
+        max_gap: 轨迹最多跨越的采样帧数
+        frame_times: 可选，与 frame_numbers 对应的真实时间戳（秒）
+
+    Returns:
+        [{"category": 类别, "keyframes": [{"frame", "time", "bbox", "confidence"}, ...]}, ...]
+    """
+    tracks = []
+    active = []  # (track, 最后出现的采样帧序号)
+
+    for sample_index, (frame_number, frame_data) in enumerate(zip(frame_numbers, frame_annotations)):
+        frame_time = frame_times[sample_index] if frame_times is not None else None
+        objects = frame_data.get("objects", [])
+        active = [(t, last) for t, last in active if sample_index - last <= max_gap]
+
+        matched_objects = set()
+        if active and objects:
+            track_boxes = np.array([t["keyframes"][-1]["bbox"] for t, _ in active])
+            object_boxes = np.array([obj["bbox"] for obj in objects])
+            iou = iou_matrix(track_boxes, object_boxes)
+
+            same_category = np.array([
+                [t["category"] == obj["category"] for obj in objects] for t, _ in active
+            ])
+            valid = same_category & (iou >= iou_threshold)
+            cost = np.where(valid, 1.0 - iou, 1e6)
+
+            rows, cols = assign(cost)
+            for r, c in zip(rows, cols):
+                if not valid[r, c]:
+                    continue
+                track, _ = active[r]
+                track["keyframes"].append(_keyframe(frame_number, frame_time, objects[c]))
+                active[r] = (track, sample_index)
+                matched_objects.add(c)
+
+        for c, obj in enumerate(objects):
+            if c in matched_objects:
+                continue
+            track = {"category": obj["category"], "keyframes": [_keyframe(frame_number, frame_time, obj)]}
+            tracks.append(track)
+            active.append((track, sample_index))
+
+    return tracks
+
+
+def _keyframe(frame_number: int, frame_time: Optional[float], obj: Dict) -> Dict:
+    return {
+        "frame": frame_number,
+        "time": frame_time,
+        "bbox": obj["bbox"],
+        "confidence": obj.get("confidence")
+    }
+
+
+def tracks_to_label_studio_results(
+    tracks: List[Dict],
+    fps: float,
+    total_frames: int,
+    from_name: str = "box",
+    min_length: int = 1
+) -> List[Dict]:
+    """
+    轨迹转换为 Label Studio videorectangle 结果（每条轨迹一个区域）
+
+    关键帧的 frame 按 label_export 的约定写成 Label Studio 帧号（原始帧号 + 1）；
+    除最后一个关键帧外都开启插值（enabled=True），
+    最后一个关键帧关闭插值，轨迹在此结束。
+    """
+    results = []
+    for track in tracks:
+        keyframes = track["keyframes"]
+        if len(keyframes) < min_length:
+            continue
+
+        sequence = []
+        for i, kf in enumerate(keyframes):
+            bbox = kf["bbox"]
+            sequence.append({
+                "frame": label_studio_frame(kf["frame"]),
+                "enabled": i < len(keyframes) - 1,
+                "rotation": 0,
+                "x": bbox[0] * 100,
+                "y": bbox[1] * 100,
+                "width": (bbox[2] - bbox[0]) * 100,
+                "height": (bbox[3] - bbox[1]) * 100,
+                "time": kf["time"] if kf.get("time") is not None else kf["frame"] / fps
+            })
+
+        confidences = [kf["confidence"] for kf in keyframes if kf["confidence"] is not None]
+        results.append({
+            "id": uuid.uuid4().hex[:10],
+            "value": {
+                "framesCount": total_frames,
+                "duration": total_frames / fps,
+                "sequence": sequence,
+                "labels": [track["category"]]
+            },
+            "from_name": from_name,
+            "to_name": "video",
+            "type": "videorectangle",
+            "meta": {
+                "confidence": sum(confidences) / len(confidences) if confidences else None
+            }
+        })
+    return results
+
+
+def build_track_task(
+    video_path: str,
+    frame_numbers: List[int],
+    frame_annotations: List[Dict],
+    fps: float,
+    total_frames: int,
+    iou_threshold: float = 0.3,
+    max_gap: int = 1,
+    min_length: int = 1,
+    model_version: Optional[str] = None,
+    frame_times: Optional[List[float]] = None
+) -> Dict:
+    """关联轨迹并生成完整的 Label Studio 导入任务（frame_times 为可选的真实时间戳）"""
+    tracks = link_tracks(frame_numbers, frame_annotations, iou_threshold, max_gap, frame_times)
+    results = tracks_to_label_studio_results(tracks, fps, total_frames, min_length=min_length)
+
+    prediction = {"result": results, "score": 0.0}
+    if model_version:
+        prediction["model_version"] = model_version
+
+    print(f"轨迹关联: {sum(len(f.get('objects', [])) for f in frame_annotations)} 个检测框 "
+          f"-> {len(results)} 条轨迹")
+    return {
+        "data": video_task_data(video_path),
+        "predictions": [prediction]
+    }
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+API 请求传输层 - 连接池 + keep-alive + 重试
+每个 MultiModalLabeler 持有一个 ProviderTransport，复用 TLS 连接；
+遇到 429/5xx 或网络错误时按带抖动的指数退避重试，并遵守 Retry-After
+"""
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class APIRequestError(Exception):
+    """API请求在重试后仍然失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class ProviderTransport:
+    """共享的HTTP传输层（连接池、超时、重试）"""
+
+    def __init__(
+        self,
+        pool_size: int = 8,
+        timeout: float = 60.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0
+    ):
+        """
+        Args:
+            pool_size: 连接池大小（应不小于并发请求数）
+            timeout: 单次请求超时（秒）
+            max_retries: 最大重试次数
+            backoff_base: 指数退避的初始等待（秒）
+            backoff_max: 单次退避等待上限（秒）
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试前的等待时间（全抖动指数退避，不少于 Retry-After）"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def post_json(self, url: str, headers: Dict, payload: Union[Dict, str]) -> Dict:
+        """
+        POST JSON 并返回解析后的响应，重试耗尽后抛出 APIRequestError
+
+        payload 可以是已序列化的 JSON 文本（如标注器按骨架拼接的请求体），此时按 UTF-8 原样发送。
+        """
+        if isinstance(payload, str):
+            return self.request("POST", url, headers, data=payload.encode("utf-8")).json()
+        return self.request("POST", url, headers, json=payload).json()
+
+    def request(self, method: str, url: str, headers: Dict, **kwargs) -> requests.Response:
+        """
+        发送请求（参数同 requests.Session.request），返回状态码 200 的响应
+
+        可重试的错误按退避策略重试，其他错误或重试耗尽后抛出 APIRequestError。
+        kwargs 中的请求体需可重复发送（bytes/dict，而不是文件对象）。
+        """
+        last_error = None
+        status_code = None
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = f"网络错误: {e}"
+            else:
+                if response.status_code == 200:
+                    return response
+
+                status_code = response.status_code
+                last_error = f"API请求失败: {response.status_code}, {response.text[:500]}"
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise APIRequestError(last_error, status_code)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            if attempt == self.max_retries:
+                break
+
+            delay = self.backoff_delay(attempt, retry_after)
+            print(f"  {last_error}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+
+        raise APIRequestError(last_error, status_code)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+API 用量与费用统计 - 记录每个请求的输入/输出token和延迟
+价格来自 API_PROVIDERS 中的 "pricing"，运行结束时写出可机读的 JSON 摘要
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值分位数（q 为 0-100），空列表返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def estimate_cost(
+    prompt_tokens: int,
+    completion_tokens: int,
+    pricing: Optional[Dict],
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0
+) -> Optional[float]:
+    """
+    按每百万token单价计算费用，未配置价格时返回 None
+
+    prompt_tokens 包含提示缓存命中（cached_tokens）与写入（cache_write_tokens）的部分，
+    这两部分分别按输入单价乘以 cached_input_factor / cache_write_factor 计费（未配置时按原价）。
+    """
+    if not pricing:
+        return None
+    input_price = pricing.get("input_per_million", 0.0)
+    uncached = prompt_tokens - cached_tokens - cache_write_tokens
+    return (uncached * input_price
+            + cached_tokens * input_price * pricing.get("cached_input_factor", 1.0)
+            + cache_write_tokens * input_price * pricing.get("cache_write_factor", 1.0)
+            + completion_tokens * pricing.get("output_per_million", 0.0)) / 1_000_000
+
+
+def scale_pricing(pricing: Optional[Dict], factor: float) -> Optional[Dict]:
+    """按比例调整单价（如批处理接口的折扣价）"""
+    if not pricing:
+        return pricing
+    scaled = dict(pricing)
+    for key in ("input_per_million", "output_per_million"):
+        if key in scaled:
+            scaled[key] = scaled[key] * factor
+    return scaled
+
+
+def summary_path_for(output_path: str) -> str:
+    """输出文件对应的摘要路径：labels.json(.gz) -> labels.summary.json"""
+    base = output_path[:-3] if output_path.endswith(".gz") else output_path
+    stem, _ = os.path.splitext(base)
+    return f"{stem}.summary.json"
+
+
+def write_summary(path: str, summary: Dict):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+class UsageStats:
+    """线程安全的请求用量统计"""
+
+    def __init__(self, pricing: Optional[Dict] = None):
+        """
+        Args:
+            pricing: {"currency": "USD", "input_per_million": ..., "output_per_million": ...}
+        """
+        self.pricing = pricing or {}
+        self.requests = 0
+        self.frames = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+        self.latencies: List[float] = []
+        self.lock = threading.Lock()
+
+    def record(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency: Optional[float],
+        frames: int = 1,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ):
+        """
+        记录一个成功返回的请求
+
+        Args:
+            prompt_tokens: 输入token（含图片，含提示缓存命中与写入的部分）
+            completion_tokens: 输出token
+            latency: 请求耗时（秒，含重试等待）；批处理任务中的请求没有单独的耗时，传 None
+            frames: 请求中的帧数
+            cached_tokens: 命中服务端提示缓存的输入token
+            cache_write_tokens: 写入提示缓存的输入token
+        """
+        with self.lock:
+            self.requests += 1
+            self.frames += frames
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.cached_tokens += cached_tokens or 0
+            self.cache_write_tokens += cache_write_tokens or 0
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def summary(self, include_latencies: bool = False) -> Dict:
+        with self.lock:
+            latencies = list(self.latencies)
+            result = {
+                "requests": self.requests,
+                "frames_requested": self.frames,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cache_write_tokens": self.cache_write_tokens,
+                "cache_hit_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else None,
+                "cost": estimate_cost(self.prompt_tokens, self.completion_tokens, self.pricing,
+                                      self.cached_tokens, self.cache_write_tokens),
+                "currency": self.pricing.get("currency"),
+            }
+        result.update(latency_summary(latencies))
+        if include_latencies:
+            result["latencies"] = latencies
+        return result
+
+    def print_summary(self):
+        if not self.requests:
+            return
+        s = self.summary()
+        cost = f"，费用 {s['cost']:.4f} {s['currency']}" if s["cost"] is not None else ""
+        cached = ""
+        if s["cached_tokens"]:
+            cached = f"（提示缓存命中 {s['cached_tokens']} token，{s['cache_hit_ratio']:.0%}）"
+        latency = ""
+        if s["latency_p50_ms"] is not None:
+            latency = f"，延迟 p50 {s['latency_p50_ms']:.0f} ms / p95 {s['latency_p95_ms']:.0f} ms"
+        print(f"API用量: {s['requests']} 个请求，输入 {s['prompt_tokens']} / 输出 {s['completion_tokens']} token"
+              f"{cached}{cost}{latency}")
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    """延迟分位数（毫秒）"""
+    p50 = percentile(latencies, 50)
+    p95 = percentile(latencies, 95)
+    return {
+        "latency_p50_ms": p50 * 1000 if p50 is not None else None,
+        "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+    }
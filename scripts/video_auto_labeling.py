@@ -4,411 +4,623 @@
 支持 GPT-4V, Claude, Gemini 等多模态模型
 """
 
-import cv2
-import base64
-import json
 import os
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 import argparse
+import time
+from collections import deque
 
-# 配置区域
-API_PROVIDERS = {
-    "openai": {
-        "model": "gpt-4o",  # 或 gpt-4-vision-preview
-        "api_key_env": "OPENAI_API_KEY",
-        "endpoint": "https://api.openai.com/v1/chat/completions"
-    },
-    "anthropic": {
-        "model": "claude-3-5-sonnet-20241022",
-        "api_key_env": "ANTHROPIC_API_KEY",
-        "endpoint": "https://api.anthropic.com/v1/messages"
-    },
-    "gemini": {
-        "model": "gemini-1.5-pro",
-        "api_key_env": "GEMINI_API_KEY",
-        "endpoint": "https://generativelanguage.googleapis.com/v1beta/models"
-    },
-    "qwen": {
-        "model": "qwen-vl-max",  # 或 qwen-vl-plus
-        "api_key_env": "DASHSCOPE_API_KEY",
-        "endpoint": "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
-    }
-}
-
-OBJECT_CATEGORIES = [
-    "行人", "汽车", "摩托车", "自行车", 
-    "交通标志", "交通信号灯", "施工区域", "其他"
-]
+from video_io import (
+    encode_jpeg,
+    iter_frames_at,
+    iter_keyframes,
+    iter_sampled_frames,
+    iter_timed_frames,
+    seek_is_faster,
+    with_timestamps
+)
+from rate_limit import ProviderRateLimiter
+from image_policy import ImageStats, encode_with_policy, image_extension
+from response_cache import DEFAULT_CACHE_PATH, ResponseCache
+from checkpoint import FrameCheckpoint, checkpoint_path_for
+from label_export import TaskWriter, rectangle_result
+from usage_stats import UsageStats, scale_pricing, summary_path_for, write_summary
+# 标注器与提供商配置在 labeler.py（这里同时保留旧的导入路径）
+from roi import RegionOfInterest, parse_roi
+from labeler import API_PROVIDERS, OBJECT_CATEGORIES, MultiModalLabeler  # noqa: F401
+from batch_api import (
+    BatchClient,
+    BatchInputWriter,
+    iter_result_lines,
+    load_state,
+    make_custom_id,
+    parse_custom_id,
+    save_state,
+    wait_for_batches
+)
 
 
 class VideoFrameExtractor:
     """视频帧提取器"""
     
-    def __init__(self, video_path: str, sample_rate: int = 30):
+    def __init__(
+        self,
+        video_path: str,
+        sample_rate: int = 30,
+        sparse_decode: bool = True,
+        selection: str = "fixed",
+        min_gap: int = 5,
+        max_gap: int = 60,
+        scene_threshold: float = 0.08,
+        image_policy: Optional[Dict] = None,
+        image_stats: Optional[ImageStats] = None,
+        measure_baseline: bool = False,
+        frame_numbers: Optional[List[int]] = None,
+        skip_frames: Optional[Iterable[int]] = None,
+        every_seconds: Optional[float] = None,
+        seek: str = "auto",
+        roi: Optional[RegionOfInterest] = None
+    ):
         """
         Args:
             video_path: 视频文件路径
-            sample_rate: 采样率（每N帧提取一帧）
+            sample_rate: 采样率（每N帧提取一帧，selection="fixed" 时使用）
+            sparse_decode: 稀疏解码（未采样帧只推进码流，不做完整解码转换）
+            selection: 选帧方式 fixed（固定帧间隔）、time（固定时间间隔）、
+                adaptive（按场景变化）或 explicit（只取 frame_numbers 指定的帧）
+            min_gap: adaptive 模式的最小帧间隔
+            max_gap: adaptive 模式的最大帧间隔
+            scene_threshold: adaptive 模式的场景变化阈值（0-1）
+            image_policy: 上传图片预处理策略（见 API_PROVIDERS 的 "image"），默认原分辨率JPEG
+            image_stats: 可选，记录上传字节数与估算token
+            measure_baseline: 额外编码原分辨率JPEG以统计节省的字节数
+            frame_numbers: explicit 模式要提取的原始帧号
+            skip_frames: 跳过的原始帧号（检查点中已标注的帧），fixed 模式会直接 seek 到第一个未标注的帧
+            every_seconds: time 模式的采样间隔（秒）
+            seek: time 模式是否按目标时间 seek：auto（间隔较大时）、always、never
+            roi: 可选，编码前把帧裁剪到自车区域以外的 ROI（见 roi.py）
         """
+        if selection not in ("fixed", "time", "adaptive", "explicit"):
+            raise ValueError(f"未知的选帧方式: {selection}")
         self.video_path = video_path
         self.sample_rate = sample_rate
+        self.sparse_decode = sparse_decode
+        self.selection = selection
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.scene_threshold = scene_threshold
+        self.image_policy = image_policy
+        self.image_stats = image_stats
+        self.measure_baseline = measure_baseline
+        self.frame_numbers = frame_numbers or []
+        self.skip_frames = set(skip_frames or ())
+        self.every_seconds = every_seconds
+        self.seek = seek
+        self.roi = roi
+        self.fps = None
+        self.total_frames = None
         
-    def extract_frames(self, output_dir: str) -> List[str]:
-        """提取视频关键帧"""
+    def iter_frames(self, save_dir: Optional[str] = None) -> Iterator[Dict]:
+        """
+        逐帧提取并编码为内存中的JPEG（生成器）
+        
+        Args:
+            save_dir: 可选，同时把帧保存到该目录（默认不落盘）
+            
+        Yields:
+            {"frame": 原始帧号, "time": 显示时间戳（秒）, "image": 编码后的图片字节, "path": 保存路径或None}
+        """
+        import cv2
         cap = cv2.VideoCapture(self.video_path)
         
         if not cap.isOpened():
             raise ValueError(f"无法打开视频文件: {self.video_path}")
         
-        os.makedirs(output_dir, exist_ok=True)
-        frame_paths = []
-        frame_count = 0
-        saved_count = 0
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        print(f"视频信息：FPS={fps}, 总帧数={total_frames}")
+        print(f"视频信息：FPS={self.fps}, 总帧数={self.total_frames}")
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 按采样率保存帧
-            if frame_count % self.sample_rate == 0:
-                frame_path = os.path.join(output_dir, f"frame_{saved_count:04d}.jpg")
-                cv2.imwrite(frame_path, frame)
-                frame_paths.append(frame_path)
+        if self.selection == "time":
+            seek = self.seek == "always" or (self.seek == "auto" and seek_is_faster(cap, self.every_seconds))
+            print(f"按时间采样：每 {self.every_seconds:g} 秒一帧（{'seek' if seek else '顺序解码'}）")
+            sampled = iter_timed_frames(cap, self.every_seconds, self.sparse_decode, seek)
+        elif self.selection == "adaptive":
+            sampled = with_timestamps(cap, iter_keyframes(cap, self.min_gap, self.max_gap,
+                                                          self.scene_threshold, self.sparse_decode))
+        elif self.selection == "explicit":
+            sampled = with_timestamps(cap, iter_frames_at(
+                cap,
+                [n for n in self.frame_numbers if n not in self.skip_frames],
+                self.sparse_decode
+            ))
+        else:
+            start_frame = 0
+            while start_frame in self.skip_frames:
+                start_frame += self.sample_rate
+            if start_frame:
+                print(f"从检查点续跑：跳到第 {start_frame} 帧")
+            sampled = with_timestamps(
+                cap, iter_sampled_frames(cap, self.sample_rate, self.sparse_decode, start_frame)
+            )
+        
+        saved_count = 0
+        try:
+            for frame_count, timestamp, frame in sampled:
+                if frame_count in self.skip_frames:
+                    continue
+                sent = self.roi.apply(frame) if self.roi is not None else frame
+                image_bytes, sent_size = encode_with_policy(sent, self.image_policy)
+                if self.image_stats is not None:
+                    height, width = frame.shape[:2]
+                    baseline = len(encode_jpeg(frame)) if self.measure_baseline else None
+                    self.image_stats.record((width, height), sent_size, len(image_bytes), baseline)
+                frame_path = None
+                if save_dir:
+                    extension = image_extension(self.image_policy)
+                    frame_path = os.path.join(save_dir, f"frame_{saved_count:04d}{extension}")
+                    with open(frame_path, "wb") as f:
+                        f.write(image_bytes)
                 saved_count += 1
-                print(f"提取帧 {saved_count}: 原始帧号 {frame_count}")
-            
-            frame_count += 1
+                yield {"frame": frame_count, "time": timestamp, "image": image_bytes, "path": frame_path}
+        finally:
+            cap.release()
         
-        cap.release()
         print(f"✓ 共提取 {saved_count} 帧")
-        return frame_paths
+    
+    def extract_frames(self, output_dir: str) -> List[str]:
+        """提取视频关键帧并保存到目录"""
+        return [frame["path"] for frame in self.iter_frames(save_dir=output_dir)]
 
 
-class MultiModalLabeler:
-    """多模态模型标注器"""
-    
-    def __init__(self, provider: str = "openai"):
-        """
-        Args:
-            provider: API提供商 (openai, anthropic, gemini)
-        """
-        self.provider = provider
-        self.config = API_PROVIDERS[provider]
-        self.api_key = os.getenv(self.config["api_key_env"])
-        
-        if not self.api_key:
-            raise ValueError(f"请设置环境变量: {self.config['api_key_env']}")
-    
-    def encode_image(self, image_path: str) -> str:
-        """将图片编码为base64"""
-        with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode('utf-8')
-    
-    def create_prompt(self) -> str:
-        """创建标注提示词"""
-        categories = ", ".join(OBJECT_CATEGORIES)
-        
-        prompt = f"""请帮我分析这张摩托车第一人称视角的交通场景图片，检测并标注以下类别的目标：{categories}
+def frames_dir_for(video_path: str, root: str) -> str:
+    """每个视频独立的帧保存目录，避免并发运行互相覆盖"""
+    return os.path.join(root, Path(video_path).stem)
+
 
-重要提示：
-- 这是摩托车骑手的第一人称视角
-- 不要标注拍摄者自己骑的摩托车（画面底部可见的车把、仪表盘等）
-- 只标注道路上的其他车辆、行人、交通标志等外部目标
+def frame_to_label_studio_results(frame_number: int, frame_data: Dict, time_seconds: float) -> List[Dict]:
+    """单个采样帧的标注结果转换为 Label Studio 区域列表（time_seconds 为该帧的时间戳）"""
+    return [
+        rectangle_result(obj["bbox"], obj["category"], frame_number, time_seconds)
+        for obj in frame_data.get("objects", [])
+    ]
 
-对于每个检测到的目标，请提供：
-1. 类别（从上述类别中选择）
-2. 边界框坐标（格式：[x_min, y_min, x_max, y_max]，相对于图片尺寸的比例，范围0-1）
-3. 置信度（0-1之间）
 
-请以JSON格式返回结果，格式如下：
-{{
-  "objects": [
-    {{
-      "category": "行人",
-      "bbox": [0.1, 0.2, 0.3, 0.5],
-      "confidence": 0.95
-    }}
-  ]
-}}
+def build_parser() -> argparse.ArgumentParser:
+    """命令行参数（batch_auto_labeling.py 复用同一套参数）"""
+    parser = argparse.ArgumentParser(description="视频自动标注工具")
+    parser.add_argument("video_path", help="视频文件路径")
+    parser.add_argument("--provider", default="openai", choices=list(API_PROVIDERS),
+                        help="API提供商")
+    parser.add_argument("--sample-rate", type=int, default=30,
+                        help="采样率（每N帧提取一帧）")
+    parser.add_argument("--selection", default="fixed", choices=["fixed", "adaptive"],
+                        help="选帧方式：fixed=固定间隔，adaptive=按场景变化自适应")
+    timing = parser.add_mutually_exclusive_group()
+    timing.add_argument("--target-fps", type=float,
+                        help="按时间采样：每秒标注的帧数（与视频帧率无关，优先于 --sample-rate）")
+    timing.add_argument("--every-seconds", type=float,
+                        help="按时间采样：每隔N秒标注一帧")
+    parser.add_argument("--seek", default="auto", choices=["auto", "always", "never"],
+                        help="按时间采样时是否直接 seek 到目标时间（auto=间隔较大时）")
+    parser.add_argument("--min-gap", type=int, default=5,
+                        help="adaptive 模式的最小帧间隔")
+    parser.add_argument("--max-gap", type=int, default=60,
+                        help="adaptive 模式的最大帧间隔")
+    parser.add_argument("--scene-threshold", type=float, default=0.08,
+                        help="adaptive 模式的场景变化阈值（0-1，越小发送的帧越多）")
+    parser.add_argument("--dense-decode", action="store_true",
+                        help="逐帧完整解码（默认稀疏解码，未采样帧只推进码流）")
+    parser.add_argument("--output", default="auto_labels.json",
+                        help="输出JSON文件路径（以 .gz 结尾时 gzip 压缩）")
+    parser.add_argument("--gzip", action="store_true",
+                        help="gzip 压缩输出（自动在输出路径后加 .gz）")
+    parser.add_argument("--indent", type=int,
+                        help="输出JSON的缩进（默认紧凑输出）")
+    parser.add_argument("--shard-size", type=int,
+                        help="每个输出分片最多的区域数（超大任务拆成多个可独立导入的文件）")
+    parser.add_argument("--concurrency", type=int,
+                        help="同时在途的API请求数（默认取提供商配置）")
+    parser.add_argument("--frames-per-request", type=int, default=1,
+                        help="每个请求打包的连续帧数（>1 时启用多帧批量模式）")
+    parser.add_argument("--endpoint",
+                        help="覆盖 chat/completions 接口地址（仅 openai/qwen，如本地模拟服务 http://127.0.0.1:8765/v1/chat/completions）")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="关闭客户端限流（对接本地模拟服务做基准测试时使用）")
+    parser.add_argument("--response-format", default="verbose", choices=["verbose", "compact"],
+                        help="模型输出格式：compact 为类别编号+整数坐标数组，输出token更少、不易截断")
+    parser.add_argument("--no-prompt-cache", action="store_true",
+                        help="不给静态指令块加 cache_control 标记（Claude/Qwen 显式提示缓存的写入按 1.25 倍计费）")
+    parser.add_argument("--batch-submit", action="store_true",
+                        help="使用提供商的批处理接口（openai/qwen）：一次提交所有帧，约半价，通常24小时内完成")
+    parser.add_argument("--batch-base-url",
+                        help="覆盖批处理接口根地址（如本地模拟服务 http://127.0.0.1:8765/v1）")
+    parser.add_argument("--batch-poll-interval", type=float, default=60.0,
+                        help="批处理任务状态的轮询间隔（秒）")
+    parser.add_argument("--batch-timeout", type=float,
+                        help="最多等待批处理任务的秒数（超时后可重新运行同一命令继续等待）")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="单次API请求超时（秒）")
+    parser.add_argument("--max-retries", type=int, default=5,
+                        help="429/5xx/网络错误的最大重试次数")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用响应缓存（强制重新请求所有帧）")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH,
+                        help="响应缓存文件路径（SQLite）")
+    parser.add_argument("--cache-max-mb", type=float, default=512,
+                        help="响应缓存容量上限（MB，超出按LRU淘汰）")
+    parser.add_argument("--roi",
+                        help="自车区域裁剪：预设名（helmet/handlebar）、JSON 文件或 x_min,y_min,x_max,y_max；"
+                             "框会映射回整帧坐标")
+    parser.add_argument("--report-image-savings", action="store_true",
+                        help="额外编码原分辨率JPEG，统计预处理节省的上传字节数")
+    parser.add_argument("--export-tracks", action="store_true",
+                        help="把逐帧框关联成轨迹，按关键帧插值格式导出（适合稀疏采样）")
+    parser.add_argument("--track-iou", type=float, default=0.3,
+                        help="轨迹关联的最小IoU")
+    parser.add_argument("--track-max-gap", type=int, default=2,
+                        help="轨迹允许跨越的最大采样帧数（漏检容忍）")
+    parser.add_argument("--checkpoint",
+                        help="逐帧检查点路径（默认 <输出文件>.checkpoint.jsonl）")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="不写检查点（中断后需要从头开始）")
+    parser.add_argument("--keep-checkpoint", action="store_true",
+                        help="完成后保留检查点（默认成功后删除）")
+    parser.add_argument("--summary",
+                        help="运行摘要JSON路径（token、费用、延迟、吞吐量；默认 <输出文件名>.summary.json）")
+    parser.add_argument("--save-frames", metavar="DIR",
+                        help="同时把采样帧保存到 DIR/<视频名>/（默认只在内存中处理）")
+    return parser
+
+
+def sampling_interval(args: argparse.Namespace) -> Optional[float]:
+    """--target-fps / --every-seconds 换算为采样间隔（秒），未指定时返回 None"""
+    if args.every_seconds:
+        return args.every_seconds
+    if args.target_fps:
+        return 1.0 / args.target_fps
+    return None
+
+
+def run_meta(args: argparse.Namespace, labeler: MultiModalLabeler) -> Dict:
+    """
+    标识一次标注运行的参数，写入检查点与批处理状态文件；与已有记录不一致时不复用
+    （采样方式或 ROI 不同时帧集合/框坐标不同，输出格式不同时解析方式不同）
+    """
+    return {
+        "video": os.path.basename(args.video_path),
+        "provider": args.provider,
+        "model": labeler.config["model"],
+        "sample_rate": args.sample_rate,
+        "selection": args.selection,
+        "every_seconds": args.every_seconds,
+        "target_fps": args.target_fps,
+        "roi": labeler.roi.to_dict() if labeler.roi is not None else None,
+        "response_format": args.response_format
+    }
+
 
-只返回JSON，不要其他解释。"""
-        return prompt
+def iter_batch_labels(
+    args: argparse.Namespace,
+    labeler: MultiModalLabeler,
+    extractor: VideoFrameExtractor,
+    output_path: str,
+    frames_dir: Optional[str],
+    batch_info: Dict
+) -> Iterator[Tuple[int, float, Dict]]:
+    """
+    批处理模式：提取并编码所有采样帧写成请求文件，提交任务，轮询完成后按帧号顺序产出结果
     
-    def label_image_openai(self, image_path: str) -> Dict:
-        """使用OpenAI GPT-4V标注图片"""
-        import requests
-        
-        base64_image = self.encode_image(image_path)
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        payload = {
-            "model": self.config["model"],
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": self.create_prompt()},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 1000
-        }
-        
-        response = requests.post(
-            self.config["endpoint"],
-            headers=headers,
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            # 提取JSON部分
-            try:
-                # 移除可能的markdown代码块标记
-                content = content.replace("```json", "").replace("```", "").strip()
-                return json.loads(content)
-            except json.JSONDecodeError:
-                print(f"JSON解析失败，原始响应: {content}")
-                return {"objects": []}
-        else:
-            print(f"API请求失败: {response.status_code}, {response.text}")
-            return {"objects": []}
+    已提交的任务id记录在 <输出文件>.batch.json 中，中断后重新运行同一命令会继续等待
+    这些任务，而不是重复提交。
     
-    def label_image_anthropic(self, image_path: str) -> Dict:
-        """使用Claude标注图片"""
-        import requests
-        import anthropic
-        
-        # 读取图片
-        with open(image_path, "rb") as f:
-            image_data = base64.standard_b64encode(f.read()).decode("utf-8")
-        
-        client = anthropic.Anthropic(api_key=self.api_key)
-        
-        message = client.messages.create(
-            model=self.config["model"],
-            max_tokens=1024,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": image_data,
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": self.create_prompt()
-                        }
-                    ],
-                }
-            ],
-        )
-        
-        content = message.content[0].text
-        try:
-            content = content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
-        except json.JSONDecodeError:
-            print(f"JSON解析失败，原始响应: {content}")
-            return {"objects": []}
+    Yields:
+        (原始帧号, 时间戳, 标注结果)
+    """
+    batch_config = labeler.config["batch"]
+    state_path = f"{output_path}.batch.json"
+    # 结果按提交时的采样帧、ROI 与输出格式解析，任一不同都不能复用已提交的任务
+    meta = dict(run_meta(args, labeler), frames_per_request=args.frames_per_request)
+    client = BatchClient(args.batch_base_url or batch_config["base_url"], labeler.api_key, labeler.transport)
     
-    def label_image_qwen(self, image_path: str) -> Dict:
-        """使用Qwen VL标注图片"""
-        import requests
+    state = load_state(state_path, meta)
+    if state is None:
+        writer = BatchInputWriter(
+            output_path,
+            batch_config["endpoint"],
+            batch_config.get("max_requests", 50000),
+            int(batch_config.get("max_file_mb", 190) * 1024 * 1024)
+        )
+        frame_times = {}
+        group = []
         
-        base64_image = self.encode_image(image_path)
+        def add_group():
+            writer.add(make_custom_id(args.video_path, [f["frame"] for f in group]),
+                       labeler.batch_request_body([f["image"] for f in group]))
+            group.clear()
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        for frame in extractor.iter_frames(save_dir=frames_dir):
+            frame_times[frame["frame"]] = frame["time"]
+            group.append(frame)
+            if len(group) == args.frames_per_request:
+                add_group()
+        if group:
+            add_group()
+        input_paths = writer.close()
+        print(f"批处理请求文件: {len(input_paths)} 个，共 {writer.total_requests} 个请求")
         
-        payload = {
-            "model": self.config["model"],
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": self.create_prompt()
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 1000
+        state = {
+            "meta": meta,
+            "batches": [],
+            "fps": extractor.fps,
+            "total_frames": extractor.total_frames,
+            "times": {str(n): t for n, t in frame_times.items()}
         }
-        
-        response = requests.post(
-            self.config["endpoint"],
-            headers=headers,
-            json=payload
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            # 提取JSON部分
-            try:
-                # 移除可能的markdown代码块标记
-                content = content.replace("```json", "").replace("```", "").strip()
-                return json.loads(content)
-            except json.JSONDecodeError:
-                print(f"JSON解析失败，原始响应: {content}")
-                return {"objects": []}
-        else:
-            print(f"API请求失败: {response.status_code}, {response.text}")
-            return {"objects": []}
-    
-    def label_image(self, image_path: str) -> Dict:
-        """标注单张图片"""
-        if self.provider == "openai":
-            return self.label_image_openai(image_path)
-        elif self.provider == "anthropic":
-            return self.label_image_anthropic(image_path)
-        elif self.provider == "qwen":
-            return self.label_image_qwen(image_path)
-        else:
-            raise NotImplementedError(f"暂不支持提供商: {self.provider}")
-
-
-def convert_to_label_studio_format(
-    video_path: str,
-    frame_annotations: List[Dict],
-    sample_rate: int,
-    fps: float
-) -> Dict:
-    """转换为Label Studio导入格式"""
+        for path in input_paths:
+            file_id = client.upload(path)
+            batch = client.create(file_id, batch_config["endpoint"], batch_config.get("completion_window", "24h"),
+                                  metadata={"video": meta["video"]})
+            state["batches"].append(batch["id"])
+            save_state(state_path, state)  # 每提交一个任务就记录，避免中断后重复提交
+            os.remove(path)
+            print(f"已提交批处理任务: {batch['id']}")
+    else:
+        print(f"继续等待已提交的批处理任务: {', '.join(state['batches'])}")
+        extractor.fps = state["fps"]  # 续等时不再解码视频
+        extractor.total_frames = state["total_frames"]
     
-    results = []
+    batch_info["ids"] = state["batches"]
+    batches = wait_for_batches(client, state["batches"], args.batch_poll_interval, args.batch_timeout)
+    batch_info["request_counts"] = [batch.get("request_counts") for batch in batches]
     
-    for idx, frame_data in enumerate(frame_annotations):
-        frame_number = idx * sample_rate
-        time_seconds = frame_number / fps
-        
-        for obj in frame_data.get("objects", []):
-            # 转换bbox格式
-            bbox = obj["bbox"]  # [x_min, y_min, x_max, y_max] 0-1范围
-            
-            result = {
-                "value": {
-                    "x": bbox[0] * 100,  # 转换为百分比
-                    "y": bbox[1] * 100,
-                    "width": (bbox[2] - bbox[0]) * 100,
-                    "height": (bbox[3] - bbox[1]) * 100,
-                    "rotation": 0,
-                    "rectanglelabels": [obj["category"]],
-                    "frame": frame_number,
-                    "time": time_seconds
-                },
-                "from_name": "box",
-                "to_name": "video",
-                "type": "videorectangle"
-            }
-            results.append(result)
+    frame_times = {int(n): t for n, t in state["times"].items()}
+    annotations = {}
+    for line in iter_result_lines(client, batches, output_path):
+        frames = parse_custom_id(line["custom_id"])
+        for n, annotation in zip(frames, labeler.parse_batch_result(line, len(frames))):
+            annotations[n] = annotation
     
-    return {
-        "data": {
-            "video": f"/data/local-files/?d={os.path.basename(video_path)}"
-        },
-        "predictions": [{
-            "result": results,
-            "score": 0.0
-        }]
-    }
+    for n in sorted(frame_times):
+        yield n, frame_times[n], annotations.get(n, {"objects": [], "error": "批处理任务未返回该帧结果"})
+    os.remove(state_path)
 
 
-def main():
-    parser = argparse.ArgumentParser(description="视频自动标注工具")
-    parser.add_argument("video_path", help="视频文件路径")
-    parser.add_argument("--provider", default="openai", choices=["openai", "anthropic", "qwen"],
-                        help="API提供商")
-    parser.add_argument("--sample-rate", type=int, default=30,
-                        help="采样率（每N帧提取一帧）")
-    parser.add_argument("--output", default="auto_labels.json",
-                        help="输出JSON文件路径")
-    
-    args = parser.parse_args()
+def label_video(args: argparse.Namespace, rate_limiter=None, request_slots=None) -> Dict:
+    """
+    标注单个视频并写出 Label Studio 导入文件
     
+    Args:
+        args: build_parser() 解析出的参数
+        rate_limiter: 可选，共享的限流器
+        request_slots: 可选，跨进程共享的全局请求信号量
+        
+    Returns:
+        运行摘要（同时写入 --summary），含帧数、失败帧、token用量、费用、延迟分位数与吞吐量；
+        "latencies" 为逐请求延迟（秒），供批处理汇总分位数，不写入文件
+    """
+    start_time = time.time()
     print("=" * 50)
     print("视频自动标注工具")
     print("=" * 50)
     print(f"视频文件: {args.video_path}")
     print(f"API提供商: {args.provider}")
-    print(f"采样率: 每 {args.sample_rate} 帧")
+    every_seconds = sampling_interval(args)
+    if every_seconds:
+        print(f"选帧方式: 按时间采样，每 {every_seconds:g} 秒一帧")
+    elif args.selection == "adaptive":
+        print(f"选帧方式: 场景变化自适应（间隔 {args.min_gap}-{args.max_gap} 帧，"
+              f"阈值 {args.scene_threshold}）")
+    else:
+        print(f"采样率: 每 {args.sample_rate} 帧")
     print()
     
-    # 1. 提取视频帧
-    print("[1/3] 提取视频帧...")
-    extractor = VideoFrameExtractor(args.video_path, args.sample_rate)
-    frames_dir = "temp_frames"
-    frame_paths = extractor.extract_frames(frames_dir)
+    if args.endpoint and args.provider not in ("openai", "qwen"):
+        raise ValueError("--endpoint 只适用于 OpenAI 兼容接口（openai/qwen）")
+    if args.no_rate_limit and rate_limiter is None:
+        rate_limiter = ProviderRateLimiter(None)
+    if args.batch_submit and "batch" not in API_PROVIDERS[args.provider]:
+        raise ValueError(f"{args.provider} 未配置批处理接口（支持 openai/qwen）")
     
-    # 2. 使用多模态模型标注
-    print("\n[2/3] 调用多模态模型标注...")
-    labeler = MultiModalLabeler(provider=args.provider)
-    
-    frame_annotations = []
-    for i, frame_path in enumerate(frame_paths):
-        print(f"标注帧 {i+1}/{len(frame_paths)}: {frame_path}")
-        annotation = labeler.label_image(frame_path)
-        frame_annotations.append(annotation)
-        print(f"  检测到 {len(annotation.get('objects', []))} 个目标")
+    # 标注器决定上传图片的预处理策略，需先于帧提取器创建
+    # 批处理模式的结果在任务完成后才返回，不查询/写入响应缓存
+    cache = None if args.no_cache or args.batch_submit else ResponseCache(args.cache_path, args.cache_max_mb)
+    labeler = MultiModalLabeler(
+        provider=args.provider,
+        max_concurrency=args.concurrency,
+        timeout=args.timeout,
+        max_retries=args.max_retries,
+        cache=cache,
+        rate_limiter=rate_limiter,
+        request_slots=request_slots,
+        endpoint=args.endpoint,
+        response_format=args.response_format,
+        prompt_cache=not args.no_prompt_cache,
+        roi=parse_roi(args.roi)
+    )
+    if labeler.roi is not None:
+        print(f"ROI: {labeler.roi.name}，保留画面 {labeler.roi.kept_fraction:.0%}（框映射回整帧坐标）")
+    if args.batch_submit:
+        labeler.usage_stats = UsageStats(scale_pricing(labeler.config.get("pricing"),
+                                                       labeler.config["batch"].get("price_factor", 1.0)))
     
-    # 3. 转换为Label Studio格式
-    print("\n[3/3] 转换为Label Studio格式...")
-    cap = cv2.VideoCapture(args.video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    cap.release()
+    # 逐帧检查点：已标注的帧不再提取和请求
+    checkpoint = None
+    if not args.no_checkpoint:
+        checkpoint = FrameCheckpoint(
+            args.checkpoint or checkpoint_path_for(args.output),
+            run_meta(args, labeler)
+        )
+        if checkpoint.records:
+            print(f"检查点: {checkpoint.path} 中已有 {len(checkpoint.records)} 帧标注，跳过这些帧")
+    resumed = checkpoint.records if checkpoint else {}
+    output_path = args.output
+    if args.gzip and not output_path.endswith(".gz"):
+        output_path += ".gz"
     
-    label_studio_data = convert_to_label_studio_format(
+    # 1. 提取视频帧（生成器，帧按提供商策略编码到内存后直接交给标注器）
+    print("[1/3] 提取视频帧...")
+    extractor = VideoFrameExtractor(
         args.video_path,
-        frame_annotations,
         args.sample_rate,
-        fps
+        sparse_decode=not args.dense_decode,
+        selection="time" if every_seconds else args.selection,
+        min_gap=args.min_gap,
+        max_gap=args.max_gap,
+        scene_threshold=args.scene_threshold,
+        image_policy=labeler.image_policy,
+        image_stats=labeler.image_stats,
+        measure_baseline=args.report_image_savings,
+        skip_frames=resumed,
+        every_seconds=every_seconds,
+        seek=args.seek,
+        roi=labeler.roi
     )
+    frames_dir = frames_dir_for(args.video_path, args.save_frames) if args.save_frames else None
+    
+    # 2. 使用多模态模型标注，每帧结果立即写入检查点和输出文件
+    if args.batch_submit:
+        print("\n[2/3] 提交批处理任务...")
+        print(f"每请求帧数: {args.frames_per_request}")
+    else:
+        print("\n[2/3] 调用多模态模型标注...")
+        print(f"并发请求数: {labeler.max_concurrency}，每请求帧数: {args.frames_per_request}")
+    
+    frame_numbers = deque()
+    resumed_frames = deque(sorted(resumed))
+    failed_frames = []
+    labeled_count = 0
+    track_frames, track_times, track_annotations = [], [], []  # 轨迹关联需要所有帧
+    
+    def sampled_images():
+        for frame in extractor.iter_frames(save_dir=frames_dir):
+            frame_numbers.append((frame["frame"], frame["time"]))
+            yield frame["image"]
     
-    # 保存结果
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump([label_studio_data], f, ensure_ascii=False, indent=2)
+    def resumed_time(frame_number: int) -> float:
+        return checkpoint.times.get(frame_number, frame_number / extractor.fps)
     
-    print(f"\n✓ 完成！标注结果已保存到: {args.output}")
+    def realtime_labels():
+        for annotation in labeler.iter_label_images(sampled_images(), args.frames_per_request):
+            frame_number, frame_time = frame_numbers.popleft()
+            yield frame_number, frame_time, annotation
+    
+    batch_info = {}
+    if args.batch_submit:
+        labeled = iter_batch_labels(args, labeler, extractor, output_path, frames_dir, batch_info)
+    else:
+        labeled = realtime_labels()
+    
+    writer = TaskWriter(output_path, args.video_path, indent=args.indent, shard_size=args.shard_size)
+    
+    def emit(frame_number: int, frame_time: float, annotation: Dict):
+        nonlocal labeled_count
+        labeled_count += 1
+        if annotation.get("error"):
+            failed_frames.append(frame_number)
+        if args.export_tracks:
+            track_frames.append(frame_number)
+            track_times.append(frame_time)
+            track_annotations.append(annotation)
+        else:
+            writer.write_frame(frame_to_label_studio_results(frame_number, annotation, frame_time))
+    
+    with writer:
+        for i, (frame_number, frame_time, annotation) in enumerate(labeled):
+            if checkpoint is not None:
+                checkpoint.append(frame_number, annotation, frame_time)
+            # 检查点中的帧按帧号顺序穿插写出
+            while resumed_frames and resumed_frames[0] < frame_number:
+                n = resumed_frames.popleft()
+                emit(n, resumed_time(n), resumed[n])
+            emit(frame_number, frame_time, annotation)
+            if annotation.get("error"):
+                print(f"❌ 标注帧 {i+1}: 原始帧号 {frame_number}，请求失败: {annotation['error']}")
+            else:
+                print(f"标注帧 {i+1}: 原始帧号 {frame_number}，"
+                      f"检测到 {len(annotation.get('objects', []))} 个目标")
+        while resumed_frames:
+            n = resumed_frames.popleft()
+            emit(n, resumed_time(n), resumed[n])
+        
+        # 3. 轨迹模式在所有帧标注完成后关联并写出
+        print("\n[3/3] 写出Label Studio导入文件...")
+        if args.export_tracks:
+            from tracking import build_track_task
+            task = build_track_task(
+                args.video_path,
+                track_frames,
+                track_annotations,
+                extractor.fps,
+                extractor.total_frames,
+                iou_threshold=args.track_iou,
+                max_gap=args.track_max_gap,
+                frame_times=track_times
+            )
+            writer.write_tracks(task["predictions"][0]["result"])
+    
+    if failed_frames:
+        print(f"\n⚠️  {len(failed_frames)} 帧在重试后仍请求失败（原始帧号: {failed_frames}）")
+    
+    labeler.image_stats.print_summary()
+    labeler.usage_stats.print_summary()
+    
+    cache_stats = None
+    if cache is not None:
+        cache_stats = cache.stats()
+        print(f"响应缓存: 命中 {cache_stats['hits']}，未命中 {cache_stats['misses']}，"
+              f"命中率 {cache_stats['hit_rate']:.1%}")
+        cache.close()
+    
+    if checkpoint is not None:
+        if failed_frames or args.keep_checkpoint:
+            checkpoint.close()
+            print(f"检查点已保留: {checkpoint.path}（重新运行只会请求失败的帧）")
+        else:
+            checkpoint.remove()
+    
+    output_files = ", ".join(writer.paths)
+    print(f"\n✓ 完成！{writer.total_results} 个区域已保存到: {output_files}")
     print(f"\n导入方法：")
     print(f"1. 在Label Studio项目中点击 Import")
-    print(f"2. 上传 {args.output} 文件")
+    print(f"2. 上传 {output_files} 文件")
     print(f"3. 选择 'Predictions' 导入模式")
     
-    # 清理临时文件
-    print(f"\n提示：临时帧文件保存在 {frames_dir}/，可以手动删除")
+    if frames_dir:
+        print(f"\n提示：采样帧已保存在 {frames_dir}/，可以手动删除")
+    
+    elapsed = time.time() - start_time
+    summary = {
+        "video": args.video_path,
+        "outputs": writer.paths,
+        "provider": args.provider,
+        "model": labeler.config["model"],
+        "frames": labeled_count,
+        "failed_frames": len(failed_frames),
+        "resumed_frames": len(resumed),
+        "elapsed": elapsed,
+        "frames_per_second": labeled_count / elapsed if elapsed > 0 else None,
+        "usage": labeler.usage_stats.summary(),
+        "images": labeler.image_stats.summary(),
+        "roi": labeler.roi.to_dict() if labeler.roi is not None else None,
+        "cache": cache_stats
+    }
+    if batch_info:
+        summary["batch"] = batch_info
+    summary_path = args.summary or summary_path_for(output_path)
+    write_summary(summary_path, summary)
+    print(f"运行摘要: {summary_path}")
+    
+    summary["latencies"] = list(labeler.usage_stats.latencies)
+    return summary
+
+
+def main():
+    args = build_parser().parse_args()
+    label_video(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+视频解码工具 - 供 video_auto_labeling.py 与 yolo_auto_labeling.py 共用
+稀疏解码：未采样帧只推进码流（grab），采样帧才 retrieve 并转换为 BGR 图像
+按时间采样：按时间戳（而不是帧号）选帧，间隔较大时直接 seek 到目标时间
+cv2 在第一次解码/编码时才导入，入口脚本的 --help 和模块导入不付 OpenCV 的加载开销
+"""
+
+import queue
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Tuple, TypeVar
+
+if TYPE_CHECKING:
+    import cv2
+
+T = TypeVar("T")
+
+
+def iter_sampled_frames(
+    cap: "cv2.VideoCapture",
+    sample_rate: int,
+    sparse: bool = True,
+    start_frame: int = 0
+) -> Iterator[Tuple[int, "cv2.Mat"]]:
+    """
+    按采样率遍历视频帧
+
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        sample_rate: 采样率（每N帧取一帧）
+        sparse: 稀疏解码（未采样帧只 grab，不做 retrieve/颜色转换）
+        start_frame: 从该帧开始（先 seek，用于断点续跑）
+
+    Yields:
+        (原始帧号, 帧图像)
+    """
+    if sample_rate < 1:
+        raise ValueError(f"采样率必须 >= 1: {sample_rate}")
+
+    frame_count = 0
+    if start_frame > 0:
+        import cv2
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frame_count = start_frame
+    while True:
+        if frame_count % sample_rate == 0 or not sparse:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_count % sample_rate == 0:
+                yield frame_count, frame
+        elif not cap.grab():
+            break
+
+        frame_count += 1
+
+
+def iter_frames_at(
+    cap: "cv2.VideoCapture",
+    frame_numbers: Iterable[int],
+    sparse: bool = True
+) -> Iterator[Tuple[int, "cv2.Mat"]]:
+    """
+    只取指定帧号的帧（顺序读取，非目标帧只 grab）
+
+    Yields:
+        (原始帧号, 帧图像)
+    """
+    targets = sorted(set(frame_numbers))
+    if not targets:
+        return
+
+    next_index = 0
+    frame_count = 0
+    while next_index < len(targets):
+        if frame_count == targets[next_index] or not sparse:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_count == targets[next_index]:
+                yield frame_count, frame
+                next_index += 1
+        elif not cap.grab():
+            break
+
+        frame_count += 1
+
+
+def frame_timestamp(cap: "cv2.VideoCapture") -> float:
+    """最近一次 read/grab 的帧的显示时间戳（秒，来自容器的 PTS）"""
+    import cv2
+    return cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+
+def with_timestamps(
+    cap: "cv2.VideoCapture",
+    sampled: Iterable[Tuple[int, "cv2.Mat"]]
+) -> Iterator[Tuple[int, float, "cv2.Mat"]]:
+    """为 (帧号, 帧图像) 补上该帧的真实时间戳，产出 (帧号, 时间戳秒, 帧图像)"""
+    for frame_count, frame in sampled:
+        yield frame_count, frame_timestamp(cap), frame
+
+
+def seek_is_faster(cap: "cv2.VideoCapture", interval: float, min_gap_frames: int = 90) -> bool:
+    """采样间隔超过 min_gap_frames 帧时，seek（解码关键帧到目标帧）通常比顺序推进码流快"""
+    import cv2
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    return interval * fps >= min_gap_frames
+
+
+def iter_timed_frames(
+    cap: "cv2.VideoCapture",
+    interval: float,
+    sparse: bool = True,
+    seek: bool = False
+) -> Iterator[Tuple[int, float, "cv2.Mat"]]:
+    """
+    按时间间隔采样（每 interval 秒取一帧），与视频帧率无关
+
+    顺序模式逐帧推进码流，取时间戳第一个到达 k × interval 的帧；
+    seek 模式直接跳到每个目标时间，适合长视频的稀疏采样。
+
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        interval: 采样间隔（秒）
+        sparse: 稀疏解码（顺序模式下未采样帧只 grab）
+        seek: 按目标时间 seek，而不是顺序解码
+
+    Yields:
+        (原始帧号, 时间戳秒, 帧图像)
+    """
+    if interval <= 0:
+        raise ValueError(f"采样间隔必须 > 0: {interval}")
+
+    import cv2
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    tolerance = 0.5 / fps  # 半帧，吸收时间戳的取整误差
+
+    if seek:
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        last_frame = -1
+        k = 0
+        while k * interval <= duration + tolerance:
+            cap.set(cv2.CAP_PROP_POS_MSEC, k * interval * 1000.0)
+            k += 1
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_count = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+            if frame_count <= last_frame:  # 目标时间落在同一帧上
+                continue
+            last_frame = frame_count
+            yield frame_count, frame_timestamp(cap), frame
+        return
+
+    next_time = 0.0
+    frame_count = 0
+    while True:
+        if sparse:
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+        timestamp = frame_timestamp(cap)
+        if timestamp + tolerance >= next_time:
+            if sparse:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+            yield frame_count, timestamp, frame
+            next_time = (int((timestamp + tolerance) / interval) + 1) * interval
+        frame_count += 1
+
+
+def prefetch(items: Iterable[T], maxsize: int = 8) -> Iterator[T]:
+    """
+    在后台线程中预取（如视频解码），通过有界队列交给调用方
+
+    解码与推理/网络请求可以重叠进行；后台线程中的异常会在调用方重新抛出。
+    调用方提前停止迭代（close()）时后台线程随之退出；close() 返回时后台线程已经结束，
+    之后可以安全释放它使用的资源（如 VideoCapture）。
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((done, e))
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def batched(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """按固定大小分组，最后一组可能不满（YOLO 批量推理与多帧请求共用）"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def downscale_gray(frame: "cv2.Mat", size: Tuple[int, int] = (64, 36)) -> "cv2.Mat":
+    """缩小为低分辨率灰度图，用于廉价的画面差异计算"""
+    import cv2
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def scene_change_score(prev_small: "cv2.Mat", small: "cv2.Mat") -> float:
+    """两张缩略灰度图的平均绝对差（0-1，越大画面变化越大）"""
+    import cv2
+    return float(cv2.absdiff(prev_small, small).mean()) / 255.0
+
+
+def iter_keyframes(
+    cap: "cv2.VideoCapture",
+    min_gap: int = 5,
+    max_gap: int = 60,
+    threshold: float = 0.08,
+    sparse: bool = True
+) -> Iterator[Tuple[int, "cv2.Mat"]]:
+    """
+    场景变化自适应选帧
+
+    每 min_gap 帧取一个候选帧，与上一个选中帧比较缩略灰度图差异；
+    差异超过 threshold 或距上一个选中帧已达 max_gap 帧时选中。
+    静止画面（如等红灯）少发帧，快速变化的场景多发帧。
+
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        min_gap: 最小帧间隔（候选帧步长）
+        max_gap: 最大帧间隔（超过则强制选中）
+        threshold: 场景变化阈值（0-1）
+        sparse: 稀疏解码
+
+    Yields:
+        (原始帧号, 帧图像)
+    """
+    if max_gap < min_gap:
+        raise ValueError(f"max_gap ({max_gap}) 不能小于 min_gap ({min_gap})")
+
+    last_small = None
+    last_frame = None
+    for frame_count, frame in iter_sampled_frames(cap, min_gap, sparse):
+        small = downscale_gray(frame)
+        if (last_small is None
+                or frame_count - last_frame >= max_gap
+                or scene_change_score(last_small, small) >= threshold):
+            last_small = small
+            last_frame = frame_count
+            yield frame_count, frame
+
+
+def encode_jpeg(frame: "cv2.Mat", quality: int = 95) -> bytes:
+    """将帧编码为内存中的JPEG字节（不落盘）"""
+    import cv2
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG编码失败")
+    return buffer.tobytes()
@@ -7,6 +7,8 @@ import cv2
 import json
 import sys
 
+from label_export import label_studio_frame
+
 def visualize_annotations(video_path, json_path, output_path, frame_number=30):
     """
     从视频提取一帧并绘制标注框
@@ -15,7 +17,7 @@ def visualize_annotations(video_path, json_path, output_path, frame_number=30):
         video_path: 视频文件路径
         json_path: Label Studio JSON标注文件
         output_path: 输出图片路径
-        frame_number: 要可视化的帧号
+        frame_number: 要可视化的原始帧号（从 0 开始）
     """
     # 读取视频
     cap = cv2.VideoCapture(video_path)
@@ -50,7 +52,7 @@ def visualize_annotations(video_path, json_path, output_path, frame_number=30):
     }
     
     # 筛选该帧的标注
-    frame_results = [r for r in results if r['value']['frame'] == frame_number]
+    frame_results = [r for r in results if r['value']['frame'] == label_studio_frame(frame_number)]
     
     print(f"📊 帧 {frame_number} 检测到 {len(frame_results)} 个目标")
     
@@ -2,22 +2,41 @@
 """
 YOLO11 本地自动标注脚本
 完全免费，支持离线使用，速度快
+（cv2、numpy 与 ultralytics 在创建标注器/开始检测时才导入，--help 不加载它们）
 """
 
-import cv2
-import json
 import os
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import TYPE_CHECKING, Callable, List, Dict, Iterator, Optional, Tuple
 import argparse
 import time
+from collections import Counter
 
-try:
-    from ultralytics import YOLO
-except ImportError:
-    print("错误: 未安装 ultralytics 库")
-    print("请运行: pip install ultralytics")
-    exit(1)
+from video_io import (
+    batched,
+    iter_sampled_frames,
+    iter_timed_frames,
+    prefetch,
+    seek_is_faster,
+    with_timestamps
+)
+from label_export import TaskWriter, rectangle_result, video_task_data
+from roi import RegionOfInterest, parse_roi
+
+if TYPE_CHECKING:
+    import numpy as np
+    from tiling import TileGrid
+
+
+def load_yolo(model_name: str):
+    """加载 ultralytics YOLO 模型（未安装时提示并退出）"""
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        print("错误: 未安装 ultralytics 库")
+        print("请运行: pip install ultralytics")
+        exit(1)
+    return YOLO(model_name)
 
 
 # COCO数据集类别映射到中文（YOLO预训练模型使用COCO数据集）
@@ -112,7 +131,8 @@ TRAFFIC_CATEGORIES = {
 class YOLOVideoLabeler:
     """YOLO视频自动标注器"""
     
-    def __init__(self, model_name: str = "yolo11n.pt", confidence: float = 0.25):
+    def __init__(self, model_name: str = "yolo11n.pt", confidence: float = 0.25, model=None,
+                 roi: Optional[RegionOfInterest] = None):
         """
         Args:
             model_name: YOLO模型名称
@@ -122,21 +142,46 @@ class YOLOVideoLabeler:
                 - yolo11l.pt: 大模型
                 - yolo11x.pt: 最准确，最慢
             confidence: 置信度阈值（0-1）
+            model: 可选，已加载的模型对象（接口同 ultralytics YOLO，如基准测试的桩模型），
+                传入时不再加载 model_name
+            roi: 可选，推理前把帧裁剪到自车区域以外的 ROI（见 roi.py），框映射回整帧坐标
         """
         self.model_name = model_name
         self.confidence = confidence
+        self.roi = roi
+        self.video_info = None
         
-        print(f"加载YOLO模型: {model_name}")
-        print("首次运行会自动下载模型，请稍候...")
+        if model is not None:
+            self.model = model
+        else:
+            print(f"加载YOLO模型: {model_name}")
+            print("首次运行会自动下载模型，请稍候...")
+            
+            self.model = load_yolo(model_name)
+            print("✓ 模型加载成功！")
         
-        self.model = YOLO(model_name)
-        print("✓ 模型加载成功！")
+        # 预计算 类别id -> 英文名/中文名 查找表，以及交通类别的id掩码
+        import numpy as np
+        from tiling import SMALL_OBJECT_CATEGORIES
+        names = self.model.names
+        num_classes = max(names) + 1
+        self.class_names_en = [names.get(i, str(i)) for i in range(num_classes)]
+        self.class_names_cn = [COCO_TO_CHINESE.get(n, n) for n in self.class_names_en]
+        self.traffic_mask = np.array([n in TRAFFIC_CATEGORIES for n in self.class_names_en])
+        self.traffic_class_ids = np.flatnonzero(self.traffic_mask).tolist()
+        self.small_class_ids = [i for i, n in enumerate(self.class_names_en) if n in SMALL_OBJECT_CATEGORIES]
         
     def detect_video(
         self, 
         video_path: str, 
         sample_rate: int = 30,
-        traffic_only: bool = True
+        traffic_only: bool = True,
+        sparse_decode: bool = True,
+        batch_size: int = 1,
+        prefetch_size: int = 16,
+        every_seconds: Optional[float] = None,
+        seek: str = "auto",
+        tiling: Optional["TileGrid"] = None
     ) -> Tuple[List[Dict], Dict]:
         """
         检测视频中的目标
@@ -145,10 +190,46 @@ class YOLOVideoLabeler:
             video_path: 视频文件路径
             sample_rate: 采样率（每N帧检测一次）
             traffic_only: 是否只检测交通相关目标
+            sparse_decode: 稀疏解码（未采样帧只推进码流，不做完整解码转换）
+            batch_size: 每次模型调用的帧数
+            prefetch_size: 后台解码线程的预取队列长度
+            every_seconds: 按时间采样的间隔（秒），指定时忽略 sample_rate
+            seek: 按时间采样时是否 seek 到目标时间：auto（间隔较大时）、always、never
+            tiling: 可选，画面上部切片推理（见 tiling.py），提高远处信号灯/标志的召回
             
         Returns:
             (检测结果列表, 视频信息)
         """
+        frame_detections = list(self.iter_detect_video(
+            video_path, sample_rate, traffic_only, sparse_decode, batch_size, prefetch_size,
+            every_seconds, seek, tiling
+        ))
+        return frame_detections, self.video_info
+    
+    def iter_detect_video(
+        self, 
+        video_path: str, 
+        sample_rate: int = 30,
+        traffic_only: bool = True,
+        sparse_decode: bool = True,
+        batch_size: int = 1,
+        prefetch_size: int = 16,
+        every_seconds: Optional[float] = None,
+        seek: str = "auto",
+        tiling: Optional["TileGrid"] = None,
+        on_frame: Optional[Callable[[int, "np.ndarray"], None]] = None
+    ) -> Iterator[Dict]:
+        """
+        逐帧产出检测结果（生成器，参数同 detect_video），开始迭代后 self.video_info 可用
+        
+        Args:
+            on_frame: 可选，每帧产出检测结果前以 (原始帧号, 送入模型的画面) 调用，
+                      调用方可借此复用已解码的帧（如级联标注把升级帧交给多模态模型），无需再解码一遍
+        
+        Yields:
+            {"frame": 原始帧号, "time": 显示时间戳（秒）, "objects": [...]}
+        """
+        import cv2
         cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
@@ -159,7 +240,7 @@ class YOLOVideoLabeler:
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
-        video_info = {
+        self.video_info = video_info = {
             "fps": fps,
             "total_frames": total_frames,
             "width": width,
@@ -172,95 +253,153 @@ class YOLOVideoLabeler:
         print(f"  帧率: {fps} fps")
         print(f"  总帧数: {total_frames}")
         print(f"  时长: {video_info['duration']:.2f} 秒")
-        print(f"  采样率: 每 {sample_rate} 帧")
+        if every_seconds:
+            use_seek = seek == "always" or (seek == "auto" and seek_is_faster(cap, every_seconds))
+            print(f"  采样: 每 {every_seconds:g} 秒（{'seek' if use_seek else '顺序解码'}）")
+            sampled = iter_timed_frames(cap, every_seconds, sparse_decode, use_seek)
+        else:
+            print(f"  采样率: 每 {sample_rate} 帧")
+            sampled = with_timestamps(cap, iter_sampled_frames(cap, sample_rate, sparse_decode))
+        # ROI 像素偏移，检测框先加偏移再按整帧宽高归一化
+        offset = (0, 0)
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi.pixel_box(width, height)
+            offset = (x0, y0)
+            print(f"  ROI: {self.roi.name}（推理区域 {x1 - x0}x{y1 - y0}）")
+            sampled = ((i, t, self.roi.apply(frame)) for i, t, frame in sampled)
+            width_in, height_in = x1 - x0, y1 - y0  # 送入模型的画面尺寸
+        else:
+            width_in, height_in = width, height
+        if tiling is not None:
+            tile_count = len(tiling.boxes(width_in, height_in))
+            print(f"  切片推理: 画面上部 {tiling.region:.0%}，{tile_count} 个 {tiling.tile_size}px 切片/帧"
+                  + ("" if tile_count else "（画面不大于切片，已跳过）"))
         print()
         
-        frame_detections = []
-        frame_count = 0
         detected_count = 0
+        total_objects = 0
         
         start_time = time.time()
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 按采样率检测
-            if frame_count % sample_rate == 0:
-                # 运行检测
+        # 后台线程解码并预取采样帧，主线程按批次推理
+        sampled = prefetch(sampled, prefetch_size)
+        next_report = 10
+        try:
+            for batch in batched(sampled, batch_size):
+                # 运行检测（一次调用处理整批帧，结果与输入顺序一致）
                 results = self.model(
-                    frame, 
+                    [frame for _, _, frame in batch],
                     conf=self.confidence,
+                    classes=self.traffic_class_ids if traffic_only else None,  # 在NMS阶段过滤类别
                     verbose=False  # 不显示每帧的详细信息
                 )
+                tile_results = self._detect_tiles(batch, tiling) if tiling is not None else None
                 
-                # 解析结果
-                objects = []
-                for result in results:
-                    boxes = result.boxes
-                    for box in boxes:
-                        # 获取类别名称
-                        cls_id = int(box.cls[0])
-                        cls_name = result.names[cls_id]
-                        
-                        # 过滤非交通类别
-                        if traffic_only and cls_name not in TRAFFIC_CATEGORIES:
-                            continue
-                        
-                        # 获取边界框（xyxy格式）
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        
-                        # 转换为相对坐标（0-1范围）
-                        bbox = [
-                            x1 / width,
-                            y1 / height,
-                            x2 / width,
-                            y2 / height
-                        ]
-                        
-                        # 获取置信度
-                        conf = float(box.conf[0])
-                        
-                        # 转换为中文类别
-                        category_cn = COCO_TO_CHINESE.get(cls_name, cls_name)
-                        
-                        objects.append({
-                            "category": category_cn,
-                            "category_en": cls_name,
-                            "bbox": bbox,
-                            "confidence": conf,
-                            "frame": frame_count,
-                            "time": frame_count / fps
-                        })
-                
-                frame_detections.append({
-                    "frame": frame_count,
-                    "objects": objects
-                })
+                for i, ((frame_count, timestamp, _), result) in enumerate(zip(batch, results)):
+                    arrays = self._result_arrays(result)
+                    if tile_results:
+                        arrays = tiling.merge(arrays, tile_results[i], width_in, height_in)
+                    objects = self._build_objects(*arrays, frame_count, timestamp, width, height, traffic_only,
+                                                  offset)
+                    total_objects += len(objects)
+                    if on_frame is not None:
+                        on_frame(frame_count, batch[i][2])
+                    yield {
+                        "frame": frame_count,
+                        "time": timestamp,
+                        "objects": objects
+                    }
                 
-                detected_count += 1
-                if detected_count % 10 == 0:
+                detected_count += len(batch)
+                if detected_count >= next_report:
+                    next_report = (detected_count // 10 + 1) * 10
                     elapsed = time.time() - start_time
                     fps_processing = detected_count / elapsed
-                    print(f"已处理 {detected_count} 帧 ({frame_count}/{total_frames}) "
+                    print(f"已处理 {detected_count} 帧 ({batch[-1][0]}/{total_frames}) "
                           f"- 速度: {fps_processing:.1f} 帧/秒")
-            
-            frame_count += 1
-        
-        cap.release()
+        finally:
+            # 先停止后台解码线程，再释放 VideoCapture（否则线程可能仍在读帧）
+            sampled.close()
+            cap.release()
         
         elapsed = time.time() - start_time
         print(f"\n✓ 检测完成!")
         print(f"  总耗时: {elapsed:.2f} 秒")
         print(f"  处理速度: {detected_count/elapsed:.1f} 帧/秒")
         print(f"  检测帧数: {detected_count}")
-        
-        # 统计检测到的目标
-        total_objects = sum(len(fd["objects"]) for fd in frame_detections)
         print(f"  检测到目标总数: {total_objects}")
+    
+    def _detect_tiles(self, batch: List[Tuple], tiling: "TileGrid") -> List[List[Tuple]]:
+        """整批帧的所有切片一次送入模型（只检测小目标类别），返回每帧的切片结果列表"""
+        tiles = [tiling.crop(frame) for _, _, frame in batch]
+        flat = [tile for frame_tiles in tiles for tile in frame_tiles]
+        if not flat or not self.small_class_ids:
+            return []
+        results = iter(self.model(flat, conf=self.confidence, classes=self.small_class_ids, verbose=False))
+        return [[self._result_arrays(next(results)) for _ in frame_tiles] for frame_tiles in tiles]
+    
+    @staticmethod
+    def _result_arrays(result) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        """模型单帧输出 -> (类别id, 置信度, 像素框)"""
+        boxes = result.boxes
+        if len(boxes) == 0:
+            import numpy as np
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32), np.zeros((0, 4), dtype=np.float32)
+        return boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy(), boxes.xyxy.cpu().numpy()
+    
+    def _build_objects(
+        self,
+        cls_ids: "np.ndarray",
+        confs: "np.ndarray",
+        xyxy: "np.ndarray",
+        frame_count: int,
+        time_seconds: float,
+        width: int,
+        height: int,
+        traffic_only: bool,
+        offset: Tuple[int, int] = (0, 0)
+    ) -> List[Dict]:
+        """解析单帧检测结果（整批数组运算，不逐框处理）；offset 为 ROI 左上角在整帧中的像素坐标"""
+        if len(xyxy) == 0:
+            return []
+        
+        import numpy as np
+        # 转换为整帧相对坐标（0-1范围）
+        if offset != (0, 0):
+            xyxy = xyxy + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+        xyxy = xyxy / np.array([width, height, width, height], dtype=np.float32)
         
-        return frame_detections, video_info
+        # 过滤非交通类别（类别已在模型调用时过滤，这里保证结果一致）
+        if traffic_only:
+            keep = self.traffic_mask[cls_ids]
+            cls_ids, confs, xyxy = cls_ids[keep], confs[keep], xyxy[keep]
+        
+        return [
+            {
+                "category": self.class_names_cn[cls_id],
+                "category_en": self.class_names_en[cls_id],
+                "bbox": bbox,
+                "confidence": conf,
+                "frame": frame_count,
+                "time": time_seconds
+            }
+            for cls_id, bbox, conf in zip(cls_ids.tolist(), xyxy.tolist(), confs.tolist())
+        ]
+    
+    def frame_to_label_studio_results(self, frame_data: Dict) -> List[Dict]:
+        """单帧检测结果转换为 Label Studio 区域列表"""
+        # Label Studio使用 x, y, width, height 格式（百分比）
+        return [
+            rectangle_result(
+                obj["bbox"],
+                obj["category"],
+                obj["frame"],
+                obj["time"],
+                from_name="videoLabels",
+                confidence=obj["confidence"]
+            )
+            for obj in frame_data["objects"]
+        ]
     
     def convert_to_label_studio(
         self, 
@@ -268,39 +407,14 @@ class YOLOVideoLabeler:
         detections: List[Dict],
         video_info: Dict
     ) -> Dict:
-        """转换为Label Studio格式"""
+        """转换为Label Studio格式（整个任务在内存中构建，长视频请用 TaskWriter 流式写出）"""
         
         results = []
-        
         for frame_data in detections:
-            for obj in frame_data["objects"]:
-                bbox = obj["bbox"]
-                
-                # Label Studio使用 x, y, width, height 格式（百分比）
-                result = {
-                    "value": {
-                        "x": bbox[0] * 100,
-                        "y": bbox[1] * 100,
-                        "width": (bbox[2] - bbox[0]) * 100,
-                        "height": (bbox[3] - bbox[1]) * 100,
-                        "rotation": 0,
-                        "rectanglelabels": [obj["category"]],
-                        "frame": obj["frame"],
-                        "time": obj["time"]
-                    },
-                    "from_name": "videoLabels",
-                    "to_name": "video",
-                    "type": "videorectangle",
-                    "meta": {
-                        "confidence": obj["confidence"]
-                    }
-                }
-                results.append(result)
+            results.extend(self.frame_to_label_studio_results(frame_data))
         
         return {
-            "data": {
-                "video": f"/data/local-files/?d={os.path.basename(video_path)}"
-            },
+            "data": video_task_data(video_path),
             "predictions": [{
                 "result": results,
                 "score": 0.0,
@@ -348,15 +462,102 @@ def main():
         default=30,
         help="采样率（每N帧检测一次，默认30）"
     )
+    timing = parser.add_mutually_exclusive_group()
+    timing.add_argument(
+        "--every-seconds",
+        type=float,
+        help="按时间采样：每隔N秒检测一帧（与视频帧率无关，优先于 --sample-rate）"
+    )
+    timing.add_argument(
+        "--target-fps",
+        type=float,
+        help="按时间采样：每秒检测的帧数"
+    )
+    parser.add_argument(
+        "--seek",
+        default="auto",
+        choices=["auto", "always", "never"],
+        help="按时间采样时是否直接 seek 到目标时间（auto=间隔较大时）"
+    )
     parser.add_argument(
         "--all-categories",
         action="store_true",
         help="检测所有类别（默认只检测交通相关类别）"
     )
+    parser.add_argument(
+        "--dense-decode",
+        action="store_true",
+        help="逐帧完整解码（默认稀疏解码，未采样帧只推进码流）"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="每次模型调用处理的帧数（后台线程同时解码下一批）"
+    )
+    parser.add_argument(
+        "--export-tracks",
+        action="store_true",
+        help="把逐帧框关联成轨迹，按关键帧插值格式导出（适合稀疏采样）"
+    )
+    parser.add_argument(
+        "--track-iou",
+        type=float,
+        default=0.3,
+        help="轨迹关联的最小IoU"
+    )
+    parser.add_argument(
+        "--track-max-gap",
+        type=int,
+        default=2,
+        help="轨迹允许跨越的最大采样帧数（漏检容忍）"
+    )
     parser.add_argument(
         "--output", 
         default="yolo_labels.json",
-        help="输出JSON文件路径"
+        help="输出JSON文件路径（以 .gz 结尾时 gzip 压缩）"
+    )
+    parser.add_argument(
+        "--tile",
+        action="store_true",
+        help="切片推理：画面上部切成重叠切片按原分辨率检测信号灯/标志，与整帧结果合并"
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=640,
+        help="切片边长（像素，默认与模型输入尺寸一致）"
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        type=float,
+        default=0.2,
+        help="相邻切片的最小重叠比例"
+    )
+    parser.add_argument(
+        "--tile-region",
+        type=float,
+        default=0.5,
+        help="切片覆盖的画面上部比例（从顶部算起）"
+    )
+    parser.add_argument(
+        "--roi",
+        help="自车区域裁剪：预设名（helmet/handlebar）、JSON 文件或 x_min,y_min,x_max,y_max"
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="gzip 压缩输出（自动在输出路径后加 .gz）"
+    )
+    parser.add_argument(
+        "--indent",
+        type=int,
+        help="输出JSON的缩进（默认紧凑输出）"
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        help="每个输出分片最多的区域数（超大任务拆成多个可独立导入的文件）"
     )
     
     args = parser.parse_args()
@@ -367,50 +568,79 @@ def main():
     print(f"视频文件: {args.video_path}")
     print(f"YOLO模型: {args.model}")
     print(f"置信度阈值: {args.confidence}")
-    print(f"采样率: 每 {args.sample_rate} 帧")
+    every_seconds = args.every_seconds or (1.0 / args.target_fps if args.target_fps else None)
+    if every_seconds:
+        print(f"采样: 每 {every_seconds:g} 秒")
+    else:
+        print(f"采样率: 每 {args.sample_rate} 帧")
     print(f"类别过滤: {'关闭（所有类别）' if args.all_categories else '开启（仅交通相关）'}")
+    tiling = None
+    if args.tile:
+        from tiling import TileGrid
+        tiling = TileGrid(args.tile_size, args.tile_overlap, args.tile_region)
+        print(f"切片推理: 画面上部 {args.tile_region:.0%}，切片 {args.tile_size}px，重叠 {args.tile_overlap:.0%}")
     print("=" * 60)
     
     # 创建标注器
     labeler = YOLOVideoLabeler(
         model_name=args.model,
-        confidence=args.confidence
+        confidence=args.confidence,
+        roi=parse_roi(args.roi)
     )
     
-    # 检测视频
-    detections, video_info = labeler.detect_video(
-        args.video_path,
-        sample_rate=args.sample_rate,
-        traffic_only=not args.all_categories
-    )
+    output_path = args.output
+    if args.gzip and not output_path.endswith(".gz"):
+        output_path += ".gz"
     
-    # 转换为Label Studio格式
-    print("\n转换为Label Studio格式...")
-    label_studio_data = labeler.convert_to_label_studio(
+    # 检测视频，每帧结果立即写入输出文件（轨迹模式需要所有帧，检测完成后再关联）
+    detections = labeler.iter_detect_video(
         args.video_path,
-        detections,
-        video_info
+        sample_rate=args.sample_rate,
+        traffic_only=not args.all_categories,
+        sparse_decode=not args.dense_decode,
+        batch_size=args.batch_size,
+        every_seconds=every_seconds,
+        seek=args.seek,
+        tiling=tiling
     )
     
-    # 保存结果
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump([label_studio_data], f, ensure_ascii=False, indent=2)
+    category_stats = Counter()
+    track_detections = []
+    with TaskWriter(output_path, args.video_path, model_version=args.model,
+                    indent=args.indent, shard_size=args.shard_size) as writer:
+        for frame_data in detections:
+            category_stats.update(obj["category"] for obj in frame_data["objects"])
+            if args.export_tracks:
+                track_detections.append(frame_data)
+            else:
+                writer.write_frame(labeler.frame_to_label_studio_results(frame_data))
+        
+        if args.export_tracks:
+            print("\n关联轨迹...")
+            from tracking import build_track_task
+            task = build_track_task(
+                args.video_path,
+                [fd["frame"] for fd in track_detections],
+                track_detections,
+                labeler.video_info["fps"],
+                labeler.video_info["total_frames"],
+                iou_threshold=args.track_iou,
+                max_gap=args.track_max_gap,
+                model_version=args.model,
+                frame_times=[fd["time"] for fd in track_detections]
+            )
+            writer.write_tracks(task["predictions"][0]["result"])
     
-    print(f"\n✓ 完成！标注结果已保存到: {args.output}")
+    output_files = ", ".join(writer.paths)
+    print(f"\n✓ 完成！{writer.total_results} 个区域已保存到: {output_files}")
     print(f"\n📋 导入Label Studio的步骤：")
     print(f"1. 在Label Studio项目中点击右上角 'Import'")
-    print(f"2. 上传 {args.output} 文件")
+    print(f"2. 上传 {output_files} 文件")
     print(f"3. 选择 'Treat as predictions' (作为预标注)")
     print(f"4. 开始人工审核和修正！")
     
     # 显示检测统计
     print(f"\n📊 检测统计：")
-    category_stats = {}
-    for frame_data in detections:
-        for obj in frame_data["objects"]:
-            cat = obj["category"]
-            category_stats[cat] = category_stats.get(cat, 0) + 1
-    
     for cat, count in sorted(category_stats.items(), key=lambda x: x[1], reverse=True):
         print(f"  {cat}: {count} 个")
 